@@ -0,0 +1,81 @@
+"""
+Measures the memory and output size saved by deduplicating marketDefinitions (dedup_definitions) on the sample file.
+
+Usage, from the root of the repository:
+	python benchmarks/definitions.py [--file path/to/file.bz2]
+
+For each combination of decoding to dictionaries or records, with and without dedup_definitions, reports the memory
+retained by every decoded line of the file, measured with tracemalloc, in total and per line, and the size of the
+lines written back out as compact json.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from typing import Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from betfairHistorical import BetfairHistoricalFileParser
+
+SAMPLE_FILE = os.path.join(ROOT, 'tests', 'sample_data', 'football-basic-sample.bz2')
+
+
+def measure(file_path: str, **kwargs) -> Tuple[int, int, int]:
+	"""
+	Returns the number of lines, the bytes retained by them once decoded and their size as compact json.
+	"""
+	parser = BetfairHistoricalFileParser(
+		local_path=file_path,
+		sport="soccer",
+		plan="basic",
+		market="match_odds",
+		validate=False,
+		decode=True,
+		lazy=True,
+		**kwargs
+		)
+	gc.collect()
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	markets = list(parser.iter_lines())
+	retained = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+
+	output = 0
+	for market in markets:
+		if not isinstance(market, dict):
+			market = market.to_dict()
+		output += len(json.dumps(market, separators=(',', ':'))) + 1
+	return len(markets), retained, output
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--file', default=SAMPLE_FILE, help="File to measure")
+	args = parser.parse_args()
+
+	results = {}
+	print(f"{'decoded as':<24}{'lines':>8}{'memory MB':>12}{'bytes/line':>12}{'output MB':>12}")
+	for name, kwargs in (
+		('dict', {}),
+		('dict, deduplicated', {'dedup_definitions': True}),
+		('records', {'records': True}),
+		('records, deduplicated', {'records': True, 'dedup_definitions': True})
+		):
+		lines, retained, output = results[name] = measure(args.file, **kwargs)
+		print(f"{name:<24}{lines:>8}{retained / 1e6:>12.2f}{retained / lines:>12,.0f}{output / 1e6:>12.2f}")
+
+	for name in ('dict', 'records'):
+		_, retained, output = results[name]
+		_, dedup_retained, dedup_output = results[f"{name}, deduplicated"]
+		print(
+			f"{name}: deduplication saves {1 - dedup_retained / retained:.0%} of memory"
+			f" and {1 - dedup_output / output:.0%} of output"
+			)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,329 @@
+"""
+Benchmarks the throughput and peak memory of each stage of reading historical files, and of bulk downloads.
+
+Usage, from the root of the repository:
+	python benchmarks/run.py --markets 5000 --workers 4
+	python benchmarks/run.py --only decode validate
+
+A synthetic archive of --markets markets is generated in --data-dir on first use (see synthetic.py) and reused
+by later runs. Each benchmark runs in a fresh process so that its peak RSS is not inflated by the others.
+Throughput is reported against the decompressed size of the lines processed, except for download which
+reports the size of the files transferred.
+"""
+import argparse
+import bz2
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+import synthetic
+from betfairHistorical import BetfairHistoricDownloader, BetfairHistoricalFileParser
+from betfairHistorical.archive import recompress_files
+from betfairHistorical.compat import json_loads
+from betfairHistorical.filters import MarketFilter
+from betfairHistorical.validation import get_validator
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'betfair_historical_benchmarks')
+
+# Each benchmark takes the run context and does its setup, then returns a function to be timed.
+# That function returns the number of bytes and messages it processed.
+Benchmark = Callable[[Dict], Callable[[], Tuple[int, int]]]
+
+
+def _read_lines(context: Dict) -> List[bytes]:
+	lines = []
+	for file_path in context['file_paths']:
+		with bz2.open(file_path) as f:
+			lines.extend(f.readlines())
+	return lines
+
+def _parser(context: Dict, **kwargs) -> BetfairHistoricalFileParser:
+	return BetfairHistoricalFileParser(
+		local_path=context['data_dir'],
+		sport="soccer",
+		plan="basic",
+		market="match_odds",
+		lazy=True,
+		**kwargs
+		)
+
+def _consume(parser: BetfairHistoricalFileParser, decode: bool) -> Tuple[int, int]:
+	size = messages = 0
+	for _, lines in parser.iter_files(decode=decode):
+		for line in lines:
+			messages += 1
+			if not decode:
+				size += len(line)
+	return size, messages
+
+
+def bench_decompress(context: Dict):
+	def run():
+		size = messages = 0
+		for file_path in context['file_paths']:
+			with bz2.open(file_path) as f:
+				for line in f:
+					size += len(line)
+					messages += 1
+		return size, messages
+	return run
+
+def bench_decode_stdlib(context: Dict):
+	lines = _read_lines(context)
+	def run():
+		for line in lines:
+			json.loads(line)
+		return sum(map(len, lines)), len(lines)
+	return run
+
+def bench_decode(context: Dict):
+	lines = _read_lines(context)
+	def run():
+		for line in lines:
+			json_loads(line)
+		return sum(map(len, lines)), len(lines)
+	return run
+
+def bench_validate(context: Dict):
+	lines = _read_lines(context)
+	markets = [json_loads(line) for line in lines]
+	validator = get_validator("soccer", "match_odds")
+	def run():
+		for market in markets:
+			validator.validate(market)
+		return sum(map(len, lines)), len(lines)
+	return run
+
+def bench_filter(context: Dict):
+	lines = _read_lines(context)
+	market_filter = MarketFilter(market_ids=context['market_ids'])
+	def run():
+		kept = 0
+		for line in lines:
+			if market_filter.match_raw(line) and market_filter.apply(json_loads(line)) is not None:
+				kept += 1
+		return sum(map(len, lines)), len(lines)
+	return run
+
+def bench_parse(context: Dict):
+	parser = _parser(context, validate=False)
+	return lambda: (context['size'], _consume(parser, decode=True)[1])
+
+def bench_parse_validated(context: Dict):
+	parser = _parser(context, validate=True)
+	return lambda: (context['size'], _consume(parser, decode=True)[1])
+
+def bench_parse_dedup(context: Dict):
+	parser = _parser(context, validate=False, dedup_definitions=True)
+	return lambda: (context['size'], _consume(parser, decode=True)[1])
+
+def bench_parse_parallel(context: Dict):
+	parser = _parser(context, validate=True, workers=context['workers'])
+	return lambda: (context['size'], _consume(parser, decode=True)[1])
+
+def bench_parse_validated_sharded(context: Dict):
+	parser = _parser(context, validate=True, validation_workers=context['workers'])
+	return lambda: (context['size'], _consume(parser, decode=True)[1])
+
+def bench_parse_filtered(context: Dict):
+	parser = _parser(context, validate=False, market_ids=context['market_ids'])
+	return lambda: (context['size'], _consume(parser, decode=True)[1])
+
+def bench_seekable_filtered(context: Dict):
+	seekable_dir = os.path.join(context['data_dir'], '.seekable')
+	if not os.path.isdir(seekable_dir):
+		recompress_files(context['data_dir'], seekable_dir, recursive=False)
+	parser = BetfairHistoricalFileParser(
+		local_path=seekable_dir,
+		sport="soccer",
+		plan="basic",
+		market="match_odds",
+		lazy=True,
+		validate=False,
+		market_ids=context['market_ids']
+		)
+	return lambda: (context['size'], _consume(parser, decode=True)[1])
+
+def bench_summarize(context: Dict):
+	messages = len(_read_lines(context))
+	parser = _parser(context, validate=False, workers=context['workers'])
+	def run():
+		for _ in parser.summarize():
+			pass
+		return context['size'], messages
+	return run
+
+def bench_merge(context: Dict):
+	parser = _parser(context, validate=False)
+	return lambda: (context['size'], sum(1 for _ in parser.iter_merged()))
+
+def bench_resample(context: Dict):
+	from betfairHistorical.resample import resample
+
+	lines = _read_lines(context)
+	markets = [json_loads(line) for line in lines]
+	def run():
+		for _ in resample(markets, interval=60000):
+			pass
+		return sum(map(len, lines)), len(lines)
+	return run
+
+def bench_download(context: Dict):
+	from historic_endpoint import HistoricEndpoint
+
+	files = {}
+	for file_path in context['file_paths']:
+		with open(file_path, 'rb') as f:
+			files[f"/xds_nfs/edp_processed/BASIC/2017/Apr/{os.path.basename(file_path)}"] = f.read()
+
+	# the endpoint is left running for the life of the benchmark process, as shutting it down waits for its poll interval
+	endpoint = HistoricEndpoint(files).__enter__()
+	downloader = BetfairHistoricDownloader(
+		username="username",
+		password="password",
+		app_key="app_key",
+		cert_path="certs",
+		login=False
+		)
+	downloader.historic_url = endpoint.url
+	downloader.trading.set_session_token("session_token")
+
+	def run():
+		local_dir = tempfile.mkdtemp()
+		try:
+			downloader.download_files(list(files), local_dir, max_workers=context['workers'])
+		finally:
+			shutil.rmtree(local_dir, ignore_errors=True)
+		return sum(map(len, files.values())), len(files)
+	return run
+
+BENCHMARKS = {
+	'decompress': bench_decompress,
+	'decode_stdlib': bench_decode_stdlib,
+	'decode': bench_decode,
+	'validate': bench_validate,
+	'filter': bench_filter,
+	'parse': bench_parse,
+	'parse_validated': bench_parse_validated,
+	'parse_dedup': bench_parse_dedup,
+	'parse_parallel': bench_parse_parallel,
+	'parse_validated_sharded': bench_parse_validated_sharded,
+	'parse_filtered': bench_parse_filtered,
+	'seekable_filtered': bench_seekable_filtered,
+	'summarize': bench_summarize,
+	'merge': bench_merge,
+	'resample': bench_resample,
+	'download': bench_download
+	}
+
+
+def _peak_rss_mb() -> float:
+	# ru_maxrss is in kilobytes on Linux, and includes worker processes via RUSAGE_CHILDREN
+	peak = max(
+		resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+		resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+		)
+	return peak / 1024 if sys.platform != 'darwin' else peak / 1024 ** 2
+
+def _run_benchmark(name: str, context: Dict, repeat: int) -> Dict:
+	run = BENCHMARKS[name](context)
+	timings = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		size, messages = run()
+		timings.append(time.perf_counter() - start)
+	seconds = min(timings)
+	return {
+		'benchmark': name,
+		'seconds': seconds,
+		'mb_per_second': size / seconds / 1e6,
+		'messages_per_second': messages / seconds,
+		'peak_rss_mb': _peak_rss_mb()
+		}
+
+def _send_result(sender, name: str, context: Dict, repeat: int):
+	try:
+		sender.send(_run_benchmark(name, context, repeat))
+	except Exception as e:
+		sender.send(e)
+	finally:
+		sender.close()
+
+def run_benchmark(name: str, context: Dict, repeat: int=3) -> Dict:
+	"""
+	Runs a single benchmark in a new process and returns its best timing, throughput and peak RSS.
+	"""
+	# a Process rather than a Pool, whose daemonic workers could not start the parser's own workers
+	ctx = multiprocessing.get_context('spawn')
+	receiver, sender = ctx.Pipe(duplex=False)
+	process = ctx.Process(target=_send_result, args=(sender, name, context, repeat))
+	process.start()
+	sender.close()
+	try:
+		result = receiver.recv()
+	except EOFError:
+		result = None
+	process.join()
+	if result is None:
+		raise RuntimeError(f"{name} exited with code {process.exitcode}")
+	if isinstance(result, Exception):
+		raise result
+	return result
+
+
+def main(argv: List[str]=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--markets', type=int, default=2000, help="Number of markets in the synthetic archive")
+	parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Directory for the synthetic archive")
+	parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes for parse_parallel and parse_validated_sharded, and threads for download")
+	parser.add_argument('--repeat', type=int, default=3, help="Number of timed runs of each benchmark, of which the fastest is reported")
+	parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="Benchmarks to run. Defaults to all.")
+	parser.add_argument('--json', help="Also write the results as json to this path")
+	args = parser.parse_args(argv)
+
+	data_dir = os.path.join(args.data_dir, str(args.markets))
+	file_paths = synthetic.generate(data_dir, args.markets)
+	size = 0
+	market_ids = set()
+	for file_path in file_paths:
+		with bz2.open(file_path) as f:
+			for line in f:
+				size += len(line)
+				if len(market_ids) < max(1, args.markets // 100) and b'"marketDefinition"' in line:
+					market_ids.update(mc['id'] for mc in json_loads(line)['mc'])
+	context = {
+		'data_dir': data_dir,
+		'file_paths': file_paths,
+		'size': size,
+		'market_ids': sorted(market_ids),
+		'workers': args.workers
+		}
+	print(f"{len(file_paths)} files, {size / 1e6:.1f} MB decompressed, filtering on {len(market_ids)} markets")
+
+	results = []
+	print(f"{'benchmark':<26}{'seconds':>10}{'MB/s':>10}{'msgs/s':>12}{'peak RSS MB':>14}")
+	for name in args.only or BENCHMARKS:
+		result = run_benchmark(name, context, args.repeat)
+		results.append(result)
+		print(
+			f"{name:<26}{result['seconds']:>10.3f}{result['mb_per_second']:>10.1f}"
+			f"{result['messages_per_second']:>12.0f}{result['peak_rss_mb']:>14.1f}"
+			)
+
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump({'markets': args.markets, 'workers': args.workers, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+	main()
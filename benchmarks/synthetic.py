@@ -0,0 +1,70 @@
+"""
+Generates synthetic archives for benchmarking by scaling up tests/sample_data/football-basic-sample.bz2.
+
+The sample file contains every market of a single event. Each copy of it is given new market ids,
+event ids and published times, and written as its own bz2 file, so an archive of any number of markets
+has the same structure as the sample.
+"""
+import bz2
+import math
+import os
+import re
+from typing import List
+
+SAMPLE_FILE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'sample_data', 'football-basic-sample.bz2')
+
+_MARKET_ID = re.compile(rb'"id":"1\.(\d+)"')
+_EVENT_ID = re.compile(rb'"eventId":"(\d+)"')
+_PUBLISHED_TIME = re.compile(rb'"pt":(\d+)')
+
+DAY = 24 * 60 * 60 * 1000
+
+
+def read_sample() -> List[bytes]:
+	with bz2.open(SAMPLE_FILE) as f:
+		return f.readlines()
+
+def sample_markets() -> int:
+	"""
+	Returns the number of markets in the sample file.
+	"""
+	return len({m for line in read_sample() for m in _MARKET_ID.findall(line)})
+
+def copy_lines(lines: List[bytes], copy: int) -> List[bytes]:
+	"""
+	Returns the lines of the sample with market ids, event ids and published times unique to copy.
+	"""
+	market_prefix = f'"id":"{copy + 2}.'.encode()
+	event_offset = (copy + 1) * 100000000
+	return [
+		_PUBLISHED_TIME.sub(
+			lambda m: b'"pt":%d' % (int(m.group(1)) + copy * DAY),
+			_EVENT_ID.sub(
+				lambda m: b'"eventId":"%d"' % (int(m.group(1)) + event_offset),
+				line.replace(b'"id":"1.', market_prefix)
+				)
+			)
+		for line in lines
+		]
+
+def generate(output_dir: str, markets: int, compresslevel: int=9) -> List[str]:
+	"""
+	Writes an archive of at least markets markets to output_dir, reusing files which already exist.
+
+	:param output_dir: Directory to write the archive to
+	:param markets: Number of markets to generate
+	:param compresslevel: bz2 compression level of the files
+	return: Paths of the generated files
+	"""
+	os.makedirs(output_dir, exist_ok=True)
+	lines = read_sample()
+	copies = math.ceil(markets / sample_markets())
+	file_paths = []
+	for copy in range(copies):
+		file_path = os.path.join(output_dir, f"{copy}.bz2")
+		if not os.path.exists(file_path):
+			with bz2.open(f"{file_path}.part", 'wb', compresslevel=compresslevel) as f:
+				f.writelines(copy_lines(lines, copy))
+			os.replace(f"{file_path}.part", file_path)
+		file_paths.append(file_path)
+	return file_paths
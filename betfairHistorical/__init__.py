@@ -1,2 +1,3 @@
 from betfairHistorical.downloader import BetfairHistoricDownloader
+from betfairHistorical.market_book import MarketBookEngine
 from betfairHistorical.parser import BetfairHistoricalFileParser
\ No newline at end of file
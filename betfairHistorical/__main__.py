@@ -0,0 +1,5 @@
+import sys
+
+from betfairHistorical.cli import main
+
+sys.exit(main())
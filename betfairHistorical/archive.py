@@ -0,0 +1,307 @@
+"""
+Finding and reading the files of a local archive, and a seekable, block-compressed format for historical files.
+
+Betfair's bz2 files are slow to decompress and must be inflated from the start to read any part of them.
+recompress rewrites a file as a series of independently compressed blocks of whole lines, using zstd if
+zstandard is installed or zlib otherwise, followed by an index of each block's offset, published time range
+and market ids. Blocks which cannot contain a market or time window can then be skipped without being read,
+and the blocks of a single large file can be decompressed independently, e.g. by different processes.
+
+Layout of a file:
+	MAGIC, 1 byte codec name length, codec name
+	compressed blocks
+	json index of blocks
+	8 byte little-endian offset of the index, MAGIC
+"""
+import bz2
+import json
+import os
+import re
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List
+
+from betfairHistorical.compat import json_loads, zstandard
+
+MAGIC = b'BFHZ\x01'
+EXTENSION = '.bfz'
+DEFAULT_CODEC = 'zstd' if zstandard is not None else 'zlib'
+
+_TRAILER = struct.Struct('<Q')
+# the published time of a raw line, read without decoding it
+PUBLISHED_TIME = re.compile(rb'"pt":(\d+)')
+
+
+def find_files(local_path: str, recursive: bool=False) -> List[str]:
+	"""
+	Returns the sorted paths of the data files within the directory local_path, or local_path itself if it is a file.
+	Hidden files, such as the download manifest, and partially downloaded files are ignored.
+	Paths are sorted so files are read, and ties are merged, in the same order on every run and filesystem.
+
+	:param local_path: The local path to the file(s)
+	:param recursive: Include files in all subdirectories of local_path
+	"""
+	if not os.path.isdir(local_path):
+		return [local_path]
+	if recursive:
+		file_paths = [os.path.join(root, file) for root, subdirs, files in os.walk(local_path) for file in files]
+	else:
+		file_paths = [os.path.join(local_path, f) for f in os.listdir(local_path)]
+	return sorted(
+		f for f in file_paths
+		if os.path.isfile(f) and not os.path.basename(f).startswith('.') and not f.endswith('.part')
+		)
+
+def is_seekable(file_path: str) -> bool:
+	"""
+	Returns whether file_path is in the seekable block-compressed format.
+	"""
+	with open(file_path, 'rb') as f:
+		return f.read(len(MAGIC)) == MAGIC
+
+def iter_file_lines(
+	file_path: str,
+	market_ids: List[str]=None,
+	from_time: int=None,
+	to_time: int=None
+	) -> Iterator[bytes]:
+	"""
+	Yields the raw lines of a bz2 or seekable file, one line at a time.
+	For seekable files only the blocks which may contain market_ids within the time window are read,
+	so lines of other markets or times which share a block are also yielded. bz2 files are always read in full.
+
+	:param file_path: Local path of the file
+	:param market_ids: Market ids to read the blocks of
+	:param from_time: Earliest published time, in millis since epoch, to read the blocks of
+	:param to_time: Latest published time, in millis since epoch, to read the blocks of
+	"""
+	if is_seekable(file_path):
+		with SeekableArchive(file_path) as archive:
+			yield from archive.iter_lines(market_ids=market_ids, from_time=from_time, to_time=to_time)
+	else:
+		with bz2.open(file_path) as f:
+			yield from f
+
+def recompress(
+	source_path: str,
+	dest_path: str=None,
+	codec: str=DEFAULT_CODEC,
+	block_size: int=1024 * 1024,
+	time_bucket: int=None,
+	level: int=None
+	) -> str:
+	"""
+	Rewrites a single bz2 (or seekable) file in the seekable block-compressed format.
+
+	:param source_path: Local path of the file to convert
+	:param dest_path: Local path to write to. Defaults to source_path with its extension replaced by .bfz
+	:param codec: Compression of each block, zstd or zlib
+	:param block_size: Number of uncompressed bytes after which a block is started
+	:param time_bucket: If set a block is also started each time the published time enters a new bucket of this many milliseconds
+	:param level: Compression level of the codec. Defaults to the codec's default.
+	return: dest_path
+	"""
+	if dest_path is None:
+		dest_path = os.path.splitext(source_path)[0] + EXTENSION
+	compress = _compressor(codec, level)
+
+	blocks = []
+	lines = []
+	size = 0
+	block = None
+	tmp_path = f"{dest_path}.part"
+	with open(tmp_path, 'wb') as f:
+		f.write(MAGIC + bytes([len(codec)]) + codec.encode())
+
+		def _flush():
+			data = compress(b''.join(lines))
+			block['offset'] = f.tell()
+			block['length'] = len(data)
+			block['market_ids'] = sorted(block['market_ids'])
+			f.write(data)
+			blocks.append(block)
+
+		for _line in iter_file_lines(source_path):
+			if not _line.endswith(b'\n'):
+				_line += b'\n'
+			market = json_loads(_line)
+			published_time = market.get('pt')
+			if block is not None and (
+				size >= block_size
+				or (time_bucket and published_time is not None and block['first_pt'] is not None
+					and published_time // time_bucket != block['first_pt'] // time_bucket)
+				):
+				_flush()
+				block = None
+			if block is None:
+				block = {'lines': 0, 'first_pt': published_time, 'last_pt': published_time, 'market_ids': set()}
+				lines = []
+				size = 0
+
+			lines.append(_line)
+			size += len(_line)
+			block['lines'] += 1
+			if published_time is not None:
+				block['first_pt'] = published_time if block['first_pt'] is None else min(block['first_pt'], published_time)
+				block['last_pt'] = published_time if block['last_pt'] is None else max(block['last_pt'], published_time)
+			block['market_ids'].update(mc.get('id') for mc in market.get('mc') or () if mc.get('id'))
+
+		if block is not None:
+			_flush()
+
+		index_offset = f.tell()
+		f.write(json.dumps({'codec': codec, 'blocks': blocks}).encode())
+		f.write(_TRAILER.pack(index_offset) + MAGIC)
+	os.replace(tmp_path, dest_path)
+	return dest_path
+
+def recompress_files(
+	local_path: str,
+	output_dir: str,
+	recursive: bool=True,
+	workers: int=None,
+	**kwargs
+	) -> List[str]:
+	"""
+	Rewrites every file in local_path in the seekable format, keeping the directory structure within output_dir.
+	Files are written to a separate directory so that a parser of either directory does not read the same data twice.
+
+	:param local_path: The local path to the file(s)
+	:param output_dir: Directory to write the converted files to
+	:param recursive: Include files in all subdirectories of local_path
+	:param workers: Number of processes used to convert files in parallel. If None files are converted sequentially.
+	:param kwargs: Further arguments passed to recompress
+	return: Local paths of the converted files
+	"""
+	source_paths = find_files(local_path, recursive)
+	root = local_path if os.path.isdir(local_path) else os.path.dirname(local_path)
+	dest_paths = []
+	for source_path in source_paths:
+		dest_path = os.path.join(output_dir, os.path.splitext(os.path.relpath(source_path, root))[0] + EXTENSION)
+		os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+		dest_paths.append(dest_path)
+
+	if workers:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			futures = [executor.submit(recompress, source, dest, **kwargs) for source, dest in zip(source_paths, dest_paths)]
+			return [future.result() for future in futures]
+	return [recompress(source, dest, **kwargs) for source, dest in zip(source_paths, dest_paths)]
+
+
+class SeekableArchive:
+	def __init__(self, file_path: str):
+		"""
+		Opens a file in the seekable block-compressed format and reads its index.
+
+		:param file_path: Local path of the file
+		"""
+		self.file_path = file_path
+		self._file = open(file_path, 'rb')
+		try:
+			self._read_index()
+		except Exception:
+			self._file.close()
+			raise
+
+	def _read_index(self):
+		header = self._file.read(len(MAGIC) + 1)
+		if header[:len(MAGIC)] != MAGIC:
+			raise ValueError(f"{self.file_path} is not a seekable archive.")
+		self.codec = self._file.read(header[-1]).decode()
+		self._decompress = _decompressor(self.codec)
+
+		self._file.seek(-(_TRAILER.size + len(MAGIC)), os.SEEK_END)
+		index_end = self._file.tell()
+		trailer = self._file.read()
+		if trailer[_TRAILER.size:] != MAGIC:
+			raise ValueError(f"{self.file_path} is incomplete, no index found.")
+		index_offset, = _TRAILER.unpack(trailer[:_TRAILER.size])
+		self._file.seek(index_offset)
+		self.blocks = json.loads(self._file.read(index_end - index_offset))['blocks']
+
+	def close(self):
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def find_blocks(self, market_ids: List[str]=None, from_time: int=None, to_time: int=None) -> List[int]:
+		"""
+		Returns the positions of the blocks which may contain any of market_ids within the time window.
+		Filters which are None are not applied.
+		"""
+		market_ids = set(market_ids) if market_ids is not None else None
+		return [
+			i for i, block in enumerate(self.blocks)
+			if (market_ids is None or not market_ids.isdisjoint(block['market_ids']))
+			and (from_time is None or block['last_pt'] is None or block['last_pt'] >= from_time)
+			and (to_time is None or block['first_pt'] is None or block['first_pt'] <= to_time)
+			]
+
+	def read_block(self, block: int) -> List[bytes]:
+		"""
+		Decompresses a single block and returns its lines.
+		"""
+		details = self.blocks[block]
+		self._file.seek(details['offset'])
+		return self._decompress(self._file.read(details['length'])).splitlines(keepends=True)
+
+	def iter_lines(
+		self,
+		market_ids: List[str]=None,
+		from_time: int=None,
+		to_time: int=None,
+		blocks: List[int]=None
+		) -> Iterator[bytes]:
+		"""
+		Yields the lines of the blocks which may contain market_ids within the time window, in file order.
+		Lines outside of the time window are skipped, but lines of other markets sharing a block are yielded.
+
+		:param market_ids: Market ids to read the blocks of
+		:param from_time: Earliest published time, in millis since epoch, to read
+		:param to_time: Latest published time, in millis since epoch, to read
+		:param blocks: Positions of the blocks to read, e.g. to split a file between processes. Defaults to all blocks.
+		"""
+		selected = self.find_blocks(market_ids=market_ids, from_time=from_time, to_time=to_time)
+		if blocks is not None:
+			blocks = set(blocks)
+			selected = [i for i in selected if i in blocks]
+		time_filtered = from_time is not None or to_time is not None
+		for block in selected:
+			for _line in self.read_block(block):
+				if time_filtered and not _in_window(_line, from_time, to_time):
+					continue
+				yield _line
+
+
+def _in_window(line: bytes, from_time: int, to_time: int) -> bool:
+	"""
+	Returns whether the published time of a raw line is within the time window, without decoding it.
+	"""
+	match = PUBLISHED_TIME.search(line)
+	if match is None:
+		return True
+	published_time = int(match.group(1))
+	return (from_time is None or published_time >= from_time) and (to_time is None or published_time <= to_time)
+
+def _compressor(codec: str, level: int=None):
+	if codec == 'zlib':
+		return lambda data: zlib.compress(data, 6 if level is None else level)
+	if codec == 'zstd':
+		if zstandard is None:
+			raise ImportError("zstandard is required for the zstd codec. It can be installed with pip install zstandard.")
+		return zstandard.ZstdCompressor(level=3 if level is None else level).compress
+	raise ValueError(f"Unknown codec {codec}, must be one of zstd or zlib.")
+
+def _decompressor(codec: str):
+	if codec == 'zlib':
+		return zlib.decompress
+	if codec == 'zstd':
+		if zstandard is None:
+			raise ImportError("zstandard is required to read zstd archives. It can be installed with pip install zstandard.")
+		return zstandard.ZstdDecompressor().decompress
+	raise ValueError(f"Unknown codec {codec}, must be one of zstd or zlib.")
@@ -0,0 +1,339 @@
+"""
+An asyncio counterpart to BetfairHistoricDownloader, for services which run on an event loop.
+
+Login and metadata queries are made by betfairlightweight, which is blocking, so they are run in the event loop's
+default executor, with the same caching as BetfairHistoricDownloader. Downloads are streamed to disk a chunk at a
+time using aiohttp if it is installed (pip install betfair-historical[async]), otherwise each download is streamed
+with requests in the executor. aiohttp is only imported when the first download starts. Either way the number of downloads in flight is bounded by a semaphore, so any number
+of files can be scheduled at once without holding more than max_concurrency connections or chunks in memory.
+Chunks and the manifest are written to disk in the executor too, so the event loop is never blocked on file I/O.
+"""
+import asyncio
+import functools
+import logging
+import os
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List
+
+import requests
+
+from betfairHistorical.downloader import MANIFEST_FILE, BetfairHistoricDownloader
+
+logger = logging.getLogger(__name__)
+
+_RETRY_ERRORS = (asyncio.TimeoutError, requests.RequestException, IOError)
+
+
+def _import_aiohttp():
+	"""
+	Returns the aiohttp module, or None if it is not installed.
+	"""
+	try:
+		import aiohttp
+	except ImportError:
+		return None
+	return aiohttp
+
+
+class AsyncBetfairHistoricDownloader:
+	def __init__(
+		self,
+		username: str,
+		password: str,
+		app_key: str,
+		cert_path: str,
+		sport: str=None,
+		plan: str=None,
+		from_date: datetime=None,
+		to_date: datetime=None,
+		max_concurrency: int=16,
+		cache_ttl: float=None,
+		cache_dir: str=None
+		):
+		"""
+		Creates an instance to interact with the historic data API from an event loop.
+		Login is not made on init, and happens on the first request which needs it or by awaiting login.
+		Arguments are as BetfairHistoricDownloader, with the addition of:
+
+		:param max_concurrency: Number of files downloaded at once, across all calls to download_file and download_files
+		"""
+		self.downloader = BetfairHistoricDownloader(
+			username=username,
+			password=password,
+			app_key=app_key,
+			cert_path=cert_path,
+			sport=sport,
+			plan=plan,
+			from_date=from_date,
+			to_date=to_date,
+			login=False,
+			cache_ttl=cache_ttl,
+			cache_dir=cache_dir
+			)
+		self.max_concurrency = max_concurrency
+		self.errors = {}
+		self._semaphore = None
+		self._login_lock = None
+		self._manifest_lock = None
+		self._session = None
+		# the aiohttp module once a session has been made with it
+		self._aiohttp = None
+
+	@property
+	def trading(self):
+		return self.downloader.trading
+
+	@property
+	def historic_url(self) -> str:
+		return self.downloader.historic_url
+
+	@historic_url.setter
+	def historic_url(self, url: str):
+		self.downloader.historic_url = url
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *args):
+		await self.close()
+
+	async def close(self):
+		"""
+		Closes the connections used for downloads.
+		"""
+		session, self._session = self._session, None
+		if session is not None:
+			if self._aiohttp is not None:
+				await session.close()
+			else:
+				session.close()
+
+	async def _run(self, func, *args, **kwargs):
+		"""
+		Runs a blocking function in the default executor.
+		"""
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+	async def login(self):
+		"""
+		Logs in if there is no current session, or the session is due to expire.
+		"""
+		await self._run(self.downloader._login)
+
+	async def _login_once(self):
+		"""
+		Logs in if the session has expired, once however many downloads find it expired at the same time.
+		"""
+		if self._login_lock is None:
+			self._login_lock = asyncio.Lock()
+		async with self._login_lock:
+			# another download may have logged in while this one waited for the lock
+			if self.trading.session_expired:
+				await self.login()
+
+	async def available_data(self) -> List:
+		"""
+		Returns the historic data purchased by the account.
+		"""
+		return await self._run(lambda: self.downloader.available_data)
+
+	async def collection_options(self) -> Dict:
+		"""
+		Returns the collection options available, as BetfairHistoricDownloader.collection_options.
+		"""
+		return await self._run(self.downloader.collection_options)
+
+	async def basket_size(self) -> Dict:
+		"""
+		Returns the advanced basket size, as BetfairHistoricDownloader.basket_size.
+		"""
+		return await self._run(self.downloader.basket_size)
+
+	async def file_list(
+		self,
+		market_types_collection: List,
+		countries_collection: List,
+		file_type_collection: List
+		) -> List:
+		"""
+		Returns the list of files contained within the parameters, as BetfairHistoricDownloader.file_list.
+		"""
+		return await self._run(
+			self.downloader.file_list,
+			market_types_collection=market_types_collection,
+			countries_collection=countries_collection,
+			file_type_collection=file_type_collection
+			)
+
+	async def download_file(
+		self,
+		file_path: str,
+		local_dir: str,
+		retries: int=3,
+		backoff: float=1.0,
+		chunk_size: int=1024 * 1024
+		) -> str:
+		"""
+		Downloads a single file, waiting for one of the max_concurrency download slots first.
+		The file is written to a .part file as chunks arrive and moved into place once complete.
+		A file already present with the size of the remote file is not downloaded again.
+
+		:param file_path: Remote file path to be downloaded
+		:param local_dir: Local directory to download file to
+		:param retries: Number of times a failed download is retried
+		:param backoff: Seconds to wait before the first retry, doubling for each subsequent retry
+		:param chunk_size: Number of bytes written to disk at a time
+		return: Local path of the file
+		"""
+		local_path = os.path.join(local_dir, file_path.split('/')[-1])
+		if self._semaphore is None:
+			self._semaphore = asyncio.Semaphore(self.max_concurrency)
+		async with self._semaphore:
+			if self.trading.session_expired:
+				await self._login_once()
+			for attempt in range(retries + 1):
+				try:
+					await self._download_to_path(file_path, local_path, chunk_size)
+					return local_path
+				except self._retry_errors() as e:
+					if attempt == retries:
+						raise
+					wait_time = backoff * 2 ** attempt
+					logger.warning(f"Failed to download {file_path} ({e!r}), retrying in {wait_time}s.")
+					await asyncio.sleep(wait_time)
+
+	async def download_files(
+		self,
+		file_list: Iterable,
+		local_dir: str,
+		retries: int=3,
+		backoff: float=1.0,
+		chunk_size: int=1024 * 1024
+		) -> List[str]:
+		"""
+		Downloads many files concurrently, as BetfairHistoricDownloader.download_files.
+		Completed files are recorded in the same manifest, so runs can be resumed by either downloader.
+		Files which fail after all retries are logged and recorded in errors rather than stopping the run.
+
+		:param file_list: Remote file paths to be downloaded, as returned by file_list
+		:param local_dir: Local directory to download files to
+		:param retries: Number of times a failed download is retried
+		:param backoff: Seconds to wait before the first retry, doubling for each subsequent retry
+		:param chunk_size: Number of bytes written to disk at a time
+		return: Local paths of all files which are present after the run
+		"""
+		return [
+			local_path async for local_path in self.iter_download_files(
+				file_list=file_list,
+				local_dir=local_dir,
+				retries=retries,
+				backoff=backoff,
+				chunk_size=chunk_size
+				)
+			]
+
+	async def iter_download_files(
+		self,
+		file_list: Iterable,
+		local_dir: str,
+		retries: int=3,
+		backoff: float=1.0,
+		chunk_size: int=1024 * 1024
+		) -> AsyncIterator[str]:
+		"""
+		Downloads many files concurrently as download_files, yielding the local path of each file as soon as it is on disk.
+		"""
+		manifest_path = os.path.join(local_dir, MANIFEST_FILE)
+		manifest = await self._run(BetfairHistoricDownloader._read_manifest, manifest_path)
+		if self._manifest_lock is None:
+			self._manifest_lock = asyncio.Lock()
+
+		async def _download(file_path: str) -> str:
+			local_path = os.path.join(local_dir, file_path.split('/')[-1])
+			expected_size = manifest.get(file_path)
+			if expected_size is not None and os.path.exists(local_path) and os.path.getsize(local_path) == expected_size:
+				logger.debug(f"Skipping {file_path}, already downloaded.")
+				return local_path
+			try:
+				await self.download_file(file_path, local_dir, retries=retries, backoff=backoff, chunk_size=chunk_size)
+			except Exception as e:
+				logger.error(f"Failed to download {file_path}: {e!r}")
+				self.errors[file_path] = e
+				return None
+			manifest[file_path] = os.path.getsize(local_path)
+			# writes are made one at a time from a copy, so a later manifest is never replaced by an earlier one
+			async with self._manifest_lock:
+				await self._run(BetfairHistoricDownloader._write_manifest, manifest_path, dict(manifest))
+			return local_path
+
+		tasks = [asyncio.ensure_future(_download(file_path)) for file_path in file_list]
+		try:
+			for task in asyncio.as_completed(tasks):
+				local_path = await task
+				if local_path is not None:
+					yield local_path
+		finally:
+			for task in tasks:
+				task.cancel()
+
+	def _get_session(self):
+		"""
+		Returns the session used for downloads, creating it on first use.
+		"""
+		if self._session is None:
+			self._aiohttp = aiohttp = _import_aiohttp()
+			if aiohttp is not None:
+				historic = self.trading.historic
+				self._session = aiohttp.ClientSession(
+					timeout=aiohttp.ClientTimeout(sock_connect=historic.connect_timeout, sock_read=historic.read_timeout)
+					)
+			else:
+				self._session = requests.Session()
+				adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+				self._session.mount('https://', adapter)
+				self._session.mount('http://', adapter)
+		return self._session
+
+	def _retry_errors(self) -> tuple:
+		"""
+		Returns the errors of a download which are retried, including those of aiohttp once it is in use.
+		"""
+		if self._aiohttp is not None:
+			return (self._aiohttp.ClientError,) + _RETRY_ERRORS
+		return _RETRY_ERRORS
+
+	async def _download_to_path(self, file_path: str, local_path: str, chunk_size: int) -> int:
+		"""
+		Streams a single remote file to local_path, skipping the download if a file of the same size is already there.
+
+		return: Size of the local file in bytes
+		"""
+		session = self._get_session()
+		if self._aiohttp is None:
+			return await self._run(self.downloader._download_to_path, session, file_path, local_path, chunk_size)
+
+		async with session.get(
+			f"{self.historic_url}DownloadFile",
+			params={"filePath": file_path},
+			headers=self.trading.historic.headers
+			) as response:
+			response.raise_for_status()
+			expected_size = response.content_length
+			if expected_size is not None and os.path.exists(local_path) and os.path.getsize(local_path) == expected_size:
+				logger.debug(f"Skipping {file_path}, already present with matching size.")
+				return expected_size
+
+			logger.debug(f"Downloading {file_path}.")
+			part_path = f"{local_path}.part"
+			size = 0
+			with open(part_path, 'wb') as f:
+				async for chunk in response.content.iter_chunked(chunk_size):
+					await self._run(f.write, chunk)
+					size += len(chunk)
+
+		if expected_size is not None and size != expected_size:
+			os.remove(part_path)
+			raise IOError(f"Incomplete download of {file_path}, received {size} of {expected_size} bytes.")
+		os.replace(part_path, local_path)
+		return size
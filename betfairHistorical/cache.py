@@ -0,0 +1,82 @@
+"""
+A time-to-live cache for the results of historic data metadata queries.
+
+Results are held in memory and, if a cache directory is given, written to disk as json so that
+they are shared between processes and runs. Entries older than the ttl are treated as missing.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Tuple
+
+
+class MetadataCache:
+	def __init__(self, ttl: float, cache_dir: str=None):
+		"""
+		:param ttl: Number of seconds an entry remains valid
+		:param cache_dir: Directory to persist entries to. If None entries are only held in memory.
+		"""
+		self.ttl = ttl
+		self.cache_dir = cache_dir
+		self._memory = {}
+
+		if self.cache_dir:
+			os.makedirs(self.cache_dir, exist_ok=True)
+
+	@staticmethod
+	def key(*parts) -> str:
+		"""
+		Returns a stable key for the parts of a query, such as its method, sport, plan, dates and filters.
+		"""
+		serialised = json.dumps(parts, sort_keys=True, default=str)
+		return hashlib.sha256(serialised.encode()).hexdigest()
+
+	def get(self, key: str) -> Tuple[bool, Any]:
+		"""
+		Returns whether a valid entry exists for key and its value.
+		"""
+		entry = self._memory.get(key)
+		if entry is None and self.cache_dir:
+			entry = self._read(key)
+			if entry is not None:
+				self._memory[key] = entry
+
+		if entry is None or time.time() - entry['created'] > self.ttl:
+			return False, None
+		return True, entry['value']
+
+	def set(self, key: str, value: Any):
+		"""
+		Stores value against key.
+		"""
+		entry = {'created': time.time(), 'value': value}
+		self._memory[key] = entry
+		if self.cache_dir:
+			self._write(key, entry)
+
+	def get_or_set(self, key: str, func: Callable[[], Any]) -> Any:
+		"""
+		Returns the cached value for key, or calls func and caches its result if there is no valid entry.
+		"""
+		found, value = self.get(key)
+		if not found:
+			value = func()
+			self.set(key, value)
+		return value
+
+	def _path(self, key: str) -> str:
+		return os.path.join(self.cache_dir, f"{key}.json")
+
+	def _read(self, key: str) -> Dict:
+		try:
+			with open(self._path(key)) as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return None
+
+	def _write(self, key: str, entry: Dict):
+		tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+		with open(tmp_path, 'w') as f:
+			json.dump(entry, f)
+		os.replace(tmp_path, self._path(key))
@@ -0,0 +1,368 @@
+"""
+Command line tool for batch jobs, installed as betfair-historical.
+
+	betfair-historical list --sport "Horse Racing" --plan "Basic Plan" --from-date 2020-01-01 --to-date 2020-01-31
+	betfair-historical download /data/racing --sport "Horse Racing" --plan "Basic Plan" --from-date 2020-01-01 --to-date 2020-01-31
+	betfair-historical parse /data/racing --sport horse_racing --market win --workers 4 --match-market-type
+	betfair-historical export /data/racing racing.parquet --sport horse_racing --market win --match-market-type
+	betfair-historical summarize /data/racing racing.csv --sport horse_racing --market win --workers 4 --match-market-type
+
+Credentials for list and download are read from the BETFAIR_USERNAME, BETFAIR_PASSWORD, BETFAIR_APP_KEY and
+BETFAIR_CERT_PATH environment variables unless they are passed as options. A throughput summary is printed to stderr
+at the end of each job, and the exit code is 1 if any file failed.
+
+Every command takes --shard i/N to process only shard i of N of the files, so a backfill can be spread across
+machines. Files are assigned to shards by a stable hash of their file name, which is the same for the remote and
+local path of a file, so the download and parse jobs of a shard always cover the same files.
+"""
+import argparse
+import calendar
+import logging
+import os
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Tuple
+
+from betfairHistorical.downloader import BetfairHistoricDownloader
+from betfairHistorical.parser import BetfairHistoricalFileParser
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+
+def shard_of(file_path: str, shard_count: int) -> int:
+	"""
+	Returns the shard of a file, from a stable hash of its file name.
+	"""
+	return zlib.crc32(file_path.replace('\\', '/').split('/')[-1].encode()) % shard_count
+
+def in_shard(file_paths: Iterable[str], shard: Tuple[int, int]) -> Iterator[str]:
+	"""
+	Yields the file paths which belong to shard, a tuple of the shard index and the number of shards.
+	"""
+	index, count = shard
+	for file_path in file_paths:
+		if shard_of(file_path, count) == index:
+			yield file_path
+
+def set_memory_limit(megabytes: int):
+	"""
+	Limits the memory the process, and any worker processes it starts, can allocate.
+	Allocations beyond the limit raise MemoryError rather than exhausting the machine.
+	"""
+	if resource is None:
+		logger.warning("--memory-limit is not supported on this platform and is ignored.")
+		return
+	limit = megabytes * 1024 * 1024
+	_, hard = resource.getrlimit(resource.RLIMIT_DATA)
+	if hard != resource.RLIM_INFINITY:
+		limit = min(limit, hard)
+	resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+
+
+def _shard(value: str) -> Tuple[int, int]:
+	try:
+		index, count = (int(part) for part in value.split('/'))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"shard must be i/N, e.g. 0/4, not {value!r}")
+	if count < 1 or not 0 <= index < count:
+		raise argparse.ArgumentTypeError(f"shard index must be between 0 and N - 1, not {value!r}")
+	return index, count
+
+def _date(value: str) -> datetime:
+	try:
+		return datetime.strptime(value, '%Y-%m-%d')
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"dates must be YYYY-MM-DD, not {value!r}")
+
+def _list(value: str) -> List[str]:
+	return [v for v in value.split(',') if v]
+
+def _millis(date: datetime) -> int:
+	return calendar.timegm(date.timetuple()) * 1000
+
+def build_parser() -> argparse.ArgumentParser:
+	"""
+	Returns the argument parser of the command line tool.
+	"""
+	common = argparse.ArgumentParser(add_help=False)
+	common.add_argument('--workers', type=int, default=None,
+		help="Concurrent downloads, or processes used to parse files. Files are parsed sequentially if not set.")
+	common.add_argument('--batch-size', type=int, default=100000,
+		help="Rows held in memory and written at once by export, or lines written at once by parse (default 100000)")
+	common.add_argument('--memory-limit', type=int, default=None, metavar='MB',
+		help="Memory each process may allocate. The job fails with MemoryError beyond it. "
+			"Each file is read in full before its lines are written, so allow for the largest file.")
+	common.add_argument('--shard', type=_shard, default=None, metavar='i/N',
+		help="Only process shard i of N of the files")
+	common.add_argument('-v', '--verbose', action='store_true', help="Log progress at INFO level")
+
+	remote = argparse.ArgumentParser(add_help=False)
+	remote.add_argument('--username', default=os.environ.get('BETFAIR_USERNAME'))
+	remote.add_argument('--password', default=os.environ.get('BETFAIR_PASSWORD'))
+	remote.add_argument('--app-key', default=os.environ.get('BETFAIR_APP_KEY'))
+	remote.add_argument('--cert-path', default=os.environ.get('BETFAIR_CERT_PATH'))
+	remote.add_argument('--sport', required=True, help="Betfair sport, e.g. Soccer")
+	remote.add_argument('--plan', required=True, help="Betfair plan, e.g. Basic Plan")
+	remote.add_argument('--from-date', type=_date, required=True, help="First date to collect, YYYY-MM-DD")
+	remote.add_argument('--to-date', type=_date, required=True, help="Last date to collect, YYYY-MM-DD")
+	remote.add_argument('--market-types', type=_list, default=[], help="Comma separated market types, e.g. MATCH_ODDS")
+	remote.add_argument('--countries', type=_list, default=[], help="Comma separated country codes, e.g. GB,IE")
+	remote.add_argument('--file-types', type=_list, default=['M'], help="Comma separated file types (default M)")
+	remote.add_argument('--cache-dir', default=None, help="Directory to cache file lists in between runs")
+
+	local = argparse.ArgumentParser(add_help=False)
+	local.add_argument('local_path', help="File or directory of files to read")
+	local.add_argument('--sport', required=True, help="Sport of the files, e.g. soccer")
+	local.add_argument('--plan', default='basic', help="Plan of the files (default basic)")
+	local.add_argument('--market', required=True, help="Market of the files, e.g. match_odds")
+	local.add_argument('--recursive', action='store_true', help="Read files in all subdirectories")
+	local.add_argument('--no-validate', dest='validate', action='store_false', help="Do not validate lines")
+	local.add_argument('--from-date', type=_date, default=None, help="Only read lines published on or after this date")
+	local.add_argument('--to-date', type=_date, default=None, help="Only read lines published on or before this date")
+	local.add_argument('--market-ids', type=_list, default=None, help="Comma separated market ids to read")
+	local.add_argument(
+		'--match-market-type',
+		action='store_true',
+		help="Only read markets whose marketType belongs to --market, e.g. WIN and not PLACE for horse_racing win"
+		)
+	local.add_argument('--ledger', default=None, help="Ledger database of processed files, to skip them on later runs")
+
+	parser = argparse.ArgumentParser(
+		prog='betfair-historical',
+		description="Batch jobs for Betfair historical data.",
+		epilog="Run betfair-historical <command> --help for the options of each command."
+		)
+	commands = parser.add_subparsers(dest='command', metavar='command')
+	commands.required = True
+
+	list_parser = commands.add_parser('list', parents=[common, remote], help="List the remote files in a date range")
+	list_parser.set_defaults(func=run_list)
+
+	download_parser = commands.add_parser('download', parents=[common, remote], help="Download the files in a date range")
+	download_parser.add_argument('local_dir', help="Directory to download files to")
+	download_parser.add_argument('--file-list', default=None,
+		help="File of remote paths to download, one per line as printed by list, or - for stdin. Queried if not set.")
+	download_parser.set_defaults(func=run_download)
+
+	parse_parser = commands.add_parser('parse', parents=[common, local], help="Read and validate local files")
+	parse_parser.add_argument('--output', default=None, help="Write every line read to this file, or - for stdout")
+	parse_parser.set_defaults(func=run_parse)
+
+	export_parser = commands.add_parser('export', parents=[common, local], help="Export local files to Parquet or Arrow")
+	export_parser.add_argument('output', help="File to write")
+	export_parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+		help="Output format. Taken from the extension of output if not set.")
+	export_parser.set_defaults(func=run_export)
+
+	summarize_parser = commands.add_parser('summarize', parents=[common, local], help="Write a csv summary of every runner of local files")
+	summarize_parser.add_argument('output', help="csv file to write")
+	summarize_parser.set_defaults(func=run_summarize)
+	return parser
+
+
+def _downloader(args: argparse.Namespace) -> BetfairHistoricDownloader:
+	missing = [name for name in ('username', 'password', 'app_key', 'cert_path') if not getattr(args, name)]
+	if missing:
+		raise SystemExit(
+			"Missing credentials: " + ", ".join(f"--{name.replace('_', '-')}" for name in missing)
+			+ ". These can also be set with the BETFAIR_* environment variables."
+			)
+	return BetfairHistoricDownloader(
+		username=args.username,
+		password=args.password,
+		app_key=args.app_key,
+		cert_path=args.cert_path,
+		sport=args.sport,
+		plan=args.plan,
+		from_date=args.from_date,
+		to_date=args.to_date,
+		login=False,
+		cache_ttl=24 * 60 * 60 if args.cache_dir else None,
+		cache_dir=args.cache_dir
+		)
+
+def _remote_files(args: argparse.Namespace, downloader: BetfairHistoricDownloader) -> List[str]:
+	file_list = downloader.file_list(
+		market_types_collection=args.market_types,
+		countries_collection=args.countries,
+		file_type_collection=args.file_types
+		)
+	if args.shard is not None:
+		file_list = list(in_shard(file_list, args.shard))
+	return file_list
+
+def _file_parser(args: argparse.Namespace, ledger=None) -> BetfairHistoricalFileParser:
+	return BetfairHistoricalFileParser(
+		local_path=args.local_path,
+		sport=args.sport,
+		plan=args.plan,
+		market=args.market,
+		recursive=args.recursive,
+		validate=args.validate,
+		lazy=True,
+		workers=args.workers,
+		market_ids=args.market_ids,
+		match_market_type=args.match_market_type,
+		from_time=_millis(args.from_date) if args.from_date else None,
+		to_time=_millis(args.to_date + timedelta(days=1)) - 1 if args.to_date else None,
+		instrument=True,
+		ledger=ledger
+		)
+
+def _iter_local_files(args: argparse.Namespace, parser: BetfairHistoricalFileParser, decode: bool):
+	"""
+	Yields each file of the job with its lines. Without workers each file is read in full before it is yielded, so that
+	a file which fails is recorded in parser.errors and skipped, as it is by workers, rather than ending the job.
+	"""
+	file_paths = parser.get_file_paths()
+	if args.shard is not None:
+		file_paths = list(in_shard(file_paths, args.shard))
+	for file_path, lines in parser.iter_paths(file_paths, decode=decode):
+		if not parser.workers:
+			try:
+				lines = list(lines)
+			except Exception as e:
+				parser.record_error(file_path, e)
+				continue
+		yield file_path, lines
+
+def _open_ledger(args: argparse.Namespace):
+	if args.ledger is None:
+		return None
+	from betfairHistorical.ledger import ProcessedLedger
+	return ProcessedLedger(args.ledger)
+
+def _summary(parser: BetfairHistoricalFileParser, extra: str=None):
+	print(parser.stats.summary(), file=sys.stderr)
+	if extra:
+		print(extra, file=sys.stderr)
+	for file_path, error in parser.errors.items():
+		print(f"failed: {file_path}: {error!r}", file=sys.stderr)
+
+
+def run_list(args: argparse.Namespace) -> int:
+	started = time.perf_counter()
+	file_list = _remote_files(args, _downloader(args))
+	for file_path in file_list:
+		print(file_path)
+	print(f"{len(file_list)} files in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+	return 0
+
+def run_download(args: argparse.Namespace) -> int:
+	downloader = _downloader(args)
+	if args.file_list is None:
+		file_list = _remote_files(args, downloader)
+	else:
+		with (sys.stdin if args.file_list == '-' else open(args.file_list)) as f:
+			file_list = [line.strip() for line in f if line.strip()]
+		if args.shard is not None:
+			file_list = list(in_shard(file_list, args.shard))
+	os.makedirs(args.local_dir, exist_ok=True)
+
+	started = time.perf_counter()
+	downloaded = size = 0
+	for local_path in downloader.iter_download_files(file_list, args.local_dir, max_workers=args.workers or 4):
+		downloaded += 1
+		size += os.path.getsize(local_path)
+	elapsed = time.perf_counter() - started
+	print(
+		f"{downloaded} of {len(file_list)} files ({len(downloader.errors)} failed), {size / 1e6:.1f} MB in {elapsed:.2f}s\n"
+		f"throughput: {size / 1e6 / (elapsed or float('nan')):.1f} MB/s, {downloaded / (elapsed or float('nan')):.1f} files/s",
+		file=sys.stderr
+		)
+	for file_path, error in downloader.errors.items():
+		print(f"failed: {file_path}: {error!r}", file=sys.stderr)
+	return 1 if downloader.errors else 0
+
+def run_parse(args: argparse.Namespace) -> int:
+	ledger = _open_ledger(args)
+	parser = _file_parser(args, ledger=ledger)
+	output = None
+	if args.output is not None:
+		output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+	try:
+		batch = []
+		for _, lines in _iter_local_files(args, parser, decode=False):
+			for line in lines:
+				if output is None:
+					continue
+				batch.append(line if line.endswith(b'\n') else line + b'\n')
+				if len(batch) >= args.batch_size:
+					output.writelines(batch)
+					batch = []
+		if batch:
+			output.writelines(batch)
+	finally:
+		if output is not None and output is not sys.stdout.buffer:
+			output.close()
+		if ledger is not None:
+			ledger.close()
+	_summary(parser)
+	return 1 if parser.errors else 0
+
+def run_export(args: argparse.Namespace) -> int:
+	from betfairHistorical.export import write_arrow, write_parquet
+
+	export_format = args.format
+	if export_format is None:
+		extension = os.path.splitext(args.output)[1].lower().lstrip('.')
+		export_format = {'parquet': 'parquet', 'pq': 'parquet', 'arrow': 'arrow', 'feather': 'arrow'}.get(extension)
+		if export_format is None:
+			raise SystemExit(f"Cannot tell the format of {args.output}, set --format to one of {', '.join(EXPORT_FORMATS)}.")
+	write = write_parquet if export_format == 'parquet' else write_arrow
+
+	ledger = _open_ledger(args)
+	parser = _file_parser(args, ledger=ledger)
+	markets = (market for _, lines in _iter_local_files(args, parser, decode=True) for market in lines)
+	try:
+		rows = write(markets, args.output, batch_size=args.batch_size, plan=parser.plan)
+	finally:
+		if ledger is not None:
+			ledger.close()
+	elapsed = parser.stats.totals()['elapsed'] or float('nan')
+	_summary(parser, f"exported {rows} rows to {args.output} ({rows / elapsed:.0f} rows/s)")
+	return 1 if parser.errors else 0
+
+
+def run_summarize(args: argparse.Namespace) -> int:
+	from betfairHistorical.summary import write_csv
+
+	ledger = _open_ledger(args)
+	parser = _file_parser(args, ledger=ledger)
+	file_paths = parser.get_file_paths()
+	if args.shard is not None:
+		file_paths = list(in_shard(file_paths, args.shard))
+	try:
+		rows = write_csv(parser.summarize(file_paths), args.output)
+	finally:
+		if ledger is not None:
+			ledger.close()
+	_summary(parser, f"summarized {rows} runners to {args.output}")
+	return 1 if parser.errors else 0
+
+
+def main(argv: List[str]=None) -> int:
+	"""
+	Runs the command line tool with argv, or the arguments of the process if None.
+
+	return: The exit code, 1 if any file failed
+	"""
+	args = build_parser().parse_args(argv)
+	if args.verbose:
+		logging.getLogger('betfairHistorical').setLevel(logging.INFO)
+	if args.memory_limit is not None:
+		set_memory_limit(args.memory_limit)
+	return args.func(args)
+
+
+if __name__ == '__main__':
+	sys.exit(main())
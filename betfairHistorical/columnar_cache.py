@@ -0,0 +1,276 @@
+"""
+A cache of the decoded contents of historical files as memory-mapped columns, so repeat analysis of the same files
+skips decompression and decoding.
+
+Each file is cached as the columns of betfairHistorical.export, one row per runner change, with market_id stored as
+int32 codes into the market ids of the file. An entry is a directory holding a json header and one file of raw
+values per column, keyed by the sha256 of the source file, PARSER_VERSION and the plan, validation and filters of the
+parser which built it. The hash of each source file is kept in a SQLite database in the cache directory, along with its
+size and modification time, so a file is only hashed again if either has changed and a cache hit does not read the
+source file. Columns are read back through mmap, as zero-copy NumPy arrays if numpy is installed, or as memoryviews
+otherwise.
+
+Entries are written to a temporary directory and moved into place once complete, and the temporary directory is
+removed if the file fails to read. The cache is kept under max_bytes by removing the least recently used entries.
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+from betfairHistorical.export import MARKET_STATUSES, iter_batches
+from betfairHistorical.globals import PARSER_VERSION
+from betfairHistorical.ledger import file_hash
+
+if TYPE_CHECKING:
+	from betfairHistorical.parser import BetfairHistoricalFileParser
+
+HEADER_FILE = 'header.json'
+HASHES_FILE = 'hashes.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+	path TEXT PRIMARY KEY,
+	size INTEGER NOT NULL,
+	mtime REAL NOT NULL,
+	sha256 TEXT NOT NULL
+);
+"""
+
+# name, array type code and NumPy dtype of each cached column
+COLUMNS = (
+	('published_time', 'q', 'i8'),
+	('market_id', 'i', 'i4'),
+	('selection_id', 'q', 'i8'),
+	('ltp', 'd', 'f8'),
+	('tv', 'd', 'f8'),
+	('market_status', 'b', 'i1')
+)
+
+
+class CachedColumns:
+	"""
+	The memory-mapped columns of a single cached file.
+	"""
+	def __init__(self, entry_dir: str):
+		with open(os.path.join(entry_dir, HEADER_FILE)) as f:
+			header = json.load(f)
+		self.entry_dir = entry_dir
+		self.rows = header['rows']
+		self.market_ids = header['market_ids']
+		self.source = header['source']
+		self._maps = {}
+
+	def __len__(self) -> int:
+		return self.rows
+
+	def __getitem__(self, name: str):
+		return self.column(name)
+
+	def column(self, name: str):
+		"""
+		Returns a read-only view of a column, as a NumPy array if numpy is installed, otherwise a memoryview.
+		Views share the memory-mapped file, so no data is copied. market_id is returned as codes into market_ids.
+		"""
+		for column, type_code, dtype in COLUMNS:
+			if column == name:
+				break
+		else:
+			raise KeyError(name)
+
+		if not self.rows:
+			return numpy.zeros(0, dtype=dtype) if numpy is not None else memoryview(array(type_code))
+		mapped = self._maps.get(name)
+		if mapped is None:
+			with open(os.path.join(self.entry_dir, f"{name}.bin"), 'rb') as f:
+				mapped = self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		if numpy is not None:
+			return numpy.frombuffer(mapped, dtype=dtype)
+		return memoryview(mapped).cast(type_code)
+
+	def columns(self) -> Dict:
+		"""
+		Returns every column by name.
+		"""
+		return {name: self.column(name) for name, _, _ in COLUMNS}
+
+	def market_id_values(self) -> List[str]:
+		"""
+		Returns the market id of every row as strings, rather than codes.
+		"""
+		return [self.market_ids[code] for code in self.column('market_id')]
+
+
+class ColumnarCache:
+	def __init__(self, cache_dir: str, max_bytes: int=None):
+		"""
+		:param cache_dir: Directory to store cached files in
+		:param max_bytes: Maximum total size of the cache. Least recently used entries are removed once it is exceeded.
+			If None entries are never removed.
+		"""
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(self.cache_dir, exist_ok=True)
+		self.connection = sqlite3.connect(os.path.join(self.cache_dir, HASHES_FILE))
+		self.connection.executescript(_SCHEMA)
+
+	def close(self):
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def key(self, file_path: str, parser: 'BetfairHistoricalFileParser') -> str:
+		"""
+		Returns the key of a file's entry, from the hash of its contents, PARSER_VERSION and the plan, validation and filters of parser.
+		An entry written without validation is therefore never returned to a parser which validates.
+		"""
+		market_filter = parser.market_filter
+		market_types = market_filter.market_types
+		if parser.validate:
+			validation = [parser.sport, parser.plan, parser.market, parser.validation_schema, parser.validate_first, parser.validate_every]
+		else:
+			validation = None
+		filters = json.dumps([
+			parser.plan,
+			validation,
+			sorted(market_filter.market_ids) if market_filter.market_ids is not None else None,
+			sorted(market_filter.selection_ids) if market_filter.selection_ids is not None else None,
+			market_filter.from_time,
+			market_filter.to_time,
+			market_filter.require_market_definition,
+			market_filter.require_runner_change,
+			[market_types.market_types, market_types.prefix] if market_types is not None else None
+			], sort_keys=True)
+		return f"{self.file_hash(file_path)}-v{PARSER_VERSION}-{hashlib.sha256(filters.encode()).hexdigest()[:16]}"
+
+	def file_hash(self, file_path: str) -> str:
+		"""
+		Returns the sha256 of a file's contents. The file is only read if its size or modification time have changed
+		since it was last hashed.
+		"""
+		path = os.path.abspath(file_path)
+		stat = os.stat(path)
+		row = self.connection.execute("SELECT size, mtime, sha256 FROM hashes WHERE path = ?", (path,)).fetchone()
+		if row is not None and (row[0], row[1]) == (stat.st_size, stat.st_mtime):
+			return row[2]
+		sha256 = file_hash(path)
+		with self.connection:
+			self.connection.execute(
+				"INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+				(path, stat.st_size, stat.st_mtime, sha256)
+				)
+		return sha256
+
+	def get(self, file_path: str, parser: 'BetfairHistoricalFileParser') -> CachedColumns:
+		"""
+		Returns the cached columns of file_path, parsing it with parser and caching the result if there is no entry.
+
+		:param file_path: Local path of the file
+		:param parser: Parser used to read the file on a miss, whose validation and filters apply
+		"""
+		entry_dir = os.path.join(self.cache_dir, self.key(file_path, parser))
+		if os.path.isdir(entry_dir):
+			self.hits += 1
+			os.utime(entry_dir)
+		else:
+			self.misses += 1
+			self._write(entry_dir, file_path, parser._iter_file(file_path, decode=True), parser.plan)
+			self.evict(keep=entry_dir)
+		return CachedColumns(entry_dir)
+
+	def _write(self, entry_dir: str, file_path: str, markets: Iterable[Dict], plan: str=None):
+		"""
+		Writes the columns of a stream of markets to a new entry, one batch at a time.
+		"""
+		tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+		os.makedirs(tmp_dir, exist_ok=True)
+		try:
+			self._write_columns(tmp_dir, file_path, markets, plan)
+		except BaseException:
+			shutil.rmtree(tmp_dir, ignore_errors=True)
+			raise
+		try:
+			os.replace(tmp_dir, entry_dir)
+		except OSError:
+			# another process cached the same file first
+			shutil.rmtree(tmp_dir, ignore_errors=True)
+
+	@staticmethod
+	def _write_columns(tmp_dir: str, file_path: str, markets: Iterable[Dict], plan: str=None):
+		codes = {}
+		rows = 0
+		files = {name: open(os.path.join(tmp_dir, f"{name}.bin"), 'wb') for name, _, _ in COLUMNS}
+		try:
+			for batch in iter_batches(markets, plan=plan):
+				batch['market_id'] = array('i', [codes.setdefault(m, len(codes)) for m in batch['market_id']])
+				for name, _, _ in COLUMNS:
+					batch[name].tofile(files[name])
+				rows += len(batch['market_id'])
+		finally:
+			for f in files.values():
+				f.close()
+
+		with open(os.path.join(tmp_dir, HEADER_FILE), 'w') as f:
+			json.dump({
+				'source': os.path.abspath(file_path),
+				'parser_version': PARSER_VERSION,
+				'rows': rows,
+				'market_ids': list(codes),
+				'market_statuses': MARKET_STATUSES
+				}, f)
+
+	def entries(self) -> List[Tuple[str, int, float]]:
+		"""
+		Returns the path, size in bytes and last use time of every entry, least recently used first.
+		"""
+		entries = []
+		for name in os.listdir(self.cache_dir):
+			entry_dir = os.path.join(self.cache_dir, name)
+			if name.endswith('.tmp') or not os.path.isdir(entry_dir):
+				continue
+			size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+			entries.append((entry_dir, size, os.path.getmtime(entry_dir)))
+		return sorted(entries, key=lambda entry: entry[2])
+
+	def size(self) -> int:
+		"""
+		Returns the total size of the cache in bytes.
+		"""
+		return sum(size for _, size, _ in self.entries())
+
+	def evict(self, keep: str=None) -> int:
+		"""
+		Removes least recently used entries until the cache is within max_bytes.
+
+		:param keep: An entry which is not removed, such as one which has just been written
+		return: Number of entries removed
+		"""
+		if self.max_bytes is None:
+			return 0
+		entries = self.entries()
+		total = sum(size for _, size, _ in entries)
+		removed = 0
+		for entry_dir, size, _ in entries:
+			if total <= self.max_bytes:
+				break
+			if entry_dir == keep:
+				continue
+			shutil.rmtree(entry_dir, ignore_errors=True)
+			total -= size
+			removed += 1
+		return removed
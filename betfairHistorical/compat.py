@@ -0,0 +1,29 @@
+"""
+Optional dependencies which speed up the package, with fallbacks to the standard library when they are not installed.
+
+json_loads - decodes a str or bytes json document, using orjson if available.
+zstandard - the zstandard module if installed, otherwise None.
+require - raises an ImportError if an optional dependency such as numpy or pyarrow is not installed.
+"""
+try:
+	import orjson
+	json_loads = orjson.loads
+except ImportError:
+	import json
+	json_loads = json.loads
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+
+def require(module, name: str):
+	"""
+	Raises an ImportError if an optional dependency is not installed.
+
+	:param module: The imported module, or None if it is not installed
+	:param name: Name of the dependency to install
+	"""
+	if module is None:
+		raise ImportError(f"{name} is required for this feature. It can be installed with pip install {name}.")
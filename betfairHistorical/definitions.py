@@ -0,0 +1,191 @@
+"""
+Deduplication of the marketDefinitions of decoded markets, and interning of their strings.
+
+Every marketDefinition in a historical file is sent in full, including the runner list, names, event details and
+settings, even when only the status or version has changed. DefinitionDeduplicator tracks the last definition of each
+market and replaces each definition with only the keys which changed since it:
+
+- The first definition of a market, and any sent with an image (img), are returned in full.
+- A key which changed has its new value, and a key which was removed is set to None.
+- If any runner changed, runners lists every runner of the definition in order, each as its id, hc if present, and only
+  the keys which changed. Runners which are new are given in full.
+- A definition which has not changed at all is removed, along with its market change if nothing else is left in it,
+  and the line is dropped if no market change is left.
+
+apply_definition rebuilds the full definition from the previous definition and a delta, and MarketBook applies
+definitions in this way, so deduplicated markets can be replayed as they are. Records do not keep keys which are
+None, so removed keys are not seen when deduplicated lines are returned as records.
+
+Strings in market ids and definitions, such as runner names, event names, country codes and statuses, are interned
+in a SymbolTable, so every line holds a reference to a single copy of each. Unlike sys.intern the table belongs to a
+single run and is freed with it.
+"""
+from typing import Dict, Iterable, List, Optional
+
+_MISSING = object()
+
+
+class SymbolTable:
+	"""
+	A table of interned strings, shared by everything decoded in a run.
+	"""
+	def __init__(self):
+		self._symbols = {}
+
+	def __len__(self) -> int:
+		return len(self._symbols)
+
+	def __contains__(self, value: str) -> bool:
+		return value in self._symbols
+
+	def intern(self, value: str) -> str:
+		"""
+		Returns the copy of value held in the table, adding it if there is none.
+		"""
+		return self._symbols.setdefault(value, value)
+
+	def intern_definition(self, definition: Dict) -> Dict:
+		"""
+		Interns the string values of a decoded marketDefinition and its runners in place.
+		"""
+		intern = self._symbols.setdefault
+		for key, value in definition.items():
+			if type(value) is str:
+				definition[key] = intern(value, value)
+		regulators = definition.get('regulators')
+		if regulators:
+			definition['regulators'] = [intern(r, r) if type(r) is str else r for r in regulators]
+		for runner in definition.get('runners') or ():
+			for key, value in runner.items():
+				if type(value) is str:
+					runner[key] = intern(value, value)
+		return definition
+
+
+class DefinitionDeduplicator:
+	def __init__(self, symbols: SymbolTable=None):
+		"""
+		Replaces the marketDefinitions of a stream of decoded markets with the keys which changed since the previous
+		definition of the same market. A single instance must see every line of the markets it tracks, in order.
+
+		:param symbols: The SymbolTable strings are interned in. If None a new table is used.
+		"""
+		self.symbols = symbols if symbols is not None else SymbolTable()
+		self.definitions = {}
+
+	def process(self, market: Dict) -> Optional[Dict]:
+		"""
+		Deduplicates the definitions of a single decoded line in place.
+
+		:param market: A single decoded line of a file
+		return: The same line, or None if its only changes were unchanged definitions
+		"""
+		market_changes = market.get('mc')
+		if not market_changes:
+			return market
+		intern = self.symbols.intern
+		unchanged = False
+		for market_change in market_changes:
+			market_id = market_change.get('id')
+			if market_id is not None:
+				market_change['id'] = market_id = intern(market_id)
+			definition = market_change.get('marketDefinition')
+			if not definition:
+				continue
+
+			self.symbols.intern_definition(definition)
+			previous = self.definitions.get(market_id)
+			self.definitions[market_id] = definition
+			if previous is None or market_change.get('img'):
+				continue
+			delta = diff_definition(previous, definition)
+			if delta:
+				market_change['marketDefinition'] = delta
+			else:
+				del market_change['marketDefinition']
+				unchanged = unchanged or len(market_change) == 1
+
+		if unchanged:
+			market['mc'] = [market_change for market_change in market_changes if len(market_change) > 1]
+			if not market['mc']:
+				return None
+		return market
+
+
+def diff_definition(previous: Dict, definition: Dict) -> Dict:
+	"""
+	Returns the keys of definition which differ from previous, as described above. Empty if nothing changed.
+	"""
+	delta = {}
+	for key, value in definition.items():
+		if key != 'runners' and previous.get(key, _MISSING) != value:
+			delta[key] = value
+	for key in previous:
+		if key not in definition:
+			delta[key] = None
+	previous_runners = previous.get('runners') or []
+	runners = definition.get('runners') or []
+	# most definitions leave every runner unchanged, which is checked without building deltas
+	runners = _diff_runners(previous_runners, runners) if runners != previous_runners else None
+	if runners:
+		delta['runners'] = runners
+	return delta
+
+def apply_definition(previous: Dict, delta: Dict) -> Dict:
+	"""
+	Returns the full definition given the previous definition of a market and the keys which changed since it.
+	A full definition can be passed as delta, in which case its keys replace those of previous.
+	"""
+	definition = dict(previous)
+	for key, value in delta.items():
+		if key == 'runners':
+			definition['runners'] = _apply_runners(previous.get('runners') or (), value)
+		elif value is None:
+			definition.pop(key, None)
+		else:
+			definition[key] = value
+	return definition
+
+
+def _runner_key(runner: Dict):
+	return runner.get('id'), runner.get('hc', 0)
+
+def _diff_runners(previous: List[Dict], runners: List[Dict]) -> List[Dict]:
+	"""
+	Returns every runner of runners with only the keys which changed since previous, or an empty list if none changed.
+	"""
+	previous = {_runner_key(runner): runner for runner in previous}
+	changed = len(previous) != len(runners)
+	deltas = []
+	for runner in runners:
+		previous_runner = previous.get(_runner_key(runner))
+		if previous_runner is None:
+			changed = True
+			deltas.append(runner)
+			continue
+		delta = {}
+		for key, value in runner.items():
+			if previous_runner.get(key, _MISSING) != value:
+				delta[key] = value
+		for key in previous_runner:
+			if key not in runner:
+				delta[key] = None
+		changed = changed or bool(delta)
+		delta['id'] = runner.get('id')
+		if 'hc' in runner:
+			delta['hc'] = runner['hc']
+		deltas.append(delta)
+	return deltas if changed or [_runner_key(r) for r in runners] != list(previous) else []
+
+def _apply_runners(previous: Iterable[Dict], deltas: List[Dict]) -> List[Dict]:
+	previous = {_runner_key(runner): runner for runner in previous}
+	runners = []
+	for delta in deltas:
+		runner = dict(previous.get(_runner_key(delta)) or ())
+		for key, value in delta.items():
+			if value is None:
+				runner.pop(key, None)
+			else:
+				runner[key] = value
+		runners.append(runner)
+	return runners
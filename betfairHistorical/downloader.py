@@ -1,9 +1,18 @@
+import calendar
+import json
 import logging
-from datetime import datetime
-from typing import Dict, List
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 import betfairlightweight
+import requests
 
+from betfairHistorical.cache import MetadataCache
 from betfairHistorical.exceptions import MissingArguments
 
 """
@@ -14,6 +23,8 @@ This will apply the relevant functions to all files contained within
 the provided date range for the provided sport and plan.
 """
 
+MANIFEST_FILE = '.betfair_historical_manifest.json'
+
 logger = logging.getLogger()
 logging.basicConfig(
             format='[%(asctime)s][%(threadName)s][%(levelname)s]: %(message)s',
@@ -30,7 +41,10 @@ class BetfairHistoricDownloader:
 		sport: str=None,
 		plan: str=None,
 		from_date: datetime=None,
-		to_date: datetime=None
+		to_date: datetime=None,
+		login: bool=True,
+		cache_ttl: float=None,
+		cache_dir: str=None
 		):
 		"""
 		Creates an instance to allow for interaction with the betfairlightweight API.
@@ -45,6 +59,11 @@ class BetfairHistoricDownloader:
 		:param plan: Betfair plan
 		:param from_date: Datetime of earliest date to collect
 		:param to_date: Datetime of latest date to collect
+		:param login: Login on init. If False login is deferred until the first request which needs it.
+		:param cache_ttl: Number of seconds the results of available_data, collection_options, basket_size and file_list are cached for.
+			If None results are not cached, other than available_data which is kept for the life of the instance.
+		:param cache_dir: Directory to persist cached results to, so they are shared between instances and runs.
+			If None results are only cached in memory.
 		"""
 
 		self.username = username
@@ -61,9 +80,50 @@ class BetfairHistoricDownloader:
 			app_key=app_key,
 			certs=cert_path
 			)
-		self.trading.login()
+		self.historic_url = self.trading.historic.url
+		self.errors = {}
+		self.cache = MetadataCache(ttl=cache_ttl, cache_dir=cache_dir) if cache_ttl is not None else None
+		self._available_data = None
+		self._login_lock = threading.Lock()
+
+		if login:
+			self.trading.login()
+
+	def _login(self):
+		"""
+		Logs in if there is no current session, or the session is due to expire.
+		Only one thread logs in however many find the session expired at the same time.
+		"""
+		if self.trading.session_expired:
+			with self._login_lock:
+				# another thread may have logged in while this one waited for the lock
+				if self.trading.session_expired:
+					self.trading.login()
+
+	def _cached(self, func, *key_parts):
+		"""
+		Returns the result of func, from the cache if caching is enabled and a valid entry exists for key_parts.
+		Login only happens if func has to be called.
+		"""
+		def _call():
+			self._login()
+			return func()
+
+		if self.cache is None:
+			return _call()
+		return self.cache.get_or_set(self.cache.key(self.username, *key_parts), _call)
 
-		self.available_data = self.trading.historic.get_my_data()
+	@property
+	def available_data(self) -> List:
+		"""
+		The historic data purchased by the account. This is requested on first use, and again on each use once
+		the cached result has expired. If caching is not enabled it is only requested once per instance.
+		"""
+		if self.cache is not None:
+			return self._cached(self.trading.historic.get_my_data, 'available_data')
+		if self._available_data is None:
+			self._available_data = self._cached(self.trading.historic.get_my_data, 'available_data')
+		return self._available_data
 
 	def _validate_args(self):
 		"""
@@ -78,15 +138,13 @@ class BetfairHistoricDownloader:
 		Returns the collection options available (allows filtering)
 		"""
 		self._validate_args()
-		_collection_options = self.trading.historic.get_collection_options(
-			sport=self.sport,
-			plan=self.plan,
-			from_day=self.from_date.day,
-			from_month=self.from_date.month,
-			from_year=self.from_date.year,
-			to_day=self.to_date.day,
-			to_month=self.to_date.month,
-			to_year=self.to_date.year
+		_collection_options = self._cached(
+			lambda: self.trading.historic.get_collection_options(
+				sport=self.sport,
+				plan=self.plan,
+				**self._date_params(self.from_date, self.to_date)
+				),
+			'collection_options', self.sport, self.plan, self.from_date.date(), self.to_date.date()
 			)
 		return _collection_options
 
@@ -97,15 +155,13 @@ class BetfairHistoricDownloader:
 		return: Dictionary containing details of basket size
 		"""
 		self._validate_args()
-		_basket_size = self.trading.historic.get_data_size(
-			sport=self.sport,
-			plan=self.plan,
-			from_day=self.from_date.day,
-			from_month=self.from_date.month,
-			from_year=self.from_date.year,
-			to_day=self.to_date.day,
-			to_month=self.to_date.month,
-			to_year=self.to_date.year
+		_basket_size = self._cached(
+			lambda: self.trading.historic.get_data_size(
+				sport=self.sport,
+				plan=self.plan,
+				**self._date_params(self.from_date, self.to_date)
+				),
+			'basket_size', self.sport, self.plan, self.from_date.date(), self.to_date.date()
 			)
 		return _basket_size
 
@@ -117,6 +173,8 @@ class BetfairHistoricDownloader:
 		) -> List:
 		"""
 		Gets the list of files contained within the parameters.
+		If caching is enabled the date range is requested one calendar month at a time, and each month is cached
+		independently so that extending the range only requests the new months. Otherwise it is a single request.
 
 		:param market_types_collection: List of market types to collect
 		:param countries_collection: List of countries to collect
@@ -124,21 +182,60 @@ class BetfairHistoricDownloader:
 		return: List of files contained within the parameters
 		"""
 		self._validate_args()
-		_file_list = self.trading.historic.get_file_list(
-			sport=self.sport,
-			plan=self.plan,
-			from_day=self.from_date.day,
-			from_month=self.from_date.month,
-			from_year=self.from_date.year,
-			to_day=self.to_date.day,
-			to_month=self.to_date.month,
-			to_year=self.to_date.year,
-			market_types_collection=market_types_collection,
-			countries_collection=countries_collection,
-			file_type_collection=file_type_collection
-			)
+		_file_list = []
+		_seen = set()
+		if self.cache is not None:
+			_ranges = self._month_ranges(self.from_date, self.to_date)
+		else:
+			_ranges = [(self.from_date.date(), self.to_date.date())]
+		for from_date, to_date in _ranges:
+			_month_file_list = self._cached(
+				lambda: self.trading.historic.get_file_list(
+					sport=self.sport,
+					plan=self.plan,
+					**self._date_params(from_date, to_date),
+					market_types_collection=market_types_collection,
+					countries_collection=countries_collection,
+					file_type_collection=file_type_collection
+					),
+				'file_list', self.sport, self.plan, from_date, to_date,
+				market_types_collection, countries_collection, file_type_collection
+				)
+			for f in _month_file_list:
+				if f not in _seen:
+					_seen.add(f)
+					_file_list.append(f)
 		return _file_list
 
+	@staticmethod
+	def _date_params(from_date: datetime, to_date: datetime) -> Dict:
+		"""
+		Returns the date arguments of the historic data requests for a date range.
+		"""
+		return {
+			'from_day': from_date.day,
+			'from_month': from_date.month,
+			'from_year': from_date.year,
+			'to_day': to_date.day,
+			'to_month': to_date.month,
+			'to_year': to_date.year
+			}
+
+	@staticmethod
+	def _month_ranges(from_date: datetime, to_date: datetime) -> List[Tuple[datetime, datetime]]:
+		"""
+		Splits a date range into the parts of it within each calendar month.
+		Only dates are used, as the historic data requests are made by day.
+		"""
+		_ranges = []
+		start = from_date.date()
+		end = to_date.date()
+		while start <= end:
+			month_end = start.replace(day=calendar.monthrange(start.year, start.month)[1])
+			_ranges.append((start, min(month_end, end)))
+			start = month_end + timedelta(days=1)
+		return _ranges
+
 	def download_file(self, file_path: str, local_dir: str):
 		"""
 		Downloads a single file.
@@ -147,8 +244,170 @@ class BetfairHistoricDownloader:
 		:param local_dir: Local directory to download file to
 		"""
 		logger.debug(f"Downloading {file_path}.")
+		self._login()
 		_downloaded_file = self.trading.historic.download_file(
 			file_path=file_path,
 			store_directory=local_dir
 			)
 		return _downloaded_file
+
+	def download_files(
+		self,
+		file_list: List,
+		local_dir: str,
+		max_workers: int=4,
+		retries: int=3,
+		backoff: float=1.0,
+		chunk_size: int=1024 * 1024
+		) -> List[str]:
+		"""
+		Downloads many files concurrently over a shared connection pool.
+
+		Completed files are recorded with their size in a manifest in local_dir, and files which are already
+		present with the expected size are skipped, so an interrupted run can be resumed by calling this again.
+		Files are written to a .part file and moved into place once complete.
+		Files which fail after all retries are logged and recorded in errors rather than stopping the run.
+
+		:param file_list: Remote file paths to be downloaded, as returned by file_list
+		:param local_dir: Local directory to download files to
+		:param max_workers: Number of files downloaded at once
+		:param retries: Number of times a failed download is retried
+		:param backoff: Seconds to wait before the first retry, doubling for each subsequent retry
+		:param chunk_size: Number of bytes written to disk at a time
+		return: Local paths of all files which are present after the run
+		"""
+		return list(self.iter_download_files(
+			file_list=file_list,
+			local_dir=local_dir,
+			max_workers=max_workers,
+			retries=retries,
+			backoff=backoff,
+			chunk_size=chunk_size
+			))
+
+	def iter_download_files(
+		self,
+		file_list: Iterable,
+		local_dir: str,
+		max_workers: int=4,
+		retries: int=3,
+		backoff: float=1.0,
+		chunk_size: int=1024 * 1024
+		) -> Iterator[str]:
+		"""
+		Downloads many files concurrently as download_files, yielding the local path of each file as soon as it is on disk.
+		Only max_workers downloads are in flight at once, and no more are started until completed files are consumed.
+
+		:param file_list: Remote file paths to be downloaded, as returned by file_list
+		:param local_dir: Local directory to download files to
+		:param max_workers: Number of files downloaded at once
+		:param retries: Number of times a failed download is retried
+		:param backoff: Seconds to wait before the first retry, doubling for each subsequent retry
+		:param chunk_size: Number of bytes written to disk at a time
+		"""
+		self._login()
+		manifest_path = os.path.join(local_dir, MANIFEST_FILE)
+		manifest = self._read_manifest(manifest_path)
+		manifest_lock = threading.Lock()
+
+		session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+		session.mount('https://', adapter)
+		session.mount('http://', adapter)
+
+		def _download(file_path: str) -> str:
+			local_path = os.path.join(local_dir, file_path.split('/')[-1])
+			expected_size = manifest.get(file_path)
+			if expected_size is not None and os.path.exists(local_path) and os.path.getsize(local_path) == expected_size:
+				logger.debug(f"Skipping {file_path}, already downloaded.")
+				return local_path
+
+			# the session may expire during a long run
+			self._login()
+			for attempt in range(retries + 1):
+				try:
+					size = self._download_to_path(session, file_path, local_path, chunk_size)
+					break
+				except (requests.RequestException, IOError) as e:
+					if attempt == retries:
+						raise
+					wait_time = backoff * 2 ** attempt
+					logger.warning(f"Failed to download {file_path} ({e!r}), retrying in {wait_time}s.")
+					time.sleep(wait_time)
+
+			with manifest_lock:
+				manifest[file_path] = size
+				self._write_manifest(manifest_path, manifest)
+			return local_path
+
+		file_paths = iter(file_list)
+		with session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+			pending = {executor.submit(_download, f): f for f in islice(file_paths, max_workers)}
+			while pending:
+				done, _ = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					file_path = pending.pop(future)
+					try:
+						local_path = future.result()
+					except Exception as e:
+						logger.error(f"Failed to download {file_path}: {e!r}")
+						self.errors[file_path] = e
+						local_path = None
+					for next_path in islice(file_paths, 1):
+						pending[executor.submit(_download, next_path)] = next_path
+					if local_path is not None:
+						yield local_path
+
+	def _download_to_path(self, session: requests.Session, file_path: str, local_path: str, chunk_size: int) -> int:
+		"""
+		Streams a single remote file to local_path, skipping the download if a file of the same size is already there.
+
+		return: Size of the local file in bytes
+		"""
+		with session.get(
+			f"{self.historic_url}DownloadFile",
+			params={"filePath": file_path},
+			headers=self.trading.historic.headers,
+			stream=True,
+			timeout=(self.trading.historic.connect_timeout, self.trading.historic.read_timeout)
+			) as response:
+			response.raise_for_status()
+			content_length = response.headers.get('Content-Length')
+			expected_size = int(content_length) if content_length is not None else None
+			if expected_size is not None and os.path.exists(local_path) and os.path.getsize(local_path) == expected_size:
+				logger.debug(f"Skipping {file_path}, already present with matching size.")
+				return expected_size
+
+			logger.debug(f"Downloading {file_path}.")
+			part_path = f"{local_path}.part"
+			size = 0
+			with open(part_path, 'wb') as f:
+				for chunk in response.iter_content(chunk_size=chunk_size):
+					f.write(chunk)
+					size += len(chunk)
+
+		if expected_size is not None and size != expected_size:
+			os.remove(part_path)
+			raise IOError(f"Incomplete download of {file_path}, received {size} of {expected_size} bytes.")
+		os.replace(part_path, local_path)
+		return size
+
+	@staticmethod
+	def _read_manifest(manifest_path: str) -> Dict:
+		"""
+		Reads the manifest of completed downloads, a dictionary of remote file path to size in bytes.
+		"""
+		if not os.path.exists(manifest_path):
+			return {}
+		with open(manifest_path) as f:
+			return json.load(f)
+
+	@staticmethod
+	def _write_manifest(manifest_path: str, manifest: Dict):
+		"""
+		Atomically replaces the manifest of completed downloads.
+		"""
+		tmp_path = f"{manifest_path}.tmp"
+		with open(tmp_path, 'w') as f:
+			json.dump(manifest, f)
+		os.replace(tmp_path, manifest_path)
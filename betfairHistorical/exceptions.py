@@ -1,3 +1,5 @@
+from jsonschema import ValidationError
+
 class InvalidMarket(Exception):
 	"""
 	Raised when the market passed to the parser is of an invalid structure.
@@ -17,3 +19,25 @@ class MissingArguments(Exception):
 	Raised when values for sport, plan, from_date, to_date have not been set in BetfairHistoricDownloader.
 	"""
 	pass
+
+class NoValidationSchema(Exception):
+	"""
+	Raised when validation is requested but no schema has been provided and no default exists for the sport and market.
+	"""
+	pass
+
+class InvalidLine(ValidationError):
+	"""
+	Raised when a line of a file fails validation. This is a jsonschema ValidationError which also records
+	where the failure is: file_path, line_number (counting from 1) and market_id, the id of the line's first market change.
+	"""
+	def __init__(self, message: str, file_path: str=None, line_number: int=None, market_id: str=None):
+		super().__init__(f"{file_path} line {line_number} (market {market_id}): {message}")
+		self.file_path = file_path
+		self.line_number = line_number
+		self.market_id = market_id
+		self._reason = message
+
+	def __reduce__(self):
+		# so failures in worker processes are returned whole rather than breaking the pool
+		return type(self), (self._reason, self.file_path, self.line_number, self.market_id)
@@ -0,0 +1,191 @@
+"""
+Columnar export of the runner changes in a stream of decoded markets.
+
+Each runner change becomes a row with the columns:
+
+published_time - int64, published time of the market in millis since epoch.
+market_id - string, id of the market.
+selection_id - int64, id of the runner.
+ltp - float64, last traded price, NaN if not in the change.
+tv - float64, traded volume, NaN if not in the change.
+market_status - categorical, the last status of the market from its marketDefinition.
+				Stored as int8 codes into MARKET_STATUSES, with -1 when no status is known.
+
+Rows are built in batches of typed arrays so that memory is bounded by batch_size, and can be written
+in chunks to Parquet or Arrow IPC files with pyarrow, or returned as NumPy structured arrays.
+If the plan of the files is given, runner fields which are not in the plan, e.g. tv of basic files, are not read.
+"""
+from array import array
+from typing import Dict, Iterable, Iterator
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	import pyarrow
+	import pyarrow.compute
+	import pyarrow.ipc
+	import pyarrow.parquet
+except ImportError:
+	pyarrow = None
+
+from betfairHistorical.compat import require
+from betfairHistorical.exceptions import InvalidMarket
+from betfairHistorical.registry import registry
+
+MARKET_STATUSES = ('INACTIVE', 'OPEN', 'SUSPENDED', 'CLOSED')
+MARKET_ID_DTYPE = 'U16'
+MARKET_STATUS_CODES = {status: code for code, status in enumerate(MARKET_STATUSES)}
+
+
+def iter_batches(markets: Iterable[Dict], batch_size: int=100000, plan: str=None) -> Iterator[Dict]:
+	"""
+	Converts a stream of decoded markets into batches of columns.
+
+	:param markets: Decoded lines, such as those from BetfairHistoricalFileParser.iter_markets
+	:param batch_size: Maximum number of rows in each batch
+	:param plan: Plan of the files, as in betfairHistorical.registry. Runner fields which are not in the plan are not read
+	return: Dictionaries of column name to array.array, or a list for market_id
+	"""
+	extract = registry.runner_extractor(plan, ('ltp', 'tv'))
+	market_status = {}
+	batch = _new_batch()
+	for market in markets:
+		published_time = market.get('pt')
+		if not published_time:
+			raise InvalidMarket("No published time available.")
+
+		for market_change in market.get('mc') or ():
+			market_id = market_change.get('id')
+			market_definition = market_change.get('marketDefinition')
+			if market_definition and market_definition.get('status') is not None:
+				market_status[market_id] = MARKET_STATUS_CODES.get(market_definition.get('status'), -1)
+
+			runner_changes = market_change.get('rc')
+			if not runner_changes:
+				continue
+			status = market_status.get(market_id, -1)
+			for runner_change in runner_changes:
+				ltp, tv = extract(runner_change)
+				batch['published_time'].append(published_time)
+				batch['market_id'].append(market_id)
+				batch['selection_id'].append(runner_change.get('id'))
+				batch['ltp'].append(float('nan') if ltp is None else ltp)
+				batch['tv'].append(float('nan') if tv is None else tv)
+				batch['market_status'].append(status)
+
+				if len(batch['market_id']) >= batch_size:
+					yield batch
+					batch = _new_batch()
+
+	if batch['market_id']:
+		yield batch
+
+def iter_numpy_batches(markets: Iterable[Dict], batch_size: int=100000, plan: str=None) -> Iterator:
+	"""
+	Converts a stream of decoded markets into NumPy structured arrays. Requires numpy.
+
+	:param markets: Decoded lines, such as those from BetfairHistoricalFileParser.iter_markets
+	:param batch_size: Maximum number of rows in each array
+	:param plan: Plan of the files, as in betfairHistorical.registry. Runner fields which are not in the plan are not read
+	"""
+	require(numpy, 'numpy')
+	dtype = numpy.dtype([
+		('published_time', 'i8'),
+		('market_id', MARKET_ID_DTYPE),
+		('selection_id', 'i8'),
+		('ltp', 'f8'),
+		('tv', 'f8'),
+		('market_status', 'i1')
+	])
+	for batch in iter_batches(markets, batch_size=batch_size, plan=plan):
+		records = numpy.empty(len(batch['market_id']), dtype=dtype)
+		for name, column in batch.items():
+			records[name] = column
+		yield records
+
+def iter_arrow_batches(markets: Iterable[Dict], batch_size: int=100000, plan: str=None) -> Iterator:
+	"""
+	Converts a stream of decoded markets into pyarrow RecordBatches. Requires pyarrow.
+
+	:param markets: Decoded lines, such as those from BetfairHistoricalFileParser.iter_markets
+	:param batch_size: Maximum number of rows in each RecordBatch
+	:param plan: Plan of the files, as in betfairHistorical.registry. Runner fields which are not in the plan are not read
+	"""
+	require(pyarrow, 'pyarrow')
+	schema = arrow_schema()
+	statuses = pyarrow.array(MARKET_STATUSES, type=pyarrow.string())
+	for batch in iter_batches(markets, batch_size=batch_size, plan=plan):
+		codes = pyarrow.array(batch['market_status'], type=pyarrow.int8())
+		codes = pyarrow.compute.if_else(pyarrow.compute.equal(codes, -1), None, codes)
+		yield pyarrow.RecordBatch.from_arrays([
+			pyarrow.array(batch['published_time'], type=pyarrow.int64()),
+			pyarrow.array(batch['market_id'], type=pyarrow.string()),
+			pyarrow.array(batch['selection_id'], type=pyarrow.int64()),
+			pyarrow.array(batch['ltp'], type=pyarrow.float64()),
+			pyarrow.array(batch['tv'], type=pyarrow.float64()),
+			pyarrow.DictionaryArray.from_arrays(codes, statuses)
+		], schema=schema)
+
+def arrow_schema():
+	"""
+	Returns the pyarrow schema of exported batches. Requires pyarrow.
+	"""
+	require(pyarrow, 'pyarrow')
+	return pyarrow.schema([
+		('published_time', pyarrow.int64()),
+		('market_id', pyarrow.string()),
+		('selection_id', pyarrow.int64()),
+		('ltp', pyarrow.float64()),
+		('tv', pyarrow.float64()),
+		('market_status', pyarrow.dictionary(pyarrow.int8(), pyarrow.string()))
+	])
+
+def write_parquet(markets: Iterable[Dict], file_path: str, batch_size: int=100000, plan: str=None) -> int:
+	"""
+	Writes a stream of decoded markets to a Parquet file, one row group per batch. Requires pyarrow.
+
+	:param markets: Decoded lines, such as those from BetfairHistoricalFileParser.iter_markets
+	:param file_path: Local path of the Parquet file
+	:param batch_size: Maximum number of rows held in memory and written at once
+	:param plan: Plan of the files, as in betfairHistorical.registry. Runner fields which are not in the plan are not read
+	return: Number of rows written
+	"""
+	require(pyarrow, 'pyarrow')
+	rows = 0
+	with pyarrow.parquet.ParquetWriter(file_path, arrow_schema()) as writer:
+		for record_batch in iter_arrow_batches(markets, batch_size=batch_size, plan=plan):
+			writer.write_table(pyarrow.Table.from_batches([record_batch]))
+			rows += record_batch.num_rows
+	return rows
+
+def write_arrow(markets: Iterable[Dict], file_path: str, batch_size: int=100000, plan: str=None) -> int:
+	"""
+	Writes a stream of decoded markets to an Arrow IPC file, one record batch per batch. Requires pyarrow.
+
+	:param markets: Decoded lines, such as those from BetfairHistoricalFileParser.iter_markets
+	:param file_path: Local path of the Arrow file
+	:param batch_size: Maximum number of rows held in memory and written at once
+	:param plan: Plan of the files, as in betfairHistorical.registry. Runner fields which are not in the plan are not read
+	return: Number of rows written
+	"""
+	require(pyarrow, 'pyarrow')
+	rows = 0
+	with pyarrow.ipc.new_file(file_path, arrow_schema()) as writer:
+		for record_batch in iter_arrow_batches(markets, batch_size=batch_size, plan=plan):
+			writer.write_batch(record_batch)
+			rows += record_batch.num_rows
+	return rows
+
+
+def _new_batch() -> Dict:
+	return {
+		'published_time': array('q'),
+		'market_id': [],
+		'selection_id': array('q'),
+		'ltp': array('d'),
+		'tv': array('d'),
+		'market_status': array('b')
+	}
@@ -0,0 +1,139 @@
+"""
+Filtering of the lines of historical files by market, market type, runner, published time and message type.
+
+Filters are applied in two stages. match_raw checks the raw bytes of a line for the ids and keys it must
+contain, so most lines which cannot match are discarded before they are decoded. apply then checks the decoded
+line exactly and trims it to the market changes and runner changes which match.
+
+The marketType of a market is only sent in its marketDefinition, so market types are matched by apply alone, against the
+last definition of each market seen by the filter, and a definition without a marketType only matches a filter which
+keeps every market type. Changes to a market before its first definition are kept.
+"""
+from typing import Callable, Dict, Iterable, Optional
+
+from betfairHistorical.archive import PUBLISHED_TIME
+
+
+class MarketFilter:
+	def __init__(
+		self,
+		market_ids: Iterable[str]=None,
+		selection_ids: Iterable[int]=None,
+		from_time: int=None,
+		to_time: int=None,
+		require_market_definition: bool=False,
+		require_runner_change: bool=False,
+		market_types: Callable[[Optional[str]], bool]=None
+		):
+		"""
+		Filters which are None or False are not applied.
+
+		:param market_ids: Only keep market changes to these markets.
+		:param selection_ids: Only keep runner changes to these runners. Market changes left with no runner changes are
+			dropped unless they have a marketDefinition.
+		:param from_time: Only keep lines published at or after this time, in millis since epoch.
+		:param to_time: Only keep lines published at or before this time, in millis since epoch.
+		:param require_market_definition: Only keep market changes with a marketDefinition.
+		:param require_runner_change: Only keep market changes with runner changes.
+		:param market_types: Only keep market changes to markets whose marketType this returns True for,
+			such as a MarketTypeMatcher from betfairHistorical.registry.
+		"""
+		self.market_ids = frozenset(market_ids) if market_ids is not None else None
+		self.selection_ids = frozenset(selection_ids) if selection_ids is not None else None
+		self.from_time = from_time
+		self.to_time = to_time
+		self.require_market_definition = require_market_definition
+		self.require_runner_change = require_runner_change
+		self.market_types = market_types
+
+		self._market_type_matches = {}
+		self._market_id_tokens = tuple(f'"id":"{m}"'.encode() for m in self.market_ids or ())
+		self._selection_id_tokens = tuple(f'"id":{s}'.encode() for s in self.selection_ids or ())
+
+	@property
+	def active(self) -> bool:
+		"""
+		Whether any filter is set.
+		"""
+		return (
+			self.market_ids is not None
+			or self.selection_ids is not None
+			or self.from_time is not None
+			or self.to_time is not None
+			or self.require_market_definition
+			or self.require_runner_change
+			or self.market_types is not None
+			)
+
+	def match_raw(self, line: bytes) -> bool:
+		"""
+		Returns False if a raw line cannot match the filters, without decoding it.
+		A line which returns True may still be removed by apply.
+		"""
+		if self.from_time is not None or self.to_time is not None:
+			match = PUBLISHED_TIME.search(line)
+			if match is not None:
+				published_time = int(match.group(1))
+				if self.from_time is not None and published_time < self.from_time:
+					return False
+				if self.to_time is not None and published_time > self.to_time:
+					return False
+		if self.require_market_definition and b'"marketDefinition"' not in line:
+			return False
+		if self.require_runner_change and b'"rc"' not in line:
+			return False
+		if self._market_id_tokens and not any(token in line for token in self._market_id_tokens):
+			return False
+		if (
+			self._selection_id_tokens
+			and b'"marketDefinition"' not in line
+			and not any(token in line for token in self._selection_id_tokens)
+			):
+			return False
+		return True
+
+	def apply(self, market: Dict) -> Optional[Dict]:
+		"""
+		Returns a decoded line with only the matching market changes and runner changes, or None if nothing matches.
+		The line is only copied if something has been removed from it.
+		"""
+		published_time = market.get('pt')
+		if self.from_time is not None and (published_time is None or published_time < self.from_time):
+			return None
+		if self.to_time is not None and (published_time is None or published_time > self.to_time):
+			return None
+
+		market_changes = market.get('mc') or ()
+		kept = []
+		for market_change in market_changes:
+			if self.market_ids is not None and market_change.get('id') not in self.market_ids:
+				continue
+			market_definition = market_change.get('marketDefinition')
+			if self.market_types is not None:
+				market_id = market_change.get('id')
+				if market_definition:
+					self._market_type_matches[market_id] = self.market_types(market_definition.get('marketType'))
+				if not self._market_type_matches.get(market_id, True):
+					continue
+			if self.require_market_definition and not market_definition:
+				continue
+
+			runner_changes = market_change.get('rc')
+			if self.selection_ids is not None and runner_changes:
+				matched = [rc for rc in runner_changes if rc.get('id') in self.selection_ids]
+				if len(matched) != len(runner_changes):
+					market_change = dict(market_change, rc=matched)
+					if not matched:
+						del market_change['rc']
+						if not market_definition:
+							continue
+				runner_changes = matched
+			if self.require_runner_change and not runner_changes:
+				continue
+			kept.append(market_change)
+
+		if not kept:
+			return None
+		if len(kept) == len(market_changes) and all(a is b for a, b in zip(kept, market_changes)):
+			return market
+		return dict(market, mc=kept)
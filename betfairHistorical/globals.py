@@ -5,12 +5,23 @@ SUPPORTED_PLANS - the plan types which have been implemented, of type tuple.
 SUPPORTED_MARKETS - the markets for each sport that are supported
 					A dictionary with supported sports as keys and their markets
 					as a list of values.
+					These are the defaults of betfairHistorical.registry, where further
+					sports, plans and markets can be registered.
+PARSER_VERSION - the version of the parser's output. This is incremented whenever
+					a change to the parser changes what it returns for the same file.
 """
 
-SUPPORTED_PLANS = ('basic')
+SUPPORTED_PLANS = ('basic', 'advanced', 'pro')
+
+PARSER_VERSION = 1
 
 SUPPORTED_MARKETS = {
 	'soccer': [
-		'match_odds'
+		'match_odds',
+		'over_under'
+		],
+	'horse_racing': [
+		'win',
+		'place'
 		]
 }
@@ -0,0 +1,193 @@
+"""
+An index of the markets contained in a local archive of historical files, stored in a SQLite database.
+
+For each file the index records the market ids, event ids, market types and countries it contains,
+along with the first and last published time of each market. It is updated incrementally, so only files
+which are new or have changed since the last update are read, and can then be queried for the files
+containing particular markets or times without reading the archive.
+"""
+import os
+import sqlite3
+from typing import Dict, List
+
+from betfairHistorical.archive import find_files, iter_file_lines
+from betfairHistorical.compat import json_loads
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+	path TEXT PRIMARY KEY,
+	size INTEGER NOT NULL,
+	mtime REAL NOT NULL,
+	first_pt INTEGER,
+	last_pt INTEGER
+);
+CREATE TABLE IF NOT EXISTS markets (
+	path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+	market_id TEXT NOT NULL,
+	event_id TEXT,
+	market_type TEXT,
+	country_code TEXT,
+	first_pt INTEGER,
+	last_pt INTEGER,
+	PRIMARY KEY (path, market_id)
+);
+CREATE INDEX IF NOT EXISTS markets_market_id ON markets(market_id);
+CREATE INDEX IF NOT EXISTS markets_event_id ON markets(event_id);
+"""
+
+
+class ArchiveIndex:
+	def __init__(self, index_path: str):
+		"""
+		Opens, or creates, the index stored at index_path.
+
+		:param index_path: Local path of the SQLite database
+		"""
+		self.index_path = index_path
+		self.connection = sqlite3.connect(index_path)
+		self.connection.execute("PRAGMA foreign_keys = ON")
+		self.connection.executescript(_SCHEMA)
+
+	def close(self):
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def update(self, local_path: str, recursive: bool=True) -> int:
+		"""
+		Indexes the files in local_path which are new or whose size or modification time has changed,
+		and removes files under local_path which no longer exist.
+
+		:param local_path: The local path to the file(s)
+		:param recursive: Include files in all subdirectories of local_path
+		return: Number of files which were (re)indexed
+		"""
+		file_paths = [os.path.abspath(f) for f in find_files(local_path, recursive)]
+		indexed = {
+			path: (size, mtime)
+			for path, size, mtime in self.connection.execute("SELECT path, size, mtime FROM files")
+			}
+
+		updated = 0
+		for file_path in file_paths:
+			stat = os.stat(file_path)
+			if indexed.get(file_path) != (stat.st_size, stat.st_mtime):
+				self.index_file(file_path)
+				updated += 1
+
+		root = os.path.abspath(local_path)
+		existing = set(file_paths)
+		with self.connection:
+			for path in indexed:
+				if path not in existing and (path == root or path.startswith(root + os.sep)):
+					self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+		return updated
+
+	def index_file(self, file_path: str):
+		"""
+		Reads a single file and replaces its entries in the index.
+
+		:param file_path: Local path of the file
+		"""
+		file_path = os.path.abspath(file_path)
+		stat = os.stat(file_path)
+		markets = {}
+		first_pt = last_pt = None
+		for _line in iter_file_lines(file_path):
+			market = json_loads(_line)
+			published_time = market.get('pt')
+			if published_time is not None:
+				first_pt = published_time if first_pt is None else min(first_pt, published_time)
+				last_pt = published_time if last_pt is None else max(last_pt, published_time)
+			for market_change in market.get('mc') or ():
+				_update_market(markets, market_change, published_time)
+
+		with self.connection:
+			self.connection.execute("DELETE FROM files WHERE path = ?", (file_path,))
+			self.connection.execute(
+				"INSERT INTO files (path, size, mtime, first_pt, last_pt) VALUES (?, ?, ?, ?, ?)",
+				(file_path, stat.st_size, stat.st_mtime, first_pt, last_pt)
+				)
+			self.connection.executemany(
+				"INSERT INTO markets (path, market_id, event_id, market_type, country_code, first_pt, last_pt)"
+				" VALUES (?, ?, ?, ?, ?, ?, ?)",
+				[
+					(file_path, market_id, m['event_id'], m['market_type'], m['country_code'], m['first_pt'], m['last_pt'])
+					for market_id, m in markets.items()
+				]
+				)
+
+	def query(
+		self,
+		market_ids: List[str]=None,
+		event_ids: List[str]=None,
+		market_types: List[str]=None,
+		countries: List[str]=None,
+		from_time: int=None,
+		to_time: int=None
+		) -> List[str]:
+		"""
+		Returns the paths of the files containing a market which matches all of the given filters.
+		Filters which are None are not applied.
+
+		:param market_ids: Market ids to match
+		:param event_ids: Event ids to match
+		:param market_types: Market types to match, e.g. MATCH_ODDS
+		:param countries: Country codes to match, e.g. GB
+		:param from_time: Earliest published time, in millis since epoch, the market must have data for
+		:param to_time: Latest published time, in millis since epoch, the market must have data for
+		return: Sorted list of absolute file paths
+		"""
+		clauses = []
+		params = []
+		for column, values in (
+			('market_id', market_ids),
+			('event_id', event_ids),
+			('market_type', market_types),
+			('country_code', countries)
+			):
+			if values is not None:
+				clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+				params.extend(values)
+		if from_time is not None:
+			clauses.append("last_pt >= ?")
+			params.append(from_time)
+		if to_time is not None:
+			clauses.append("first_pt <= ?")
+			params.append(to_time)
+
+		sql = "SELECT DISTINCT path FROM markets"
+		if clauses:
+			sql += " WHERE " + " AND ".join(clauses)
+		return [path for path, in self.connection.execute(sql + " ORDER BY path", params)]
+
+
+def _update_market(markets: Dict, market_change: Dict, published_time: int):
+	"""
+	Updates the indexed details of the market of a single market change.
+	"""
+	market_id = market_change.get('id')
+	if market_id is None:
+		return
+	market = markets.get(market_id)
+	if market is None:
+		market = markets[market_id] = {
+			'event_id': None,
+			'market_type': None,
+			'country_code': None,
+			'first_pt': published_time,
+			'last_pt': published_time
+			}
+	elif published_time is not None:
+		market['first_pt'] = published_time if market['first_pt'] is None else min(market['first_pt'], published_time)
+		market['last_pt'] = published_time if market['last_pt'] is None else max(market['last_pt'], published_time)
+
+	market_definition = market_change.get('marketDefinition')
+	if market_definition:
+		market['event_id'] = market_definition.get('eventId', market['event_id'])
+		market['market_type'] = market_definition.get('marketType', market['market_type'])
+		market['country_code'] = market_definition.get('countryCode', market['country_code'])
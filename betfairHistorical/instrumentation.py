@@ -0,0 +1,155 @@
+"""
+Opt-in counters and timers for each stage of parsing, to find where the time of a run is spent.
+
+A ParserStats passed to BetfairHistoricalFileParser as instrument records a FileStats for every file read:
+the bytes and lines read, the time spent reading and decompressing lines, decoding, validating and filtering them,
+and the latency of the file from being opened until its last line was consumed. Callbacks are called with each
+FileStats as its file completes, e.g. to export them to a metrics system, and summary gives a report of the run.
+When a parser is not instrumented none of these timers are run.
+"""
+import time
+from typing import Callable, Dict, Iterable, Iterator, List
+
+STAGES = ('read_time', 'decode_time', 'validation_time', 'filter_time')
+
+
+class FileStats:
+	"""
+	Counters and timers for a single file. Times are in seconds.
+	"""
+	__slots__ = ('file_path', 'bytes_read', 'lines', 'lines_yielded') + STAGES + ('latency',)
+
+	def __init__(self, file_path: str):
+		self.file_path = file_path
+		self.bytes_read = 0
+		self.lines = 0
+		self.lines_yielded = 0
+		self.read_time = 0.0
+		self.decode_time = 0.0
+		self.validation_time = 0.0
+		self.filter_time = 0.0
+		self.latency = 0.0
+
+	def to_dict(self) -> Dict:
+		return {attribute: getattr(self, attribute) for attribute in self.__slots__}
+
+	def __getstate__(self):
+		return self.to_dict()
+
+	def __setstate__(self, state: Dict):
+		for attribute, value in state.items():
+			setattr(self, attribute, value)
+
+	def timed_lines(self, lines: Iterable[bytes]) -> Iterator[bytes]:
+		"""
+		Yields lines, counting them and timing how long each takes to be read and decompressed.
+		"""
+		lines = iter(lines)
+		clock = time.perf_counter
+		while True:
+			start = clock()
+			try:
+				line = next(lines)
+			except StopIteration:
+				return
+			self.read_time += clock() - start
+			self.lines += 1
+			self.bytes_read += len(line)
+			yield line
+
+	def timed(self, func: Callable, stage: str) -> Callable:
+		"""
+		Returns func wrapped to add the time of each call to stage.
+		"""
+		clock = time.perf_counter
+
+		def _timed(*args):
+			start = clock()
+			try:
+				return func(*args)
+			finally:
+				setattr(self, stage, getattr(self, stage) + clock() - start)
+		return _timed
+
+
+class ParserStats:
+	def __init__(self, callbacks: List[Callable[[FileStats], None]]=None):
+		"""
+		Totals of the FileStats of every file read by a parser.
+
+		:param callbacks: Functions called with the FileStats of each file as it completes.
+		"""
+		self.callbacks = list(callbacks or ())
+		self.files = []
+		self.errors = 0
+		self.walk_time = 0.0
+		self.files_found = 0
+		self._started = None
+		self._finished = None
+
+	def add_callback(self, callback: Callable[[FileStats], None]):
+		"""
+		Adds a function to be called with the FileStats of each file as it completes.
+		"""
+		self.callbacks.append(callback)
+
+	def record_walk(self, seconds: float, files_found: int):
+		"""
+		Records the time taken to find the files of a run.
+		"""
+		self.walk_time += seconds
+		self.files_found += files_found
+		self._start()
+
+	def record_file(self, file_stats: FileStats):
+		"""
+		Adds the FileStats of a completed file to the totals and passes it to each callback.
+		"""
+		self._start()
+		self.files.append(file_stats)
+		self._finished = time.perf_counter()
+		for callback in self.callbacks:
+			callback(file_stats)
+
+	def record_error(self):
+		"""
+		Records a file which failed to read.
+		"""
+		self.errors += 1
+
+	def _start(self):
+		if self._started is None:
+			self._started = time.perf_counter()
+
+	def totals(self) -> Dict:
+		"""
+		Returns the counters and timers summed over all files, along with the elapsed time of the run.
+		"""
+		totals = {
+			'files': len(self.files),
+			'errors': self.errors,
+			'walk_time': self.walk_time,
+			'elapsed': (self._finished - self._started) if self._finished is not None else 0.0
+			}
+		for attribute in ('bytes_read', 'lines', 'lines_yielded') + STAGES + ('latency',):
+			totals[attribute] = sum(getattr(f, attribute) for f in self.files)
+		return totals
+
+	def summary(self) -> str:
+		"""
+		Returns a report of the totals, throughput and slowest file of the run.
+		"""
+		totals = self.totals()
+		elapsed = totals['elapsed'] or float('nan')
+		lines = [
+			f"{totals['files']} files ({totals['errors']} failed), {totals['lines']} lines "
+			f"({totals['lines_yielded']} returned), {totals['bytes_read'] / 1e6:.1f} MB in {totals['elapsed']:.2f}s",
+			f"throughput: {totals['bytes_read'] / 1e6 / elapsed:.1f} MB/s, {totals['lines'] / elapsed:.0f} lines/s",
+			f"walk: {totals['walk_time']:.3f}s, " + ", ".join(
+				f"{stage.replace('_time', '')}: {totals[stage]:.3f}s" for stage in STAGES
+				)
+			]
+		if self.files:
+			slowest = max(self.files, key=lambda f: f.latency)
+			lines.append(f"slowest file: {slowest.file_path} ({slowest.latency:.3f}s)")
+		return "\n".join(lines)
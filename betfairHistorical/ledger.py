@@ -0,0 +1,122 @@
+"""
+A persistent record of the files which have already been processed, stored in a SQLite database.
+
+Passing a ProcessedLedger to BetfairHistoricalFileParser makes it incremental: files recorded in the ledger are
+skipped, and each file is recorded once it has been read in full, so every run only reads the files which are new
+or have changed since the last. A file is unchanged if its size and modification time match the ledger, or if they
+do not but its content hash does, e.g. after it is downloaded again. Entries recorded by another PARSER_VERSION
+are treated as unprocessed so that files are read again when the output of the parser changes.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Iterable, Iterator
+
+from betfairHistorical.globals import PARSER_VERSION
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed (
+	path TEXT PRIMARY KEY,
+	size INTEGER NOT NULL,
+	mtime REAL NOT NULL,
+	sha256 TEXT NOT NULL,
+	parser_version INTEGER NOT NULL,
+	processed_at REAL NOT NULL
+);
+"""
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path: str) -> str:
+	"""
+	Returns the sha256 hex digest of the contents of a file.
+	"""
+	digest = hashlib.sha256()
+	with open(file_path, 'rb') as f:
+		for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+class ProcessedLedger:
+	def __init__(self, ledger_path: str, parser_version: int=PARSER_VERSION):
+		"""
+		Opens, or creates, the ledger stored at ledger_path.
+		A ledger records what one pipeline has processed, so separate pipelines over the same files should use separate ledgers.
+
+		:param ledger_path: Local path of the SQLite database
+		:param parser_version: Version entries must have been recorded by to be treated as processed
+		"""
+		self.ledger_path = ledger_path
+		self.parser_version = parser_version
+		self.connection = sqlite3.connect(ledger_path)
+		self.connection.executescript(_SCHEMA)
+
+	def close(self):
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __len__(self) -> int:
+		return self.connection.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+	def is_processed(self, file_path: str) -> bool:
+		"""
+		Returns whether file_path has been processed by this parser version and is unchanged since.
+		The file is only hashed if its size or modification time differ from the ledger.
+
+		:param file_path: Local path of the file
+		"""
+		file_path = os.path.abspath(file_path)
+		row = self.connection.execute(
+			"SELECT size, mtime, sha256, parser_version FROM processed WHERE path = ?", (file_path,)
+			).fetchone()
+		if row is None:
+			return False
+		size, mtime, sha256, parser_version = row
+		if parser_version != self.parser_version:
+			return False
+		stat = os.stat(file_path)
+		if (size, mtime) == (stat.st_size, stat.st_mtime):
+			return True
+		if size != stat.st_size or file_hash(file_path) != sha256:
+			return False
+		with self.connection:
+			self.connection.execute("UPDATE processed SET mtime = ? WHERE path = ?", (stat.st_mtime, file_path))
+		return True
+
+	def unprocessed(self, file_paths: Iterable[str]) -> Iterator[str]:
+		"""
+		Yields the paths in file_paths which have not been processed, checking each as it is taken.
+		"""
+		for file_path in file_paths:
+			if not self.is_processed(file_path):
+				yield file_path
+
+	def mark_processed(self, file_path: str):
+		"""
+		Records file_path as processed by this parser version, with its current size, modification time and hash.
+
+		:param file_path: Local path of the file
+		"""
+		file_path = os.path.abspath(file_path)
+		stat = os.stat(file_path)
+		with self.connection:
+			self.connection.execute(
+				"INSERT OR REPLACE INTO processed (path, size, mtime, sha256, parser_version, processed_at)"
+				" VALUES (?, ?, ?, ?, ?, ?)",
+				(file_path, stat.st_size, stat.st_mtime, file_hash(file_path), self.parser_version, time.time())
+				)
+
+	def forget(self, file_path: str):
+		"""
+		Removes file_path from the ledger so that it is processed again.
+		"""
+		with self.connection:
+			self.connection.execute("DELETE FROM processed WHERE path = ?", (os.path.abspath(file_path),))
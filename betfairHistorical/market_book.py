@@ -0,0 +1,216 @@
+"""
+Incremental reconstruction of market and runner order books from the market changes in historical files.
+
+Each market change only contains the deltas since the previous change, so the current state
+of a market is maintained by applying every change in order:
+
+ltp - last traded price, replaces the previous value.
+tv - total traded volume, replaces the previous value.
+atb / atl - available to back / lay as [price, size] pairs. A size of 0 removes the price.
+trd - traded volume as [price, size] pairs. A size of 0 removes the price.
+batb / batl - best available to back / lay as [level, price, size]. A size of 0 removes the level.
+
+A market change with img set to true is a full image and replaces the existing state of the market.
+marketDefinitions are applied as updates to the previous definition, so definitions deduplicated by
+betfairHistorical.definitions, which only contain the keys which changed, are replayed correctly.
+"""
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from betfairHistorical.definitions import apply_definition
+from betfairHistorical.exceptions import InvalidMarket, InvalidMarketChange
+
+
+class RunnerBook:
+	"""
+	The current state of a single runner within a market.
+	"""
+	__slots__ = ('selection_id', 'handicap', 'status', 'ltp', 'tv', 'atb', 'atl', 'trd', 'batb', 'batl')
+
+	def __init__(self, selection_id: int, handicap: float=0):
+		self.selection_id = selection_id
+		self.handicap = handicap
+		self.status = None
+		self.ltp = None
+		self.tv = None
+		self.atb = {}
+		self.atl = {}
+		self.trd = {}
+		self.batb = {}
+		self.batl = {}
+
+	def update(self, runner_change: Dict):
+		"""
+		Applies a single runner change to the runner.
+		"""
+		ltp = runner_change.get('ltp')
+		if ltp is not None:
+			self.ltp = ltp
+		tv = runner_change.get('tv')
+		if tv is not None:
+			self.tv = tv
+		for key in ('atb', 'atl', 'trd'):
+			deltas = runner_change.get(key)
+			if deltas:
+				_update_price_ladder(getattr(self, key), deltas)
+		for key in ('batb', 'batl'):
+			deltas = runner_change.get(key)
+			if deltas:
+				_update_level_ladder(getattr(self, key), deltas)
+
+	def snapshot(self) -> Dict:
+		"""
+		Returns the state of the runner as a dictionary, with ladders as lists of [price, size] ordered best first.
+		Traded volume is ordered by ascending price.
+		"""
+		return {
+			'selection_id': self.selection_id,
+			'handicap': self.handicap,
+			'status': self.status,
+			'ltp': self.ltp,
+			'tv': self.tv,
+			'atb': [[price, self.atb[price]] for price in sorted(self.atb, reverse=True)],
+			'atl': [[price, self.atl[price]] for price in sorted(self.atl)],
+			'trd': [[price, self.trd[price]] for price in sorted(self.trd)],
+			'batb': [self.batb[level] for level in sorted(self.batb)],
+			'batl': [self.batl[level] for level in sorted(self.batl)]
+		}
+
+
+class MarketBook:
+	"""
+	The current state of a single market, built up from its market changes.
+	"""
+	__slots__ = ('market_id', 'published_time', 'market_definition', 'status', 'in_play', 'runners')
+
+	def __init__(self, market_id: str):
+		self.market_id = market_id
+		self.published_time = None
+		self.market_definition = None
+		self.status = None
+		self.in_play = None
+		self.runners = {}
+
+	def _get_runner(self, selection_id: int, handicap: float) -> RunnerBook:
+		key = (selection_id, handicap)
+		runner = self.runners.get(key)
+		if runner is None:
+			runner = self.runners[key] = RunnerBook(selection_id, handicap)
+		return runner
+
+	def update(self, market_change: Dict, published_time: int):
+		"""
+		Applies a single market change, published at published_time, to the market.
+		"""
+		self.published_time = published_time
+		if market_change.get('img'):
+			self.runners = {}
+
+		market_definition = market_change.get('marketDefinition')
+		if market_definition:
+			if type(market_definition) is dict and type(self.market_definition) is dict:
+				self.market_definition = apply_definition(self.market_definition, market_definition)
+			else:
+				self.market_definition = market_definition
+			status = market_definition.get('status')
+			if status is not None:
+				self.status = status
+			in_play = market_definition.get('inPlay')
+			if in_play is not None:
+				self.in_play = in_play
+			for runner_definition in market_definition.get('runners') or ():
+				runner = self._get_runner(runner_definition.get('id'), runner_definition.get('hc', 0))
+				runner_status = runner_definition.get('status')
+				if runner_status is not None:
+					runner.status = runner_status
+
+		for runner_change in market_change.get('rc') or ():
+			self._get_runner(runner_change.get('id'), runner_change.get('hc', 0)).update(runner_change)
+
+	def snapshot(self) -> Dict:
+		"""
+		Returns the state of the market and its runners as a dictionary.
+		"""
+		return {
+			'market_id': self.market_id,
+			'published_time': self.published_time,
+			'status': self.status,
+			'in_play': self.in_play,
+			'runners': [runner.snapshot() for runner in self.runners.values()]
+		}
+
+
+class MarketBookEngine:
+	def __init__(self, snapshot_interval: int=None):
+		"""
+		Maintains a MarketBook for every market in a stream of decoded markets,
+		such as that from BetfairHistoricalFileParser.iter_markets.
+
+		:param snapshot_interval: Minimum number of milliseconds of published time between snapshots of a market.
+			If None a snapshot is taken after every change to a market.
+		"""
+		self.snapshot_interval = snapshot_interval
+		self.market_books = {}
+		self._last_snapshot = {}
+
+	def process(self, market: Dict) -> List[MarketBook]:
+		"""
+		Applies every market change in a single market to the relevant market books.
+
+		:param market: A single decoded line of a file
+		return: The updated market books which are due a snapshot
+		"""
+		published_time = market.get('pt')
+		if not published_time:
+			raise InvalidMarket("No published time available.")
+
+		due = []
+		for market_change in market.get('mc') or ():
+			market_id = market_change.get('id')
+			if not market_id:
+				raise InvalidMarketChange("Market change has no valid id key.")
+
+			market_book = self.market_books.get(market_id)
+			if market_book is None:
+				market_book = self.market_books[market_id] = MarketBook(market_id)
+			market_book.update(market_change, published_time)
+
+			last_snapshot = self._last_snapshot.get(market_id)
+			if (
+				self.snapshot_interval is None
+				or last_snapshot is None
+				or published_time - last_snapshot >= self.snapshot_interval
+			):
+				self._last_snapshot[market_id] = published_time
+				due.append(market_book)
+		return due
+
+	def replay(self, markets: Iterable[Dict]) -> Iterator[Dict]:
+		"""
+		Processes a stream of markets in order, yielding snapshots of market books as they become due.
+
+		:param markets: Decoded lines, ordered by published time within each market
+		"""
+		for market in markets:
+			for market_book in self.process(market):
+				yield market_book.snapshot()
+
+
+def _update_price_ladder(ladder: Dict, deltas: List[Tuple[float, float]]):
+	"""
+	Applies [price, size] deltas to a ladder keyed by price.
+	"""
+	for price, size in deltas:
+		if size:
+			ladder[price] = size
+		else:
+			ladder.pop(price, None)
+
+def _update_level_ladder(ladder: Dict, deltas: List[Tuple[int, float, float]]):
+	"""
+	Applies [level, price, size] deltas to a ladder keyed by level.
+	"""
+	for level, price, size in deltas:
+		if size:
+			ladder[level] = [price, size]
+		else:
+			ladder.pop(level, None)
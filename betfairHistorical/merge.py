@@ -0,0 +1,141 @@
+"""
+Merging of the streams of many files into a single stream in published time order.
+
+Each historical file holds a single market in published time order, so the markets of an event, such as the match odds,
+correct score and over/under of a football match or every race of a card, are spread across several files.
+merge_markets performs a k-way merge of the streams with a heap which holds one pending message per stream, so only
+a single decoded line of each file is in memory at once however many files are merged.
+Messages with equal published times are returned in the order of their streams.
+
+Each stream of a file holds an open file, so merge_files bounds the number open at once: when there are more files than
+max_open_files, consecutive batches of files are merged into temporary files of json lines, which are then merged in
+the same way, so any number of files can be merged within the open file limit of the process.
+"""
+import heapq
+import json
+import os
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+from betfairHistorical.archive import iter_file_lines
+from betfairHistorical.compat import json_loads
+from betfairHistorical.exceptions import InvalidMarket
+from betfairHistorical.records import MarketMessage
+
+# below the default limit of 1024 open files per process on most systems
+MAX_OPEN_FILES = 256
+
+
+def merge_markets(streams: Iterable[Iterable[Union[Dict, MarketMessage]]]) -> Iterator[Union[Dict, MarketMessage]]:
+	"""
+	Merges streams of decoded markets, each in published time order, into a single stream in published time order.
+
+	:param streams: Streams of decoded lines or MarketMessages, such as the files of BetfairHistoricalFileParser.iter_files
+	"""
+	heap = []
+	for index, stream in enumerate(streams):
+		stream = iter(stream)
+		for market in stream:
+			heap.append((_published_time(market), index, market, stream))
+			break
+	heapq.heapify(heap)
+
+	while heap:
+		_, index, market, stream = heap[0]
+		yield market
+		for market in stream:
+			heapq.heapreplace(heap, (_published_time(market), index, market, stream))
+			break
+		else:
+			heapq.heappop(heap)
+
+
+def merge_files(
+	file_paths: Iterable[str],
+	open_file: Callable[[str], Iterable[Union[Dict, MarketMessage]]],
+	max_open_files: int=MAX_OPEN_FILES,
+	records: bool=False
+	) -> Iterator[Union[Dict, MarketMessage]]:
+	"""
+	Merges the decoded markets of files, each in published time order, into a single stream in published time order,
+	with no more than max_open_files of them open at once.
+
+	:param file_paths: Local paths of the files, in the order ties are returned
+	:param open_file: Returns the stream of decoded markets of a file
+	:param max_open_files: The most files to open at once. Batches of this many files are merged into temporary files first
+		when there are more files
+	:param records: Whether open_file returns MarketMessages, so they are stored as dictionaries in temporary files
+	"""
+	if max_open_files < 2:
+		raise ValueError(f"max_open_files must be at least 2, not {max_open_files}.")
+	file_paths = list(file_paths)
+	if len(file_paths) <= max_open_files:
+		yield from merge_markets(open_file(f) for f in file_paths)
+		return
+
+	with tempfile.TemporaryDirectory(prefix='betfair-merge-') as merge_dir:
+		# batches are consecutive, so ties between batches are still returned in the order of their files
+		batch_paths = []
+		for start in range(0, len(file_paths), max_open_files):
+			batch_path = os.path.join(merge_dir, f"{len(batch_paths)}.jsonl")
+			with open(batch_path, 'wb') as f:
+				for market in merge_markets(open_file(file_path) for file_path in file_paths[start:start + max_open_files]):
+					if records:
+						market = market.to_dict()
+					f.write(json.dumps(market, separators=(',', ':')).encode() + b'\n')
+			batch_paths.append(batch_path)
+		read_batch = _read_records if records else _read_markets
+		yield from merge_files(batch_paths, read_batch, max_open_files, records=records)
+
+
+def group_by_event(file_paths: Iterable[str]) -> List[Tuple[str, List[str]]]:
+	"""
+	Groups files by the event id of their market, from the first marketDefinition of each file.
+	Only the start of each file is read.
+
+	:param file_paths: Local paths of the files
+	return: A list of event ids with the paths of their files, ordered by the first published time of each event.
+		Files without a marketDefinition are grouped under None.
+	"""
+	events = {}
+	for file_path in file_paths:
+		first_pt, event_id = _first_event(file_path)
+		event = events.get(event_id)
+		if event is None:
+			events[event_id] = [first_pt, [file_path]]
+		else:
+			event[0] = min(event[0], first_pt)
+			event[1].append(file_path)
+	ordered = sorted(events.items(), key=lambda event: event[1][0])
+	return [(event_id, paths) for event_id, (_, paths) in ordered]
+
+
+def _published_time(market: Union[Dict, MarketMessage]) -> int:
+	published_time = market.get('pt')
+	if not published_time:
+		raise InvalidMarket("No published time available.")
+	return published_time
+
+def _read_markets(file_path: str) -> Iterator[Dict]:
+	with open(file_path, 'rb') as f:
+		for _line in f:
+			yield json_loads(_line)
+
+def _read_records(file_path: str) -> Iterator[MarketMessage]:
+	for market in _read_markets(file_path):
+		yield MarketMessage.from_dict(market)
+
+def _first_event(file_path: str) -> Tuple[int, str]:
+	"""
+	Returns the first published time of a file and the event id of its first marketDefinition.
+	"""
+	first_pt = None
+	for _line in iter_file_lines(file_path):
+		market = json_loads(_line)
+		if first_pt is None:
+			first_pt = market.get('pt') or 0
+		for market_change in market.get('mc') or ():
+			market_definition = market_change.get('marketDefinition')
+			if market_definition and market_definition.get('eventId') is not None:
+				return first_pt, market_definition['eventId']
+	return first_pt or 0, None
@@ -1,13 +1,41 @@
-import bz2
-import json
+import logging
 import os
-import pkg_resources
-from typing import Dict, List, Union
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple, Union
 
-import jsonschema
+from jsonschema import ValidationError
 
-from betfairHistorical.exceptions import InvalidMarket, InvalidMarketChange
-from betfairHistorical.globals import SUPPORTED_MARKETS, SUPPORTED_PLANS
+from betfairHistorical.archive import find_files, iter_file_lines
+from betfairHistorical.compat import json_loads
+from betfairHistorical.definitions import DefinitionDeduplicator, SymbolTable
+from betfairHistorical.exceptions import InvalidLine, InvalidMarket, InvalidMarketChange
+from betfairHistorical.filters import MarketFilter
+from betfairHistorical.instrumentation import FileStats, ParserStats
+from betfairHistorical.merge import MAX_OPEN_FILES, group_by_event, merge_files
+from betfairHistorical.records import MarketMessage
+from betfairHistorical.registry import registry
+from betfairHistorical.summary import MarketSummarizer, RunnerSummary
+from betfairHistorical.validation import (
+	ShardedValidator,
+	default_schema,
+	get_validator,
+	install_validator,
+	market_id_of,
+	validation_executor,
+	validator_key
+	)
+
+if TYPE_CHECKING:
+	from betfairHistorical.columnar_cache import CachedColumns, ColumnarCache
+	from betfairHistorical.index import ArchiveIndex
+	from betfairHistorical.ledger import ProcessedLedger
+
+logger = logging.getLogger(__name__)
 
 class BetfairHistoricalFileParser:
 	def __init__(
@@ -18,22 +46,81 @@ class BetfairHistoricalFileParser:
 		market: str,
 		recursive: bool=False,
 		validate: bool=True,
-		validation_schema: Dict=None
+		validation_schema: Dict=None,
+		validate_first: int=None,
+		validate_every: int=None,
+		validation_workers: int=None,
+		validation_batch_size: int=1000,
+		decode: bool=False,
+		records: bool=False,
+		dedup_definitions: bool=False,
+		lazy: bool=False,
+		workers: int=None,
+		ordered: bool=True,
+		index: 'ArchiveIndex'=None,
+		index_query: Dict=None,
+		market_ids: List[str]=None,
+		selection_ids: List[int]=None,
+		from_time: int=None,
+		to_time: int=None,
+		require_market_definition: bool=False,
+		require_runner_change: bool=False,
+		match_market_type: bool=False,
+		instrument: Union[bool, ParserStats]=False,
+		ledger: 'ProcessedLedger'=None
 	):
 		"""
 		This class is used to parse the bz2 files retrieved from Betfair. 
-		Due to the nature of these files, only SUPPORTED_MARKETS and SUPPORTED_PLANS are implemented for validation.
-		Other files will be added in future versions, or can be used without the in-built validation.
+		Due to the nature of these files, only the sports, plans and markets in betfairHistorical.registry are implemented for validation.
+		Others can be registered there, or used without the in-built validation.
 
 		This will allow the user to extract the id, marketDefinition, runnerChanges and timestamps for each event by passing only the raw bz2 file location.
 
 		:param local_path: The local path to the file(s)
-		:param sport: Sport to parse files. Must be one of keys in SUPPORTED_MARKETS if validation is used.
-		:param plan: Plan to parse files. Must be in SUPPORTED_PLANS
-		:param market: Market to parse files. Must be one of values in SUPPORTED_MARKETS if validation is used.
+		:param sport: Sport to parse files. Must be a registered sport if validation is used.
+		:param plan: Plan to parse files. Must be a registered plan if validation is used.
+		:param market: Market to parse files. Must be a registered market of sport if validation is used.
 		:param recursive: Parse all files contained within local path.
 		:param validate: Validates file contents using a jsonschema.
 		:param validation_schema: The jsonschema to be used for validation. If None and validate is True will use files in validation_schemas.
+		:param validate_first: Only validate the first validate_first lines of each file.
+		:param validate_every: Only validate every validate_every-th line of each file.
+			If both validate_first and validate_every are set a line is validated if either applies. If neither is set every line is validated.
+			A line which fails raises InvalidLine, a jsonschema ValidationError with the file_path, line_number and market_id of the line.
+		:param validation_workers: Number of processes used to validate the lines of each file, in batches of validation_batch_size lines,
+			while the file continues to be read. Lines are returned before they are validated, and InvalidLine is raised for the first
+			failing line of a file at the latest once the file has been read. Not used when workers is set, as each file is validated by its worker.
+		:param validation_batch_size: Number of lines sent to a validation worker at once.
+		:param decode: Decode each line into a dictionary as it is read, so data and iter_files contain dictionaries rather than bytes.
+			Lines are only decoded once and the same object is validated and returned.
+		:param records: Return decoded lines as MarketMessage records, with __slots__ and interned strings, rather than dictionaries.
+			This applies wherever lines are decoded, and records can be passed to the accessors in place of dictionaries.
+		:param dedup_definitions: Replace each marketDefinition of decoded lines with only the keys which changed since the previous
+			definition of the market, as described in betfairHistorical.definitions, and remove definitions which did not change.
+			Market ids and the strings of definitions are interned in symbols, a SymbolTable shared by every file of the parser.
+			Lines returned as bytes are not changed.
+		:param lazy: Do not load the files on init. Contents are instead streamed line by line with iter_files or iter_lines and data is None.
+		:param workers: Number of processes used to read files in parallel. If None files are read sequentially.
+			When set, a file which fails to read or validate is logged and recorded in errors rather than stopping the run.
+		:param ordered: Yield files in parallel mode in the order they are found. If False files are yielded as they complete.
+		:param index: An ArchiveIndex of local_path. If set only the files matching index_query are read.
+		:param index_query: Keyword arguments passed to ArchiveIndex.query to select files, e.g. {'market_ids': ['1.131162722']}.
+		:param market_ids: Only return changes to these markets.
+		:param selection_ids: Only return runner changes to these runners, and market changes with a marketDefinition.
+		:param from_time: Only return lines published at or after this time, in millis since epoch.
+		:param to_time: Only return lines published at or before this time, in millis since epoch.
+		:param require_market_definition: Only return market changes with a marketDefinition.
+		:param require_runner_change: Only return market changes with runner changes.
+			Filters are checked against the raw bytes of each line first, so most lines which do not match are never decoded.
+			Decoded lines are trimmed to the matching market changes and runner changes, whereas bytes lines are returned whole.
+			For seekable files blocks which cannot match market_ids, from_time and to_time are not read.
+		:param match_market_type: Only return changes to markets whose marketType belongs to market in betfairHistorical.registry,
+			e.g. WIN and not PLACE markets for horse_racing win, or every OVER_UNDER_ line for soccer over_under.
+			Markets are matched by the marketType of their marketDefinition, so lines are decoded to check it.
+		:param instrument: Record counters and timers for each stage of reading every file in stats, either True or a ParserStats with callbacks.
+			A summary of each run is logged at INFO level.
+		:param ledger: A ProcessedLedger recording the files which have already been read. If set the parser is incremental:
+			files in the ledger which are unchanged are skipped, and each file is added to the ledger once it has been read in full.
 		"""
 		self.local_path = local_path
 		self.sport = sport.lower()
@@ -42,63 +129,530 @@ class BetfairHistoricalFileParser:
 		self.recursive = recursive
 		self.validate = validate
 		self.validation_schema = validation_schema
+		self.validate_first = validate_first
+		self.validate_every = validate_every
+		self._validator = None
+		self.validation_workers = validation_workers
+		self.validation_batch_size = validation_batch_size
+		self._validation_pool = None
+		self.decode = decode
+		self.records = records
+		self.dedup_definitions = dedup_definitions
+		self.symbols = SymbolTable() if dedup_definitions else None
+		self.lazy = lazy
+		self.workers = workers
+		self.ordered = ordered
+		self.errors = {}
+		self.index = index
+		self.index_query = index_query
+		self.ledger = ledger
+		self.market_filter = MarketFilter(
+			market_ids=market_ids,
+			selection_ids=selection_ids,
+			from_time=from_time,
+			to_time=to_time,
+			require_market_definition=require_market_definition,
+			require_runner_change=require_runner_change,
+			market_types=registry.market_type_matcher(self.sport, self.market) if match_market_type else None
+			)
+		if isinstance(instrument, ParserStats):
+			self.stats = instrument
+		else:
+			self.stats = ParserStats() if instrument else None
 
 		if not os.path.exists(self.local_path):
 			raise FileExistsError('File path does not exist')
 
-		if not self.sport in SUPPORTED_MARKETS.keys() and self.validate:
+		if not self.sport in registry.sports() and self.validate:
 			raise NotImplementedError(f'{self.sport} not currently implemented.')
 
-		if not self.plan in SUPPORTED_PLANS and self.validate:
+		if not self.plan in registry.plans() and self.validate:
 			raise NotImplementedError(f'{self.plan} not currently implemented')
 
-		if not self.market in SUPPORTED_MARKETS[self.sport] and self.validate:
+		if not self.market in registry.markets(self.sport) and self.validate:
 			raise NotImplementedError(f'{self.market} not currently implemented')
 
-		if os.path.isdir(self.local_path):
+		if self.lazy:
+			self.data = None
+
+		elif os.path.isdir(self.local_path):
 			self.data = self._read_files()
 
+		elif self.ledger is not None and self.ledger.is_processed(self.local_path):
+			self.data = []
+
 		else:
-			self.data = list(self._read_file(self.local_path))
+			try:
+				self.data = list(self._read_file(self.local_path))
+			finally:
+				self.close()
+			self._log_stats()
+
+	def get_file_paths(self) -> List[str]:
+		"""
+		Returns the paths of all files to be parsed from local_path, in sorted order, as read by iter_files.
+		If an index is set only the files it returns for index_query are included. A subset can be read with iter_paths.
+		"""
+		start = time.perf_counter()
+		file_paths = find_files(self.local_path, self.recursive)
+		if self.index is not None:
+			matched = set(self.index.query(**(self.index_query or {})))
+			file_paths = [f for f in file_paths if os.path.abspath(f) in matched]
+		if self.stats is not None:
+			self.stats.record_walk(time.perf_counter() - start, len(file_paths))
+		return file_paths
 
-	def _read_file(self, file_path: str) -> List[bytes]:
+	def _iter_file(self, file_path: str, decode: bool=False) -> Iterator[Union[bytes, Dict]]:
 		"""
-		Reads a single bz2 file contained within file_path and returns the file contents as a bytes
+		Decompresses a single bz2 or seekable file contained within file_path and yields the contents one line at a time.
+		Lines are validated as they are read, so only a single line is held in memory.
+		If decode is True each line is yielded as the dictionary which was validated, otherwise as bytes.
+		If the parser is instrumented each stage is timed and the FileStats of the file are recorded once it is closed.
 		"""
-		with bz2.open(file_path) as f:
-			_data = f.readlines()
-			
-			if self.validate:
-				self._validate_schema(contents=_data)
+		validate = self._get_validator().validate if self.validate else None
+		sharded = None
+		if validate is not None and self.validation_workers:
+			sharded = ShardedValidator(
+				self._get_validation_pool(),
+				file_path,
+				self.sport,
+				self.market,
+				self.validation_schema,
+				batch_size=self.validation_batch_size,
+				max_pending=self.validation_workers * 2,
+				plan=self.plan
+				)
+			validate = None
+		market_filter = self.market_filter
+		filtered = market_filter.active
+		match_raw = market_filter.match_raw
+		apply_filter = market_filter.apply
+		dedup = DefinitionDeduplicator(self.symbols) if decode and self.dedup_definitions else None
+		loads = json_loads
+		lines = iter_file_lines(
+			file_path,
+			market_ids=market_filter.market_ids,
+			from_time=market_filter.from_time,
+			to_time=market_filter.to_time
+			)
+
+		file_stats = None
+		if self.stats is not None:
+			file_stats = FileStats(file_path)
+			started = time.perf_counter()
+			lines = file_stats.timed_lines(lines)
+			loads = file_stats.timed(loads, 'decode_time')
+			match_raw = file_stats.timed(match_raw, 'filter_time')
+			apply_filter = file_stats.timed(apply_filter, 'filter_time')
+			if validate is not None:
+				validate = file_stats.timed(validate, 'validation_time')
 
+		try:
+			for i, _line in enumerate(lines):
+				if filtered and not match_raw(_line):
+					continue
+				if sharded is not None and self._sample_line(i):
+					sharded.add(i + 1, _line)
+				_market = None
+				if decode or filtered:
+					_market = loads(_line)
+					if validate is not None and self._sample_line(i):
+						_validate_line(validate, _market, file_path, i + 1)
+					if filtered:
+						_market = apply_filter(_market)
+						if _market is None:
+							continue
+					if dedup is not None:
+						_market = dedup.process(_market)
+						if _market is None:
+							continue
+					if decode and self.records:
+						_market = MarketMessage.from_dict(_market)
+				elif validate is not None and self._sample_line(i):
+					_validate_line(validate, loads(_line), file_path, i + 1)
+				if file_stats is not None:
+					file_stats.lines_yielded += 1
+				yield _market if decode else _line
+			if sharded is not None:
+				sharded.finish()
+		finally:
+			if sharded is not None:
+				sharded.cancel()
+			if file_stats is not None:
+				file_stats.latency = time.perf_counter() - started
+				self.stats.record_file(file_stats)
+
+	def _read_file(self, file_path: str, decode: bool=None) -> List[Union[bytes, Dict]]:
+		"""
+		Reads a single bz2 file contained within file_path and returns the file contents as a bytes, or as dictionaries if decoding.
+		"""
+		_data = list(self._iter_file(file_path, decode=self.decode if decode is None else decode))
+		if self.ledger is not None:
+			self.ledger.mark_processed(file_path)
 		return _data
 
 	def _read_files(self) -> List[List[bytes]]:
 		"""
 		Reads all bz2 files contained within a single directory.
 		"""
-		if self.recursive:
-			_file_paths = [os.path.join(root, file) for root, subdirs, files in os.walk(self.local_path) for file in files]
-			return [self._read_file(f) for f in _file_paths]
+		file_paths = self.get_file_paths()
+		if self.ledger is not None:
+			file_paths = self.ledger.unprocessed(file_paths)
+		if self.workers:
+			data = [_data for _, _data in self._iter_files_parallel(file_paths)]
 		else:
-			return [self._read_file(os.path.join(self.local_path, f)) for f in os.listdir(self.local_path)]
+			try:
+				data = [self._read_file(f) for f in file_paths]
+			finally:
+				self.close()
+		self._log_stats()
+		return data
 
-	def _validate_schema(self, contents: bytes):
+	def _iter_files_parallel(self, file_paths: Iterable[str], decode: bool=None, worker=None) -> Iterator[Tuple[str, List]]:
+		"""
+		Reads files across a pool of worker processes, yielding each file path with its contents.
+		worker is the function called in the worker process with each file path and decode, _read_file_worker if None.
+		Only a bounded number of files are in flight at once so that completed files do not accumulate in memory.
+		Files which raise are logged and stored in errors against their path.
+		The FileStats recorded by workers of an instrumented parser are returned with each file and recorded here.
+		"""
+		file_paths = iter(file_paths)
+		worker = worker or _read_file_worker
+		with ProcessPoolExecutor(
+			max_workers=self.workers,
+			initializer=_init_worker,
+			initargs=(self._worker_state(), self._worker_validator())
+			) as executor:
+			pending = {executor.submit(worker, f, decode): f for f in islice(file_paths, self.workers * 2)}
+			while pending:
+				if self.ordered:
+					future = next(iter(pending))
+				else:
+					done, _ = wait(pending, return_when=FIRST_COMPLETED)
+					future = done.pop()
+				file_path = pending.pop(future)
+				for next_path in islice(file_paths, 1):
+					pending[executor.submit(worker, next_path, decode)] = next_path
+
+				try:
+					_data, file_stats = future.result()
+				except Exception as e:
+					self.record_error(file_path, e)
+					continue
+				for _file_stats in file_stats or ():
+					self.stats.record_file(_file_stats)
+				yield file_path, _data
+				if self.ledger is not None:
+					self.ledger.mark_processed(file_path)
+
+	def record_error(self, file_path: str, error: Exception):
+		"""
+		Logs a file which failed to read and stores the error in errors against its path, so the run can carry on.
+		Files which fail in worker processes are recorded in this way, and callers consuming the lines of iter_files or
+		iter_paths can record the files which fail for them.
+		"""
+		logger.warning(f"Failed to read {file_path}: {error!r}")
+		self.errors[file_path] = error
+		if self.stats is not None:
+			self.stats.record_error()
+
+	def _worker_state(self) -> Dict:
+		"""
+		Returns the attributes needed to rebuild this parser in a worker process, without any loaded data.
+		The validator is compiled again once in each worker process from _worker_validator, and the index is not needed as files are passed to workers.
+		Workers record to their own ParserStats, whose files are sent back with each file read, and files are added to the ledger here.
+		"""
+		stats = ParserStats() if self.stats is not None else None
+		return dict(
+			self.__dict__,
+			data=None,
+			_validator=None,
+			validation_workers=None,
+			_validation_pool=None,
+			index=None,
+			ledger=None,
+			stats=stats
+			)
+
+	def _worker_validator(self) -> Union[Tuple, None]:
+		"""
+		Returns the key and schema of this parser's validator, which are sent to each worker process once when it starts.
+		The schema is resolved here, so sports, plans and markets registered in this process can be validated by the workers.
+		"""
+		if not self.validate:
+			return None
+		schema = default_schema(self.sport, self.plan, self.market) if self.validation_schema is None else self.validation_schema
+		return validator_key(self.sport, self.market, self.validation_schema, self.plan), schema
+
+	def iter_files(self, decode: bool=None) -> Iterator[Tuple[str, Iterable[Union[bytes, Dict]]]]:
+		"""
+		Streams the files contained within local_path.
+		Yields a tuple of the file path and a generator over the lines of that file, which is decompressed as it is consumed.
+		If workers is set each file is instead read in full by a worker process and yielded as a list of lines.
+
+		:param decode: Yield lines as dictionaries rather than bytes. Defaults to the decode set in the class init.
+		"""
+		yield from self.iter_paths(self.get_file_paths(), decode=decode)
+
+	def iter_paths(self, file_paths: Iterable[str], decode: bool=None) -> Iterator[Tuple[str, Iterable[Union[bytes, Dict]]]]:
+		"""
+		Streams the given files in the same way as iter_files, rather than those found in local_path.
+		file_paths may be a generator, and each file is only opened once it has been taken from it.
+		If a ledger is set files which have already been processed are skipped, and each file is added to the ledger
+		once its lines have been consumed in full.
+
+		:param file_paths: Local paths of the files to read
+		:param decode: Yield lines as dictionaries rather than bytes. Defaults to the decode set in the class init.
+		"""
+		decode = self.decode if decode is None else decode
+		if self.ledger is not None:
+			file_paths = self.ledger.unprocessed(file_paths)
+		if self.workers:
+			yield from self._iter_files_parallel(file_paths, decode=decode)
+		else:
+			try:
+				for file_path in file_paths:
+					lines = self._iter_file(file_path, decode=decode)
+					if self.ledger is not None:
+						lines = self._mark_when_read(file_path, lines)
+					yield file_path, lines
+			finally:
+				self.close()
+		self._log_stats()
+
+	def iter_columns(self, cache: 'ColumnarCache') -> Iterator[Tuple[str, 'CachedColumns']]:
+		"""
+		Yields the path and memory-mapped columns of each file contained within local_path, from cache.
+		Files which are not in the cache are read, with this parser's validation and filters, and cached first.
+
+		:param cache: The ColumnarCache to read from and write to
+		"""
+		try:
+			for file_path in self.get_file_paths():
+				yield file_path, cache.get(file_path, self)
+		finally:
+			self.close()
+
+	def _mark_when_read(self, file_path: str, lines: Iterator[Union[bytes, Dict]]) -> Iterator[Union[bytes, Dict]]:
+		"""
+		Yields lines and adds file_path to the ledger once they are exhausted.
+		"""
+		yield from lines
+		self.ledger.mark_processed(file_path)
+
+	def watch(
+		self,
+		poll_interval: float=5.0,
+		decode: bool=None,
+		stop: threading.Event=None,
+		timeout: float=None
+		) -> Iterator[Tuple[str, Iterable[Union[bytes, Dict]]]]:
+		"""
+		Watches local_path for files and streams each one in the same way as iter_files as it appears.
+		Files already in local_path are streamed first. A file is only streamed once its size and modification time
+		are unchanged between two polls, so files which are still being written are not read early.
+		A file which later changes is streamed again. If a ledger is set files it has already processed are skipped,
+		including on later runs.
+
+		:param poll_interval: Seconds between checks of local_path for new files
+		:param decode: Yield lines as dictionaries rather than bytes. Defaults to the decode set in the class init.
+		:param stop: An event which stops watching once set
+		:param timeout: Stop watching once no new file has appeared for this many seconds. If None, watch until stop is set.
+		"""
+		streamed = {}
+		pending = {}
+		last_new = time.monotonic()
+		while True:
+			ready = []
+			for file_path in self.get_file_paths():
+				try:
+					stat = os.stat(file_path)
+				except FileNotFoundError:
+					continue
+				signature = (stat.st_size, stat.st_mtime)
+				if streamed.get(file_path) == signature:
+					continue
+				if pending.get(file_path) == signature:
+					del pending[file_path]
+					streamed[file_path] = signature
+					ready.append(file_path)
+				else:
+					pending[file_path] = signature
+
+			if ready:
+				yield from self.iter_paths(sorted(ready), decode=decode)
+				last_new = time.monotonic()
+
+			if stop is not None and stop.is_set():
+				return
+			if timeout is not None and time.monotonic() - last_new >= timeout:
+				return
+			if stop is not None:
+				stop.wait(poll_interval)
+			else:
+				time.sleep(poll_interval)
+
+	def _log_stats(self):
+		"""
+		Logs the summary of an instrumented parser at the end of a run.
+		"""
+		if self.stats is not None:
+			logger.info(f"Parsed {self.local_path}:\n{self.stats.summary()}")
+
+	def iter_lines(self) -> Iterator[Union[bytes, Dict]]:
+		"""
+		Streams every line of every file contained within local_path, one line at a time.
+		"""
+		for _, lines in self.iter_files():
+			yield from lines
+
+	def iter_markets(self) -> Iterator[Union[Dict, MarketMessage]]:
+		"""
+		Streams every line of every file contained within local_path as a decoded market dictionary, or MarketMessage if records is set.
+		These can be passed directly to get_published_time, and their market changes to the other accessors.
+		"""
+		for _, markets in self.iter_files(decode=True):
+			yield from markets
+
+	def iter_merged(
+		self,
+		by_event: bool=False,
+		max_open_files: int=MAX_OPEN_FILES
+		) -> Iterator[Union[Dict, MarketMessage, Tuple[str, Iterator[Union[Dict, MarketMessage]]]]]:
+		"""
+		Streams every file contained within local_path merged into a single stream of decoded markets in published time order,
+		so the markets of an event or a whole day can be replayed together. Files are always read sequentially, and only
+		one line of each file is held in memory at once.
+
+		:param by_event: Group files by the event id of their market. Yields a tuple of each event id and the merged
+			stream of its files, with events in order of their first published time, and only the files of the current event open.
+		:param max_open_files: The most files to open at once. With more files than this, batches of files are merged into
+			temporary files first, as described in betfairHistorical.merge, and the ledger marks the files once all are merged
+		"""
+		file_paths = self.get_file_paths()
+		if self.ledger is not None:
+			file_paths = list(self.ledger.unprocessed(file_paths))
+		try:
+			if by_event:
+				for event_id, event_paths in group_by_event(file_paths):
+					yield event_id, self._merge_files(event_paths, max_open_files)
+			else:
+				yield from self._merge_files(file_paths, max_open_files)
+		finally:
+			self.close()
+		self._log_stats()
+
+	def _merge_files(self, file_paths: List[str], max_open_files: int) -> Iterator[Union[Dict, MarketMessage]]:
+		if len(file_paths) <= max_open_files:
+			yield from merge_files(file_paths, self._iter_merged_file, max_open_files)
+			return
+		# files are read in full while their batch is merged, before their lines are returned, so they are only marked at the end
+		yield from merge_files(file_paths, partial(self._iter_file, decode=True), max_open_files, records=self.records)
+		if self.ledger is not None:
+			for file_path in file_paths:
+				self.ledger.mark_processed(file_path)
+
+	def _iter_merged_file(self, file_path: str) -> Iterator[Union[Dict, MarketMessage]]:
+		lines = self._iter_file(file_path, decode=True)
+		if self.ledger is not None:
+			lines = self._mark_when_read(file_path, lines)
+		return lines
+
+	def summarize(self, file_paths: Iterable[str]=None) -> Iterator[RunnerSummary]:
+		"""
+		Streams a RunnerSummary of every runner of every market contained within local_path, as described in
+		betfairHistorical.summary, with the settlement, in-play time, off time, total matched and pre-off price of each runner.
+		Each file is summarized in a single pass without keeping its lines, and files are summarized in parallel if workers is set,
+		so only the summaries are returned from worker processes. Validation, filters and the ledger apply as when reading files.
+		A file which fails is logged and stored in errors against its path, with or without workers, and the run carries on.
+
+		:param file_paths: Local paths of the files to summarize. If None all files contained within local_path are summarized.
+		"""
+		if file_paths is None:
+			file_paths = self.get_file_paths()
+		if self.ledger is not None:
+			file_paths = self.ledger.unprocessed(file_paths)
+		if self.workers:
+			for _, summaries in self._iter_files_parallel(file_paths, worker=_summarize_file_worker):
+				yield from summaries
+		else:
+			try:
+				for file_path in file_paths:
+					try:
+						summaries = self._summarize_file(file_path)
+					except Exception as e:
+						self.record_error(file_path, e)
+						continue
+					yield from summaries
+			finally:
+				self.close()
+		self._log_stats()
+
+	def _summarize_file(self, file_path: str) -> List[RunnerSummary]:
+		"""
+		Summarizes a single file, adding it to the ledger once it has been read.
+		"""
+		summarizer = MarketSummarizer(self.plan)
+		for market in self._iter_file(file_path, decode=True):
+			summarizer.process(market)
+		if self.ledger is not None:
+			self.ledger.mark_processed(file_path)
+		return summarizer.summaries()
+
+	def _get_validator(self):
+		"""
+		Returns the compiled validator for this parser, either for the schema set in the class init or from betfairHistorical.registry.
+		The validator is built once per parser and shared between parsers using the same schema.
+		"""
+		if self._validator is None:
+			self._validator = get_validator(self.sport, self.market, self.validation_schema, self.plan)
+		return self._validator
+
+	def _get_validation_pool(self) -> ProcessPoolExecutor:
+		"""
+		Returns the pool of processes used to validate lines when validation_workers is set.
+		The pool is started on first use and reused for every file of a run, then shut down by close at the end of the run.
+		"""
+		if self._validation_pool is None:
+			self._validation_pool = validation_executor(
+				self.validation_workers,
+				self.sport,
+				self.market,
+				self.validation_schema,
+				self.plan
+				)
+			weakref.finalize(self, self._validation_pool.shutdown, wait=False)
+		return self._validation_pool
+
+	def close(self):
+		"""
+		Shuts down the validation worker processes, if any are running.
+		This is called at the end of each run, so is only needed if the lines of a file are consumed after its run has ended.
+		"""
+		pool, self._validation_pool = self._validation_pool, None
+		if pool is not None:
+			pool.shutdown()
+
+	def _sample_line(self, line_number: int) -> bool:
+		"""
+		Returns whether the line at line_number of a file should be validated given validate_first and validate_every.
+		"""
+		if self.validate_first is None and self.validate_every is None:
+			return True
+		if self.validate_first is not None and line_number < self.validate_first:
+			return True
+		return self.validate_every is not None and line_number % self.validate_every == 0
+
+	def _validate_schema(self, contents: List[Union[bytes, Dict]]):
 		"""
 		Used to validate the bytes content of the bz2 files against a jsonschema object.
+		Already decoded lines are validated as they are.
 		The jsonschema can either be set in the class init, or placed in the validation_schemas folder.
 		"""
-		default_schema = f"validation_schemas/{self.sport}/{self.market}.json"
-		default_schema_path = pkg_resources.resource_filename(__name__, default_schema)
-		if self.validation_schema:
-			schema = self.validation_schema
-		elif os.path.exists(default_schema_path):
-			with open(default_schema_path) as schema_json:
-				schema = json.load(schema_json)
-		else:
-			raise NoValidationSchema("No validation schema available in defaults or provided.")
-		for _line in contents:
-			jsonschema.validate(instance=json.loads(_line), schema=schema)
+		validator = self._get_validator()
+		for i, _line in enumerate(contents):
+			if self._sample_line(i):
+				_validate_line(validator.validate, _line if isinstance(_line, dict) else json_loads(_line), None, i + 1)
 		return
 
 	def get_market_change_id(sef, market_change: Dict) -> str:
@@ -135,3 +689,47 @@ class BetfairHistoricalFileParser:
 		if not published_time:
 			raise InvalidMarket("No published time available.")
 		return published_time
+
+
+def _validate_line(validate, market: Dict, file_path: str, line_number: int):
+	"""
+	Validates a single decoded line, raising InvalidLine with its position if it fails.
+	"""
+	try:
+		validate(market)
+	except ValidationError as e:
+		raise InvalidLine(e.message, file_path=file_path, line_number=line_number, market_id=market_id_of(market)) from e
+
+
+_worker_parser = None
+
+def _init_worker(state: Dict, validator: Tuple=None):
+	"""
+	Rebuilds the parser once in each worker process of the pool, and compiles its validator if it has one.
+	"""
+	global _worker_parser
+	_worker_parser = BetfairHistoricalFileParser.__new__(BetfairHistoricalFileParser)
+	_worker_parser.__dict__.update(state)
+	if validator is not None:
+		_worker_parser._validator = install_validator(*validator)
+
+def _read_file_worker(file_path: str, decode: bool) -> Tuple[List[Union[bytes, Dict]], List[FileStats]]:
+	"""
+	Reads a single file using the parser of the current worker process.
+	Returns the contents of the file, and its FileStats if the parser is instrumented.
+	"""
+	return _worker_result(_worker_parser._read_file(file_path, decode=decode))
+
+def _summarize_file_worker(file_path: str, decode: bool) -> Tuple[List[RunnerSummary], List[FileStats]]:
+	"""
+	Summarizes a single file using the parser of the current worker process. decode is not used, as lines are always decoded.
+	Returns the summaries of the file, and its FileStats if the parser is instrumented.
+	"""
+	return _worker_result(_worker_parser._summarize_file(file_path))
+
+def _worker_result(result: List) -> Tuple[List, List[FileStats]]:
+	stats = _worker_parser.stats
+	if stats is None:
+		return result, None
+	file_stats, stats.files = stats.files, []
+	return result, file_stats
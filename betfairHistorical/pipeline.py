@@ -0,0 +1,84 @@
+"""
+Pipelining of downloads into parsing, so that files are parsed while the rest of a basket is still downloading.
+
+Downloaded files are passed from BetfairHistoricDownloader to BetfairHistoricalFileParser through a bounded queue.
+When parsing falls behind the queue fills and no further downloads are started until it has space,
+so the number of files waiting to be parsed, and the memory held for them, stays bounded.
+"""
+import queue
+import threading
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from betfairHistorical.downloader import BetfairHistoricDownloader
+from betfairHistorical.parser import BetfairHistoricalFileParser
+
+_DONE = object()
+
+
+def download_and_parse(
+	downloader: BetfairHistoricDownloader,
+	parser: BetfairHistoricalFileParser,
+	file_list: List,
+	local_dir: str,
+	download_workers: int=4,
+	queue_size: int=8,
+	decode: bool=None,
+	**download_kwargs
+	) -> Iterator[Tuple[str, Iterable[Union[bytes, Dict]]]]:
+	"""
+	Downloads file_list into local_dir and parses each file as soon as it is on disk.
+	Yields the local path and contents of each file in the same way as BetfairHistoricalFileParser.iter_files.
+	Parsing is spread across processes if the parser was created with workers.
+
+	:param downloader: Downloader used to fetch the files
+	:param parser: Parser used to read the files. It is recommended this is created with lazy=True.
+	:param file_list: Remote file paths to be downloaded, as returned by BetfairHistoricDownloader.file_list
+	:param local_dir: Local directory to download files to
+	:param download_workers: Number of files downloaded at once
+	:param queue_size: Maximum number of downloaded files waiting to be parsed
+	:param decode: Yield lines as dictionaries rather than bytes. Defaults to the decode set on the parser.
+	:param download_kwargs: Further arguments passed to BetfairHistoricDownloader.iter_download_files
+	"""
+	downloaded = queue.Queue(maxsize=queue_size)
+	stop = threading.Event()
+
+	def _put(item):
+		while not stop.is_set():
+			try:
+				downloaded.put(item, timeout=0.1)
+				return
+			except queue.Full:
+				continue
+
+	def _download():
+		try:
+			for local_path in downloader.iter_download_files(
+				file_list=file_list,
+				local_dir=local_dir,
+				max_workers=download_workers,
+				**download_kwargs
+				):
+				_put(local_path)
+				if stop.is_set():
+					return
+		except Exception as e:
+			_put(e)
+		finally:
+			_put(_DONE)
+
+	def _downloaded_paths() -> Iterator[str]:
+		while True:
+			item = downloaded.get()
+			if item is _DONE:
+				return
+			if isinstance(item, Exception):
+				raise item
+			yield item
+
+	download_thread = threading.Thread(target=_download, name='download_and_parse', daemon=True)
+	download_thread.start()
+	try:
+		yield from parser.iter_paths(_downloaded_paths(), decode=decode)
+	finally:
+		stop.set()
+		download_thread.join()
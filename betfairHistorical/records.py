@@ -0,0 +1,221 @@
+"""
+Compact record types for the contents of historical files, as an alternative to decoded dictionaries.
+
+Each record stores its fields in __slots__ rather than a per-instance dictionary, and repeated strings such
+as market ids, runner names and statuses are interned so that every record shares a single copy of them.
+Records support get with the same keys as the decoded json, so they can be passed to the accessors of
+BetfairHistoricalFileParser and to MarketBookEngine in place of dictionaries. Keys which are not known
+fields are kept in extra.
+"""
+import sys
+from typing import Any, Dict
+
+
+class _Record:
+	__slots__ = ()
+	_keys = {}
+	_converters = {}
+
+	@classmethod
+	def from_dict(cls, data: Dict):
+		"""
+		Creates a record from a decoded dictionary.
+		"""
+		record = cls.__new__(cls)
+		for attribute in cls.__slots__:
+			setattr(record, attribute, None)
+		keys = cls._keys
+		converters = cls._converters
+		extra = None
+		for key, value in data.items():
+			attribute = keys.get(key)
+			if attribute is None:
+				if extra is None:
+					extra = {}
+				extra[key] = value
+				continue
+			converter = converters.get(key)
+			if converter is not None:
+				value = converter(value)
+			elif type(value) is str:
+				value = sys.intern(value)
+			setattr(record, attribute, value)
+		record.extra = extra
+		return record
+
+	def get(self, key: str, default: Any=None) -> Any:
+		"""
+		Returns the value of a field by its key in the decoded json, or default if it is not set.
+		"""
+		attribute = self._keys.get(key)
+		if attribute is None:
+			return self.extra.get(key, default) if self.extra else default
+		value = getattr(self, attribute)
+		return default if value is None else value
+
+	def to_dict(self) -> Dict:
+		"""
+		Returns the record as the dictionary it was decoded from.
+		"""
+		data = {}
+		for key, attribute in self._keys.items():
+			value = getattr(self, attribute)
+			if value is None:
+				continue
+			if isinstance(value, _Record):
+				value = value.to_dict()
+			elif isinstance(value, list) and value and isinstance(value[0], _Record):
+				value = [v.to_dict() for v in value]
+			data[key] = value
+		if self.extra:
+			data.update(self.extra)
+		return data
+
+	def __eq__(self, other) -> bool:
+		if type(other) is not type(self):
+			return NotImplemented
+		return all(getattr(self, attribute) == getattr(other, attribute) for attribute in self.__slots__)
+
+	def __repr__(self) -> str:
+		return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class RunnerChange(_Record):
+	"""
+	A change to a single runner, from the rc of a market change.
+	"""
+	__slots__ = ('selection_id', 'handicap', 'ltp', 'tv', 'atb', 'atl', 'trd', 'batb', 'batl', 'spn', 'spf', 'spb', 'spl', 'extra')
+	_keys = {
+		'id': 'selection_id',
+		'hc': 'handicap',
+		'ltp': 'ltp',
+		'tv': 'tv',
+		'atb': 'atb',
+		'atl': 'atl',
+		'trd': 'trd',
+		'batb': 'batb',
+		'batl': 'batl',
+		'spn': 'spn',
+		'spf': 'spf',
+		'spb': 'spb',
+		'spl': 'spl'
+	}
+	_converters = {}
+
+
+class RunnerDefinition(_Record):
+	"""
+	A single runner within a market definition.
+	"""
+	__slots__ = ('selection_id', 'handicap', 'name', 'status', 'sort_priority', 'adjustment_factor', 'bsp', 'removal_date', 'extra')
+	_keys = {
+		'id': 'selection_id',
+		'hc': 'handicap',
+		'name': 'name',
+		'status': 'status',
+		'sortPriority': 'sort_priority',
+		'adjustmentFactor': 'adjustment_factor',
+		'bsp': 'bsp',
+		'removalDate': 'removal_date'
+	}
+	_converters = {}
+
+
+def _intern_list(values):
+	return [sys.intern(v) if type(v) is str else v for v in values]
+
+def _runner_definitions(runners):
+	return [RunnerDefinition.from_dict(runner) for runner in runners]
+
+
+class MarketDefinition(_Record):
+	"""
+	The definition of a market, from the marketDefinition of a market change.
+	"""
+	__slots__ = (
+		'bet_delay', 'betting_type', 'bsp_market', 'bsp_reconciled', 'complete', 'country_code', 'cross_matching',
+		'discount_allowed', 'event_id', 'event_name', 'event_type_id', 'in_play', 'market_base_rate', 'market_time',
+		'market_type', 'name', 'number_of_active_runners', 'number_of_winners', 'open_date', 'persistence_enabled',
+		'regulators', 'runners', 'runners_voidable', 'settled_time', 'status', 'suspend_time', 'timezone',
+		'turn_in_play_enabled', 'venue', 'version', 'extra'
+	)
+	_keys = {
+		'betDelay': 'bet_delay',
+		'bettingType': 'betting_type',
+		'bspMarket': 'bsp_market',
+		'bspReconciled': 'bsp_reconciled',
+		'complete': 'complete',
+		'countryCode': 'country_code',
+		'crossMatching': 'cross_matching',
+		'discountAllowed': 'discount_allowed',
+		'eventId': 'event_id',
+		'eventName': 'event_name',
+		'eventTypeId': 'event_type_id',
+		'inPlay': 'in_play',
+		'marketBaseRate': 'market_base_rate',
+		'marketTime': 'market_time',
+		'marketType': 'market_type',
+		'name': 'name',
+		'numberOfActiveRunners': 'number_of_active_runners',
+		'numberOfWinners': 'number_of_winners',
+		'openDate': 'open_date',
+		'persistenceEnabled': 'persistence_enabled',
+		'regulators': 'regulators',
+		'runners': 'runners',
+		'runnersVoidable': 'runners_voidable',
+		'settledTime': 'settled_time',
+		'status': 'status',
+		'suspendTime': 'suspend_time',
+		'timezone': 'timezone',
+		'turnInPlayEnabled': 'turn_in_play_enabled',
+		'venue': 'venue',
+		'version': 'version'
+	}
+	_converters = {
+		'regulators': _intern_list,
+		'runners': _runner_definitions
+	}
+
+
+def _runner_changes(runner_changes):
+	return [RunnerChange.from_dict(runner_change) for runner_change in runner_changes]
+
+
+class MarketChange(_Record):
+	"""
+	A change to a single market, from the mc of a market message.
+	"""
+	__slots__ = ('market_id', 'market_definition', 'runner_changes', 'img', 'con', 'tv', 'extra')
+	_keys = {
+		'id': 'market_id',
+		'marketDefinition': 'market_definition',
+		'rc': 'runner_changes',
+		'img': 'img',
+		'con': 'con',
+		'tv': 'tv'
+	}
+	_converters = {
+		'marketDefinition': MarketDefinition.from_dict,
+		'rc': _runner_changes
+	}
+
+
+def _market_changes(market_changes):
+	return [MarketChange.from_dict(market_change) for market_change in market_changes]
+
+
+class MarketMessage(_Record):
+	"""
+	A single line of a historical file.
+	"""
+	__slots__ = ('op', 'clk', 'published_time', 'market_changes', 'extra')
+	_keys = {
+		'op': 'op',
+		'clk': 'clk',
+		'pt': 'published_time',
+		'mc': 'market_changes'
+	}
+	_converters = {
+		'clk': str,	# unique to each message so is not interned
+		'mc': _market_changes
+	}
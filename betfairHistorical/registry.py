@@ -0,0 +1,266 @@
+"""
+A registry of the sports, plans and markets which can be parsed and validated.
+
+Each plan lists the runner change fields its files contain, e.g. ltp for basic and atb, atl and trd for pro, along with
+the jsonschema of each field. runner_extractor returns a function which reads the fields of a plan from a runner change,
+so export and summaries only look up the fields a plan's files can contain, e.g. no tv for basic files.
+
+Each market of a sport has the marketType values of its files, e.g. WIN for horse_racing win or OVER_UNDER_25 for soccer
+over_under, and the schema of its lines. market_type_matcher returns whether a marketType belongs to a market, which the
+parser uses to only return the markets of its market type with match_market_type, e.g. WIN and not PLACE racing markets.
+
+The schema for a sport, plan and market is the market's schema with the plan's runner fields added. It is built once
+per process and cached, and schema files are only read the first time they are used.
+
+Further sports, plans and markets can be registered on the default registry, for example:
+
+	registry.register_plan('pro_racing', fields={'trd': PRICE_SIZE_SCHEMA}, base='advanced')
+	registry.register_market('horse_racing', 'each_way', market_types=('EACH_WAY',), schema_file='soccer/match_odds.json')
+
+Schemas are sent to worker processes when their pools start, so markets registered at runtime can be validated by workers.
+"""
+import copy
+import json
+import os
+import pkg_resources
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from betfairHistorical.exceptions import NoValidationSchema
+from betfairHistorical.globals import SUPPORTED_MARKETS, SUPPORTED_PLANS
+
+PRICE_SCHEMA = {"type": "number"}
+PRICE_SIZE_SCHEMA = {"type": "array", "items": {"type": "array", "items": {"type": "number"}}}
+
+
+class Plan(NamedTuple):
+	name: str
+	fields: Dict[str, Dict]
+
+
+class Market(NamedTuple):
+	sport: str
+	name: str
+	market_types: Tuple[str, ...]
+	prefix: bool
+	schema: Optional[Dict]
+	schema_file: Optional[str]
+
+
+class Registry:
+	def __init__(self):
+		"""
+		Holds the sports, plans and markets which can be parsed and validated. Names are not case sensitive.
+		"""
+		self._sports = {}
+		self._plans = {}
+		self._schemas = {}
+		# incremented by every registration which can change a schema, so validators cached against older schemas are not used
+		self.version = 0
+
+	def register_sport(self, sport: str):
+		"""
+		Adds a sport with no markets, if it is not already registered.
+		"""
+		self._sports.setdefault(sport.lower(), {})
+
+	def register_plan(self, plan: str, fields: Dict[str, Dict]=None, base: str=None):
+		"""
+		Adds or replaces a plan.
+
+		:param plan: Name of the plan
+		:param fields: Runner change fields of the plan's files, with the jsonschema of each value
+		:param base: A registered plan whose fields are included as well
+		"""
+		plan_fields = dict(self.get_plan(base).fields) if base is not None else {}
+		plan_fields.update(fields or {})
+		self._plans[plan.lower()] = Plan(plan.lower(), plan_fields)
+		self._schemas.clear()
+		self.version += 1
+
+	def register_market(
+		self,
+		sport: str,
+		market: str,
+		market_types: Iterable[str]=(),
+		prefix: bool=False,
+		schema: Dict=None,
+		schema_file: str=None
+		):
+		"""
+		Adds or replaces a market of a sport, registering the sport if needed.
+
+		:param sport: Sport of the market
+		:param market: Name of the market
+		:param market_types: The marketType values of the market's files, e.g. ('WIN',)
+		:param prefix: Match market_types as prefixes, e.g. OVER_UNDER_ for every over/under line
+		:param schema: The jsonschema of the market's lines
+		:param schema_file: Path of a schema within the validation_schemas folder, used if schema is None.
+			Defaults to {sport}/{market}.json
+		"""
+		sport, market = sport.lower(), market.lower()
+		if schema is None and schema_file is None:
+			schema_file = f"{sport}/{market}.json"
+		self.register_sport(sport)
+		self._sports[sport][market] = Market(sport, market, tuple(market_types), prefix, schema, schema_file)
+		self._schemas.clear()
+		self.version += 1
+
+	def sports(self) -> List[str]:
+		return list(self._sports)
+
+	def plans(self) -> List[str]:
+		return list(self._plans)
+
+	def markets(self, sport: str) -> List[str]:
+		return list(self._sports.get(sport.lower(), ()))
+
+	def is_supported(self, sport: str, plan: str, market: str) -> bool:
+		"""
+		Returns whether files of a sport, plan and market can be validated.
+		"""
+		return plan.lower() in self._plans and market.lower() in self._sports.get(sport.lower(), ())
+
+	def get_plan(self, plan: str) -> Plan:
+		try:
+			return self._plans[plan.lower()]
+		except KeyError:
+			raise NotImplementedError(f'{plan} not currently implemented') from None
+
+	def get_market(self, sport: str, market: str) -> Market:
+		try:
+			return self._sports[sport.lower()][market.lower()]
+		except KeyError:
+			raise NotImplementedError(f'{sport} {market} not currently implemented') from None
+
+	def get_schema(self, sport: str, plan: str, market: str) -> Dict:
+		"""
+		Returns the jsonschema for lines of a sport, plan and market: the market's schema with the runner fields of the plan.
+		Each schema is built once and the same dictionary is returned after, so it must not be modified.
+		"""
+		key = (sport.lower(), plan.lower(), market.lower())
+		schema = self._schemas.get(key)
+		if schema is None:
+			schema = self._schemas[key] = self._build_schema(self.get_market(sport, market), self.get_plan(plan))
+		return schema
+
+	def market_type_matcher(self, sport: str, market: str) -> 'MarketTypeMatcher':
+		"""
+		Returns a function of a marketType which returns whether it belongs to a market, e.g. for WIN or PLACE racing
+		files in a directory of every market type. Every marketType matches if the market has no market_types.
+		"""
+		market = self.get_market(sport, market)
+		return MarketTypeMatcher(market.market_types, market.prefix)
+
+	def runner_extractor(self, plan: Optional[str], fields: Iterable[str]=None) -> Callable[[Dict], Tuple]:
+		"""
+		Returns a function of a decoded runner change which returns a tuple of fields, with None for those not in the change.
+
+		:param plan: Plan of the files. Fields which are not in the plan are always None and are not looked up.
+			If None or not registered every field is looked up
+		:param fields: Fields to return, in order. Defaults to the plan's fields in the order they were registered,
+			e.g. ltp, tv, batb, batl, atb, atl and trd of a pro file in a single call
+		"""
+		registered = self._plans.get(plan.lower()) if plan is not None else None
+		plan_fields = tuple(registered.fields) if registered is not None else None
+		fields = tuple(fields) if fields is not None else plan_fields
+		if plan_fields is not None:
+			fields = tuple(field if field in plan_fields else None for field in fields)
+		def extract(runner_change: Dict) -> Tuple:
+			get = runner_change.get
+			return tuple([None if field is None else get(field) for field in fields])
+		return extract
+
+	@staticmethod
+	def _build_schema(market: Market, plan: Plan) -> Dict:
+		schema = copy.deepcopy(market.schema if market.schema is not None else load_schema_file(market.schema_file))
+		# the plan's fields are added to the properties of runner changes, if the schema describes them
+		runner_change = schema
+		for key in ('properties', 'mc', 'items', 'properties', 'rc', 'items'):
+			runner_change = runner_change.get(key) if isinstance(runner_change, dict) else None
+		if isinstance(runner_change, dict):
+			properties = runner_change.setdefault('properties', {})
+			for field, field_schema in plan.fields.items():
+				properties.setdefault(field, field_schema)
+		return schema
+
+
+class MarketTypeMatcher:
+	"""
+	Returns whether a marketType is one of market_types, or starts with one of them if prefix is set.
+	Every marketType matches if market_types is empty. Matchers can be sent to worker processes.
+	"""
+	def __init__(self, market_types: Tuple[str, ...], prefix: bool=False):
+		self.market_types = tuple(market_types)
+		self.prefix = prefix
+		self._market_types = frozenset(self.market_types)
+
+	def __call__(self, market_type: Optional[str]) -> bool:
+		if not self.market_types:
+			return True
+		if market_type is None:
+			return False
+		if self.prefix:
+			return market_type.startswith(self.market_types)
+		return market_type in self._market_types
+
+
+@lru_cache(maxsize=None)
+def load_schema_file(schema_file: str) -> Dict:
+	"""
+	Loads a schema from the validation_schemas folder. Each file is only read once per process.
+
+	:param schema_file: Path of the schema within the validation_schemas folder
+	return: The jsonschema as a dictionary
+	"""
+	schema_path = pkg_resources.resource_filename(__name__, f"validation_schemas/{schema_file}")
+	if not os.path.exists(schema_path):
+		raise NoValidationSchema(f"No validation schema available at {schema_file}.")
+	with open(schema_path) as schema_json:
+		return json.load(schema_json)
+
+
+_PLAN_FIELDS = {
+	'basic': {
+		'ltp': PRICE_SCHEMA
+		},
+	'advanced': {
+		'tv': PRICE_SCHEMA,
+		'batb': PRICE_SIZE_SCHEMA,
+		'batl': PRICE_SIZE_SCHEMA
+		},
+	'pro': {
+		'atb': PRICE_SIZE_SCHEMA,
+		'atl': PRICE_SIZE_SCHEMA,
+		'trd': PRICE_SIZE_SCHEMA,
+		'bdatb': PRICE_SIZE_SCHEMA,
+		'bdatl': PRICE_SIZE_SCHEMA,
+		'spn': PRICE_SCHEMA,
+		'spf': PRICE_SCHEMA,
+		'spb': PRICE_SIZE_SCHEMA,
+		'spl': PRICE_SIZE_SCHEMA
+		}
+}
+_PLAN_BASES = {'basic': None, 'advanced': 'basic', 'pro': 'advanced'}
+
+# marketType values of each default market, and whether they are prefixes.
+# Every default market is validated with the match_odds schema, which describes the market stream rather than a single market type.
+_MARKETS = {
+	('soccer', 'match_odds'): (('MATCH_ODDS',), False),
+	('soccer', 'over_under'): (('OVER_UNDER_',), True),
+	('horse_racing', 'win'): (('WIN',), False),
+	('horse_racing', 'place'): (('PLACE',), False)
+}
+
+
+def _default_registry() -> Registry:
+	default = Registry()
+	for plan in SUPPORTED_PLANS:
+		default.register_plan(plan, _PLAN_FIELDS[plan], base=_PLAN_BASES[plan])
+	for sport, markets in SUPPORTED_MARKETS.items():
+		for market in markets:
+			market_types, prefix = _MARKETS[sport, market]
+			default.register_market(sport, market, market_types, prefix=prefix, schema_file='soccer/match_odds.json')
+	return default
+
+registry = _default_registry()
@@ -0,0 +1,357 @@
+"""
+Resampling of the runner changes in a stream of decoded markets into fixed-interval bars. Requires numpy.
+
+Each bar covers one runner over one interval of published time, starting at a multiple of interval, and has the fields:
+
+market_id - string, id of the market.
+selection_id - int64, id of the runner.
+handicap - float64, handicap of the runner.
+time - int64, start of the interval in millis since epoch.
+open / high / low / close - float64, last traded price after the first change, the highest and lowest, and after the last change.
+volume - float64, traded volume during the interval, from the change in tv. NaN if tv is not in the data.
+best_back / best_lay - float64, best available to back and lay prices at the end of the interval, NaN if there are none.
+market_status - int8, the last status of the market from its marketDefinition, as codes into export.MARKET_STATUSES.
+ticks - int32, number of changes to the runner during the interval.
+
+A bar is only emitted for an interval in which the runner changed, including changes to the marketDefinition of its market,
+unless fill is set. Then every interval from a runner's first change up to the interval in which its market turned in play
+(if include_in_play is False) or closed has a bar, and an interval without changes repeats the close, best prices and status
+of the runner's previous bar with a volume and ticks of 0. Markets which have not ended when the stream does are filled up to
+the last change of the market.
+The state of each market is tracked with a MarketBook, and each change is recorded as a tick of the runner's state
+after it was applied. Ticks are buffered in typed arrays and aggregated into bars batch_size ticks at a time with NumPy,
+so only the ticks of bars which are still open are carried between batches rather than the full history.
+Markets must be in published time order within each market, as returned by BetfairHistoricalFileParser.iter_markets.
+"""
+from array import array
+from typing import Dict, Iterable, Iterator
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+from betfairHistorical.compat import require
+from betfairHistorical.exceptions import InvalidMarket, InvalidMarketChange
+from betfairHistorical.export import MARKET_ID_DTYPE, MARKET_STATUS_CODES
+from betfairHistorical.market_book import MarketBook, RunnerBook
+
+_TICK_COLUMNS = (
+	('key', 'q', 'i8'),
+	('bucket', 'q', 'i8'),
+	('ltp', 'd', 'f8'),
+	('tv', 'd', 'f8'),
+	('best_back', 'd', 'f8'),
+	('best_lay', 'd', 'f8'),
+	('market_status', 'b', 'i1')
+)
+
+_NAN = float('nan')
+
+
+def bar_dtype():
+	"""
+	Returns the NumPy dtype of resampled bars. Requires numpy.
+	"""
+	require(numpy, 'numpy')
+	return numpy.dtype([
+		('market_id', MARKET_ID_DTYPE),
+		('selection_id', 'i8'),
+		('handicap', 'f8'),
+		('time', 'i8'),
+		('open', 'f8'),
+		('high', 'f8'),
+		('low', 'f8'),
+		('close', 'f8'),
+		('volume', 'f8'),
+		('best_back', 'f8'),
+		('best_lay', 'f8'),
+		('market_status', 'i1'),
+		('ticks', 'i4')
+	])
+
+
+class Resampler:
+	def __init__(self, interval: int, include_in_play: bool=True, batch_size: int=100000, fill: bool=False):
+		"""
+		Resamples a stream of decoded markets into bars. Requires numpy.
+
+		:param interval: Length of each bar in milliseconds of published time
+		:param include_in_play: Include changes after a market has turned in play. If False each market's bars stop at the off.
+		:param batch_size: Number of ticks buffered before completed bars are aggregated and returned
+		:param fill: Emit a bar for every interval from each runner's first change to the off or close, forward filling
+			intervals without changes with a volume and ticks of 0
+		"""
+		require(numpy, 'numpy')
+		self.interval = interval
+		self.include_in_play = include_in_play
+		self.batch_size = batch_size
+		self.fill = fill
+		self.market_books = {}
+		self._ended = set()
+		self._keys = {}
+		self._key_values = []
+		self._finished = set()
+		self._last_tv = numpy.zeros(0)
+		# the last change of each market, and the last bar emitted for each runner, used to fill intervals
+		self._last_bucket = {}
+		self._last_bars = {}
+		self._ticks = _new_ticks()
+
+	def process(self, market: Dict):
+		"""
+		Records the changes in a single market.
+
+		:param market: A single decoded line of a file
+		return: An array of the bars completed so far if batch_size ticks have been buffered, otherwise None
+		"""
+		published_time = market.get('pt')
+		if not published_time:
+			raise InvalidMarket("No published time available.")
+		bucket = published_time - published_time % self.interval
+
+		for market_change in market.get('mc') or ():
+			market_id = market_change.get('id')
+			if not market_id:
+				raise InvalidMarketChange("Market change has no valid id key.")
+			if market_id in self._ended:
+				continue
+
+			market_book = self.market_books.get(market_id)
+			if market_book is None:
+				market_book = self.market_books[market_id] = MarketBook(market_id)
+			market_book.update(market_change, published_time)
+			self._last_bucket[market_id] = bucket
+
+			if market_book.in_play and not self.include_in_play:
+				self._end_market(market_book)
+				continue
+
+			if market_change.get('marketDefinition'):
+				runners = market_book.runners.values()
+			else:
+				runners = [
+					market_book.runners[(runner_change.get('id'), runner_change.get('hc', 0))]
+					for runner_change in market_change.get('rc') or ()
+					]
+			status = MARKET_STATUS_CODES.get(market_book.status, -1)
+			for runner in runners:
+				self._add_tick(market_id, runner, bucket, status)
+
+			if market_book.status == 'CLOSED':
+				self._end_market(market_book)
+
+		if len(self._ticks['key']) >= self.batch_size:
+			return self._bars(final=False)
+		return None
+
+	def flush(self):
+		"""
+		Returns an array of every remaining bar, including those whose interval may not have ended.
+		"""
+		return self._bars(final=True)
+
+	def iter_bars(self, markets: Iterable[Dict]) -> Iterator:
+		"""
+		Resamples a stream of markets, yielding arrays of bars as they are completed.
+		Each array is sorted by runner and then time.
+
+		:param markets: Decoded lines, ordered by published time within each market
+		"""
+		for market in markets:
+			bars = self.process(market)
+			if bars is not None and len(bars):
+				yield bars
+		bars = self.flush()
+		if len(bars):
+			yield bars
+
+	def _key(self, market_id: str, runner: RunnerBook) -> int:
+		key = (market_id, runner.selection_id, runner.handicap)
+		index = self._keys.get(key)
+		if index is None:
+			index = self._keys[key] = len(self._key_values)
+			self._key_values.append(key)
+		return index
+
+	def _add_tick(self, market_id: str, runner: RunnerBook, bucket: int, status: int):
+		ticks = self._ticks
+		ticks['key'].append(self._key(market_id, runner))
+		ticks['bucket'].append(bucket)
+		ticks['ltp'].append(_NAN if runner.ltp is None else runner.ltp)
+		ticks['tv'].append(_NAN if runner.tv is None else runner.tv)
+		ticks['best_back'].append(_best_price(runner.batb, runner.atb, max))
+		ticks['best_lay'].append(_best_price(runner.batl, runner.atl, min))
+		ticks['market_status'].append(status)
+
+	def _end_market(self, market_book: MarketBook):
+		"""
+		Marks the runners of a market as finished, so their open bars are completed in the next batch, and stops tracking it.
+		"""
+		for runner in market_book.runners.values():
+			self._finished.add(self._key(market_book.market_id, runner))
+		self._ended.add(market_book.market_id)
+		del self.market_books[market_book.market_id]
+
+	def _bars(self, final: bool):
+		"""
+		Aggregates the buffered ticks into bars. The last bar of each runner is kept open, and its ticks carried
+		into the next batch, unless final is set or the runner's market has ended.
+		"""
+		dtype = bar_dtype()
+		ticks = {
+			name: numpy.frombuffer(self._ticks[name], dtype=numpy_type) if len(self._ticks[name]) else numpy.zeros(0, numpy_type)
+			for name, _, numpy_type in _TICK_COLUMNS
+			}
+		count = len(ticks['key'])
+		if len(self._last_tv) < len(self._key_values):
+			self._last_tv = numpy.concatenate([self._last_tv, numpy.zeros(len(self._key_values) - len(self._last_tv))])
+		if not count:
+			self._finished.clear()
+			return numpy.empty(0, dtype=dtype)
+
+		# stable, so ticks within a bar stay in the order they were published
+		order = numpy.lexsort((ticks['bucket'], ticks['key']))
+		ticks = {name: column[order] for name, column in ticks.items()}
+		key = ticks['key']
+		bucket = ticks['bucket']
+
+		new_bar = numpy.empty(count, dtype=bool)
+		new_bar[0] = True
+		new_bar[1:] = (key[1:] != key[:-1]) | (bucket[1:] != bucket[:-1])
+		starts = numpy.flatnonzero(new_bar)
+		ends = numpy.append(starts[1:], count) - 1
+		bar_key = key[starts]
+
+		complete = numpy.ones(len(starts), dtype=bool)
+		if not final:
+			last_of_key = numpy.append(bar_key[1:] != bar_key[:-1], True)
+			finished = numpy.isin(bar_key, numpy.fromiter(self._finished, dtype='i8', count=len(self._finished)))
+			complete = ~last_of_key | finished
+
+		# tv is the runner's total traded volume, so volume is its change since the runner's previous bar
+		close_tv = ticks['tv'][ends]
+		known = ~numpy.isnan(close_tv)
+		previous_tv = self._last_tv[bar_key]
+		same_key = (bar_key[1:] == bar_key[:-1]) & known[:-1]
+		previous_tv[1:] = numpy.where(same_key, close_tv[:-1], previous_tv[1:])
+
+		bars = numpy.empty(int(complete.sum()), dtype=dtype)
+		keys = self._key_values
+		bars['market_id'] = [keys[k][0] for k in bar_key[complete]]
+		bars['selection_id'] = [keys[k][1] for k in bar_key[complete]]
+		bars['handicap'] = [keys[k][2] for k in bar_key[complete]]
+		bars['time'] = bucket[starts][complete]
+		ltp = ticks['ltp']
+		bars['open'] = ltp[starts][complete]
+		bars['high'] = numpy.fmax.reduceat(ltp, starts)[complete]
+		bars['low'] = numpy.fmin.reduceat(ltp, starts)[complete]
+		bars['close'] = ltp[ends][complete]
+		bars['volume'] = (close_tv - previous_tv)[complete]
+		bars['best_back'] = ticks['best_back'][ends][complete]
+		bars['best_lay'] = ticks['best_lay'][ends][complete]
+		bars['market_status'] = ticks['market_status'][ends][complete]
+		bars['ticks'] = (ends - starts + 1)[complete]
+		if self.fill:
+			ended = numpy.append(bar_key[1:] != bar_key[:-1], True)
+			if not final:
+				ended &= finished
+			bars = self._fill(bars, bar_key[complete], ended[complete])
+
+		completed_tv = complete & known
+		self._last_tv[bar_key[completed_tv]] = close_tv[completed_tv]
+
+		carried = ~complete[numpy.cumsum(new_bar) - 1]
+		self._ticks = _new_ticks()
+		for name, type_code, _ in _TICK_COLUMNS:
+			self._ticks[name].frombytes(ticks[name][carried].tobytes())
+		self._finished.clear()
+		return bars
+
+	def _fill(self, bars, keys, ended):
+		"""
+		Adds a bar for each interval without changes between the bars of a runner, including its last bar of an earlier
+		batch, and after the last bar of each runner which has ended up to the last change of its market.
+
+		:param bars: Completed bars, sorted by runner and then time
+		:param keys: The runner key of each bar
+		:param ended: Whether each bar is the last bar of its runner
+		"""
+		if not len(bars):
+			return bars
+		previous_keys = [k for k in numpy.unique(keys).tolist() if k in self._last_bars]
+		emitted = numpy.ones(len(bars), dtype=bool)
+		if previous_keys:
+			previous = numpy.array([self._last_bars[k] for k in previous_keys], dtype=bars.dtype)
+			bars = numpy.concatenate([previous, bars])
+			keys = numpy.concatenate([numpy.array(previous_keys, dtype='i8'), keys])
+			ended = numpy.concatenate([numpy.zeros(len(previous), dtype=bool), ended])
+			emitted = numpy.concatenate([numpy.zeros(len(previous), dtype=bool), emitted])
+			order = numpy.lexsort((bars['time'], keys))
+			bars, keys, ended, emitted = bars[order], keys[order], ended[order], emitted[order]
+
+		# the time after the last interval to fill after each bar
+		time = bars['time']
+		next_time = time + self.interval
+		same_key = keys[1:] == keys[:-1]
+		next_time[:-1] = numpy.where(same_key, time[1:], next_time[:-1])
+		if ended.any():
+			last_bucket = [self._last_bucket[self._key_values[k][0]] for k in keys[ended].tolist()]
+			next_time[ended] = numpy.maximum(numpy.array(last_bucket, dtype='i8'), time[ended]) + self.interval
+		counts = (next_time - time) // self.interval - 1
+
+		filled = numpy.repeat(bars, counts)
+		filled_keys = numpy.repeat(keys, counts)
+		first = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+		filled['time'] += (numpy.arange(len(filled)) - first + 1) * self.interval
+		for name in ('open', 'high', 'low'):
+			filled[name] = filled['close']
+		filled['volume'] = 0
+		filled['ticks'] = 0
+
+		# the last bar of each runner which has not ended is kept to fill the gap to its next bar
+		last = numpy.append(~same_key, True)
+		for k, bar, has_ended in zip(keys[last].tolist(), bars[last], ended[last].tolist()):
+			if has_ended:
+				self._last_bars.pop(k, None)
+			else:
+				self._last_bars[k] = bar.copy()
+
+		bars = numpy.concatenate([bars[emitted], filled])
+		keys = numpy.concatenate([keys[emitted], filled_keys])
+		return bars[numpy.lexsort((bars['time'], keys))]
+
+
+def resample(
+	markets: Iterable[Dict],
+	interval: int,
+	include_in_play: bool=True,
+	batch_size: int=100000,
+	fill: bool=False
+	) -> Iterator:
+	"""
+	Resamples a stream of decoded markets into arrays of bars. Requires numpy.
+
+	:param markets: Decoded lines, such as those from BetfairHistoricalFileParser.iter_markets
+	:param interval: Length of each bar in milliseconds of published time
+	:param include_in_play: Include changes after a market has turned in play. If False each market's bars stop at the off.
+	:param batch_size: Number of ticks buffered before completed bars are aggregated and yielded
+	:param fill: Emit a bar for every interval from each runner's first change to the off or close, as Resampler
+	"""
+	yield from Resampler(interval, include_in_play=include_in_play, batch_size=batch_size, fill=fill).iter_bars(markets)
+
+
+def _new_ticks() -> Dict[str, array]:
+	return {name: array(type_code) for name, type_code, _ in _TICK_COLUMNS}
+
+def _best_price(levels: Dict, ladder: Dict, best) -> float:
+	"""
+	Returns the best price of a runner's best available levels if there are any, otherwise of its full ladder.
+	"""
+	if levels:
+		level = levels.get(0)
+		if level is not None:
+			return level[0]
+	if ladder:
+		return best(ladder)
+	return _NAN
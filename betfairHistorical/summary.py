@@ -0,0 +1,205 @@
+"""
+Per-market and per-runner summaries of historical files, computed in a single streaming pass.
+
+Each summary is a single row for one runner of one market, with the fields:
+
+market_id - string, id of the market.
+event_id - string, id of the event of the market.
+market_type - string, e.g. MATCH_ODDS.
+market_time - int, scheduled off time of the market from its marketDefinition, in millis since epoch.
+in_play_time - int, published time of the first marketDefinition with the market in play. None if it never turned in play.
+selection_id - int, id of the runner.
+handicap - float, handicap of the runner.
+name - string, name of the runner if the definitions have names.
+status - string, the runner's status in the last marketDefinition, e.g. WINNER, LOSER or REMOVED.
+winner - bool, whether status is WINNER.
+total_matched - float, the runner's last traded volume (tv). None if the files have no tv.
+pre_off_ltp - float, the runner's last traded price before the market turned in play, or the last of all if it never did.
+bsp - float, Betfair starting price of the runner if the market has one.
+
+Only the current state of each market and runner is kept while a file is read, so memory does not grow with
+the number of changes.
+"""
+import calendar
+import csv
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from betfairHistorical.exceptions import InvalidMarket, InvalidMarketChange
+from betfairHistorical.registry import registry
+
+
+class RunnerSummary(NamedTuple):
+	market_id: str
+	event_id: Optional[str]
+	market_type: Optional[str]
+	market_time: Optional[int]
+	in_play_time: Optional[int]
+	selection_id: int
+	handicap: float
+	name: Optional[str]
+	status: Optional[str]
+	winner: bool
+	total_matched: Optional[float]
+	pre_off_ltp: Optional[float]
+	bsp: Optional[float]
+
+
+class _RunnerState:
+	__slots__ = ('name', 'status', 'tv', 'ltp', 'pre_off_ltp', 'bsp')
+
+	def __init__(self):
+		self.name = None
+		self.status = None
+		self.tv = None
+		self.ltp = None
+		self.pre_off_ltp = None
+		self.bsp = None
+
+
+class _MarketState:
+	__slots__ = ('event_id', 'market_type', 'market_time', 'in_play_time', 'runners')
+
+	def __init__(self):
+		self.event_id = None
+		self.market_type = None
+		self.market_time = None
+		self.in_play_time = None
+		self.runners = {}
+
+	def runner(self, selection_id: int, handicap: float) -> _RunnerState:
+		key = (selection_id, handicap)
+		runner = self.runners.get(key)
+		if runner is None:
+			runner = self.runners[key] = _RunnerState()
+		return runner
+
+
+class MarketSummarizer:
+	def __init__(self, plan: str=None):
+		"""
+		Summarizes a stream of decoded markets, one line at a time.
+		Lines must be in published time order within each market.
+
+		:param plan: Plan of the files, so only the runner fields of the plan are read, e.g. no tv for basic files
+		"""
+		self.markets = {}
+		self._extract = registry.runner_extractor(plan, ('ltp', 'tv'))
+
+	def process(self, market: Dict):
+		"""
+		Updates the summaries with a single decoded line, which may be a dictionary or MarketMessage.
+		"""
+		published_time = market.get('pt')
+		if not published_time:
+			raise InvalidMarket("No published time available.")
+
+		for market_change in market.get('mc') or ():
+			market_id = market_change.get('id')
+			if not market_id:
+				raise InvalidMarketChange("Market change has no valid id key.")
+			state = self.markets.get(market_id)
+			if state is None:
+				state = self.markets[market_id] = _MarketState()
+
+			market_definition = market_change.get('marketDefinition')
+			if market_definition:
+				self._update_definition(state, market_definition, published_time)
+
+			in_play = state.in_play_time is not None
+			for runner_change in market_change.get('rc') or ():
+				runner = state.runner(runner_change.get('id'), runner_change.get('hc', 0))
+				ltp, tv = self._extract(runner_change)
+				if ltp is not None:
+					runner.ltp = ltp
+					if not in_play:
+						runner.pre_off_ltp = ltp
+				if tv is not None:
+					runner.tv = tv
+
+	@staticmethod
+	def _update_definition(state: _MarketState, market_definition: Dict, published_time: int):
+		# keys are only updated when present, so definitions deduplicated by betfairHistorical.definitions are applied correctly
+		event_id = market_definition.get('eventId')
+		if event_id is not None:
+			state.event_id = event_id
+		market_type = market_definition.get('marketType')
+		if market_type is not None:
+			state.market_type = market_type
+		market_time = market_definition.get('marketTime')
+		if market_time is not None:
+			state.market_time = market_time
+		if market_definition.get('inPlay') and state.in_play_time is None:
+			state.in_play_time = published_time
+
+		for runner_definition in market_definition.get('runners') or ():
+			runner = state.runner(runner_definition.get('id'), runner_definition.get('hc', 0))
+			for attribute, key in (('name', 'name'), ('status', 'status'), ('bsp', 'bsp')):
+				value = runner_definition.get(key)
+				if value is not None:
+					setattr(runner, attribute, value)
+
+	def summaries(self) -> List[RunnerSummary]:
+		"""
+		Returns a summary of every runner of every market seen so far, in the order they were first seen.
+		"""
+		summaries = []
+		for market_id, state in self.markets.items():
+			market_time = _parse_time(state.market_time)
+			for (selection_id, handicap), runner in state.runners.items():
+				summaries.append(RunnerSummary(
+					market_id=market_id,
+					event_id=state.event_id,
+					market_type=state.market_type,
+					market_time=market_time,
+					in_play_time=state.in_play_time,
+					selection_id=selection_id,
+					handicap=handicap,
+					name=runner.name,
+					status=runner.status,
+					winner=runner.status == 'WINNER',
+					total_matched=runner.tv,
+					pre_off_ltp=runner.pre_off_ltp if state.in_play_time is not None else runner.ltp,
+					bsp=runner.bsp
+					))
+		return summaries
+
+
+def summarize(markets: Iterable[Dict], plan: str=None) -> List[RunnerSummary]:
+	"""
+	Returns the summary of every runner in a stream of decoded markets.
+
+	:param markets: Decoded lines, such as those from BetfairHistoricalFileParser.iter_markets
+	:param plan: Plan of the files, so only the runner fields of the plan are read
+	"""
+	summarizer = MarketSummarizer(plan)
+	for market in markets:
+		summarizer.process(market)
+	return summarizer.summaries()
+
+def write_csv(summaries: Iterable[RunnerSummary], file_path: str) -> int:
+	"""
+	Writes summaries to a csv file with a header of the RunnerSummary fields. Missing values are left empty.
+
+	:param summaries: RunnerSummary rows, such as those from BetfairHistoricalFileParser.summarize
+	:param file_path: Local path of the csv file
+	return: Number of rows written
+	"""
+	rows = 0
+	with open(file_path, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(RunnerSummary._fields)
+		for summary in summaries:
+			writer.writerow(summary)
+			rows += 1
+	return rows
+
+
+def _parse_time(value: Optional[str]) -> Optional[int]:
+	"""
+	Converts a time from a marketDefinition, e.g. 2017-04-25T18:45:00.000Z, into millis since epoch.
+	"""
+	if value is None:
+		return None
+	parsed = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+	return calendar.timegm(parsed.timetuple()) * 1000 + parsed.microsecond // 1000
@@ -0,0 +1,218 @@
+"""
+Loading and compiling of the jsonschemas used to validate file contents.
+
+Schemas are loaded and checked once per process and the compiled validators are cached,
+so validating a line is a single call on an existing validator object. Default schemas come from
+betfairHistorical.registry, and worker processes are sent each schema once when they start.
+
+ShardedValidator validates the lines of a single file in batches across a pool of processes,
+so that a very large file is validated in parallel while it is still being decompressed.
+"""
+import hashlib
+import json
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+import jsonschema
+
+from betfairHistorical.compat import json_loads
+from betfairHistorical.exceptions import InvalidLine, NoValidationSchema
+from betfairHistorical.registry import load_schema_file, registry
+
+_validators = {}
+
+def load_default_schema(sport: str, market: str) -> Dict:
+	"""
+	Loads the default schema for a sport and market from the validation_schemas folder.
+	Each file is only read once per process.
+
+	:param sport: Sport of the schema
+	:param market: Market of the schema
+	return: The jsonschema as a dictionary
+	"""
+	try:
+		return load_schema_file(f"{sport}/{market}.json")
+	except NoValidationSchema:
+		raise NoValidationSchema(f"No default validation schema available for {sport} {market}.") from None
+
+def default_schema(sport: str, plan: str, market: str) -> Dict:
+	"""
+	Returns the schema of a sport, plan and market from the registry, or from the validation_schemas folder if they are not registered.
+	"""
+	if registry.is_supported(sport, plan, market):
+		return registry.get_schema(sport, plan, market)
+	return load_default_schema(sport, market)
+
+def compile_validator(schema: Dict):
+	"""
+	Checks a schema and returns a validator instance for the draft it declares.
+
+	:param schema: The jsonschema to compile
+	return: A jsonschema validator
+	"""
+	validator_class = jsonschema.validators.validator_for(schema)
+	validator_class.check_schema(schema)
+	return validator_class(schema)
+
+def validator_key(sport: str, market: str, schema: Dict=None, plan: str='basic') -> Union[Tuple[str, str, str, int], str]:
+	"""
+	Returns the key a validator is cached against: the sport, plan and market and the registry version for a default schema,
+	or a digest of a supplied schema.
+	"""
+	if schema is None:
+		return sport, plan, market, registry.version
+	return hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+def get_validator(sport: str, market: str, schema: Dict=None, plan: str='basic'):
+	"""
+	Returns the cached validator for a supplied schema, or for the default schema of a sport, plan and market.
+	Each distinct schema is only compiled once per process.
+
+	:param sport: Sport used to find the default schema
+	:param market: Market used to find the default schema
+	:param schema: A jsonschema to use instead of the default
+	:param plan: Plan used to find the default schema
+	return: A jsonschema validator
+	"""
+	key = validator_key(sport, market, schema, plan)
+	validator = _validators.get(key)
+	if validator is None:
+		validator = compile_validator(default_schema(sport, plan, market) if schema is None else schema)
+		_validators[key] = validator
+	return validator
+
+def install_validator(key: Union[Tuple[str, str, str, int], str], schema: Dict):
+	"""
+	Compiles a schema and caches its validator against key, replacing any validator already cached against it.
+	Used as the initializer of worker processes, so each schema is sent to and compiled in each worker once.
+
+	return: The jsonschema validator
+	"""
+	validator = _validators[key] = compile_validator(schema)
+	return validator
+
+def validation_executor(max_workers: int, sport: str, market: str, schema: Dict=None, plan: str='basic') -> ProcessPoolExecutor:
+	"""
+	Returns a pool of processes for ShardedValidator, each of which compiles the validator once when it starts.
+	The schema is resolved here, so sports, plans and markets registered in this process can be validated by the workers.
+	"""
+	return ProcessPoolExecutor(
+		max_workers=max_workers,
+		initializer=install_validator,
+		initargs=(validator_key(sport, market, schema, plan), default_schema(sport, plan, market) if schema is None else schema)
+		)
+
+def market_id_of(market: Dict) -> Union[str, None]:
+	"""
+	Returns the id of the first market change of a decoded line, used to report where validation failed.
+	"""
+	market_changes = market.get('mc') if isinstance(market, dict) else None
+	if market_changes and isinstance(market_changes[0], dict):
+		return market_changes[0].get('id')
+	return None
+
+def validate_lines(key: Union[Tuple[str, str, str, int], str], lines: List[Tuple[int, bytes]]) -> Union[Tuple[int, str, str], None]:
+	"""
+	Validates a batch of numbered raw lines, stopping at the first which fails.
+	Used by the worker processes of ShardedValidator, which each compile the validator once.
+	Only the key of the validator is sent with each batch, never the schema.
+
+	:param key: The validator_key of the schema
+	:param lines: Tuples of line number and raw line
+	return: The line number, market id and error message of the first line which fails, or None if all lines are valid
+	"""
+	validator = _validators.get(key)
+	if validator is None:
+		if not isinstance(key, tuple):
+			raise NoValidationSchema("Supplied schemas must be installed in worker processes, e.g. with validation_executor.")
+		sport, plan, market, _ = key
+		validator = get_validator(sport, market, plan=plan)
+	for line_number, line in lines:
+		decoded = json_loads(line)
+		try:
+			validator.validate(decoded)
+		except jsonschema.ValidationError as e:
+			return line_number, market_id_of(decoded), e.message
+	return None
+
+
+class ShardedValidator:
+	def __init__(
+		self,
+		executor: Executor,
+		file_path: str,
+		sport: str,
+		market: str,
+		schema: Dict=None,
+		batch_size: int=1000,
+		max_pending: int=8,
+		plan: str='basic'
+		):
+		"""
+		Validates the lines of a single file in batches on executor, while the caller carries on reading the file.
+		Batches are checked in the order they were submitted, so the failure reported is always the first in the file.
+
+		:param executor: Pool of processes to validate batches in
+		:param file_path: Path of the file, used to report failures
+		:param sport: Sport used to find the default schema
+		:param market: Market used to find the default schema
+		:param schema: A jsonschema to use instead of the default. The workers of executor must have it installed,
+			as executors from validation_executor do.
+		:param batch_size: Number of lines validated in each batch
+		:param max_pending: Number of batches submitted before add waits for the oldest to complete
+		:param plan: Plan used to find the default schema
+		"""
+		self.executor = executor
+		self.file_path = file_path
+		self.sport = sport
+		self.market = market
+		self.schema = schema
+		self.plan = plan
+		self.key = validator_key(sport, market, schema, plan)
+		self.batch_size = batch_size
+		self.max_pending = max_pending
+		self._batch = []
+		self._pending = deque()
+
+	def add(self, line_number: int, line: bytes):
+		"""
+		Adds a raw line to be validated. Raises InvalidLine if an earlier batch has already failed.
+
+		:param line_number: Number of the line within the file, counting from 1
+		:param line: The raw line
+		"""
+		self._batch.append((line_number, line))
+		if len(self._batch) >= self.batch_size:
+			self._submit()
+
+	def finish(self):
+		"""
+		Waits for every line added to be validated. Raises InvalidLine for the first line in the file which failed.
+		"""
+		if self._batch:
+			self._submit()
+		while self._pending:
+			self._check(self._pending.popleft())
+
+	def cancel(self):
+		"""
+		Cancels any batches which have not started, e.g. when the file is not read in full.
+		"""
+		for future in self._pending:
+			future.cancel()
+		self._pending.clear()
+		self._batch = []
+
+	def _submit(self):
+		batch, self._batch = self._batch, []
+		self._pending.append(self.executor.submit(validate_lines, self.key, batch))
+		while self._pending and (len(self._pending) > self.max_pending or self._pending[0].done()):
+			self._check(self._pending.popleft())
+
+	def _check(self, future):
+		failure = future.result()
+		if failure is not None:
+			self.cancel()
+			line_number, market_id, message = failure
+			raise InvalidLine(message, file_path=self.file_path, line_number=line_number, market_id=market_id)
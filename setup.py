@@ -11,7 +11,18 @@ setup(
 	author_email='peter.mclagan94@gmail.com',
 	url='https://github.com/petermclagan/betfair-historical',
 	packages=find_packages(),
+	package_data={'betfairHistorical': ['validation_schemas/*/*.json']},
 	install_requires=requirements,
+	extras_require={
+		'fast': ['orjson'],
+		'numpy': ['numpy'],
+		'arrow': ['pyarrow'],
+		'zstd': ['zstandard'],
+		'async': ['aiohttp']
+		},
+	entry_points={
+		'console_scripts': ['betfair-historical=betfairHistorical.cli:main']
+		},
 	license='MIT',
 	zip_safe=False
 	)
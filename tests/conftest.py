@@ -0,0 +1,32 @@
+"""
+Fixtures shared by the tests of BetfairHistoricalFileParser
+"""
+import os
+from typing import Callable
+
+import pytest
+
+from betfairHistorical import BetfairHistoricalFileParser
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+
+@pytest.fixture
+def make_parser(request) -> Callable[..., BetfairHistoricalFileParser]:
+	"""
+	Returns a factory of parsers of the soccer basic match odds sample. Keyword arguments are passed to the parser,
+	after any defaults in the PARSER_KWARGS of the test module, e.g. PARSER_KWARGS = {'lazy': True}.
+	"""
+	defaults = getattr(request.module, 'PARSER_KWARGS', {})
+
+	def _make(local_path: str=TEST_DATA_LOCAL_FILE, plan: str="basic", **kwargs) -> BetfairHistoricalFileParser:
+		return BetfairHistoricalFileParser(
+			local_path=local_path,
+			sport="soccer",
+			plan=plan,
+			market="match_odds",
+			**{**defaults, **kwargs}
+			)
+
+	return _make
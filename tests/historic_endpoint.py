@@ -0,0 +1,66 @@
+"""
+A local stand-in for the Betfair historic data endpoint, used to test and benchmark downloads without credentials.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+
+class HistoricEndpoint:
+	def __init__(self, files: Dict[str, bytes], failures: int=0):
+		"""
+		Serves DownloadFile requests for files from memory on a random local port.
+
+		:param files: Dictionary of remote file path to file contents
+		:param failures: Number of requests for each file which fail with a 500 before it is served
+		"""
+		self.files = files
+		self.failures = {file_path: failures for file_path in files}
+		self.requests = []
+		self.lock = threading.Lock()
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+		self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/"
+
+	def _handler(self):
+		endpoint = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def do_GET(self):
+				url = urlparse(self.path)
+				file_path = parse_qs(url.query).get('filePath', [None])[0]
+				with endpoint.lock:
+					endpoint.requests.append(file_path)
+					fail = endpoint.failures.get(file_path, 0) > 0
+					if fail:
+						endpoint.failures[file_path] -= 1
+
+				if url.path != '/api/DownloadFile' or file_path not in endpoint.files:
+					self.send_response(404)
+					self.send_header('Content-Length', '0')
+					self.end_headers()
+				elif fail:
+					self.send_response(500)
+					self.send_header('Content-Length', '0')
+					self.end_headers()
+				else:
+					contents = endpoint.files[file_path]
+					self.send_response(200)
+					self.send_header('Content-Length', str(len(contents)))
+					self.end_headers()
+					self.wfile.write(contents)
+
+			def log_message(self, *args):
+				pass
+
+		return Handler
+
+	def __enter__(self):
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		return self
+
+	def __exit__(self, *args):
+		self.server.shutdown()
+		self.server.server_close()
@@ -0,0 +1,110 @@
+"""
+This file tests the seekable block-compressed archive format and reading it with BetfairHistoricalFileParser
+"""
+import bz2
+import json
+import os
+import shutil
+
+import pytest
+
+from betfairHistorical.archive import SeekableArchive, find_files, is_seekable, iter_file_lines, recompress, recompress_files
+from betfairHistorical.compat import zstandard
+from betfairHistorical.index import ArchiveIndex
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	CONTENTS = f.readlines()
+
+MARKETS = [json.loads(line) for line in CONTENTS]
+MARKET_ID = "1.131162722"
+FROM_TIME = 1493560800000
+TO_TIME = 1493564400000
+
+CODECS = ['zlib'] + (['zstd'] if zstandard is not None else [])
+
+
+@pytest.fixture(params=CODECS)
+def seekable_file(request, tmp_path):
+	return recompress(TEST_DATA_LOCAL_FILE, str(tmp_path / 'sample.bfz'), codec=request.param, block_size=16 * 1024)
+
+
+class TestFindFiles:
+
+	@pytest.mark.parametrize("recursive", [False, True])
+	def test_sorted(self, tmp_path, recursive):
+		(tmp_path / 'sub').mkdir()
+		for name in ['1.3.bz2', '1.1.bz2', 'sub/1.0.bz2', '1.2.bz2', '.manifest.json', '1.4.bz2.part']:
+			(tmp_path / name).write_bytes(b'')
+		expected = [str(tmp_path / name) for name in ['1.1.bz2', '1.2.bz2', '1.3.bz2']]
+		if recursive:
+			expected.append(str(tmp_path / 'sub' / '1.0.bz2'))
+		assert find_files(str(tmp_path), recursive=recursive) == expected
+
+
+class TestSeekableArchive:
+
+	def test_recompress_roundtrip(self, seekable_file):
+		assert is_seekable(seekable_file)
+		assert not is_seekable(TEST_DATA_LOCAL_FILE)
+		assert list(iter_file_lines(seekable_file)) == CONTENTS
+
+	def test_recompress_blocks(self, seekable_file):
+		with SeekableArchive(seekable_file) as archive:
+			assert len(archive.blocks) > 1
+			assert sum(block['lines'] for block in archive.blocks) == len(CONTENTS)
+			assert [line for i in range(len(archive.blocks)) for line in archive.read_block(i)] == CONTENTS
+
+	def test_recompress_time_bucket(self, tmp_path):
+		dest_path = recompress(TEST_DATA_LOCAL_FILE, str(tmp_path / 'sample.bfz'), codec='zlib', time_bucket=3600000)
+		with SeekableArchive(dest_path) as archive:
+			for block in archive.blocks:
+				assert block['first_pt'] // 3600000 == block['last_pt'] // 3600000
+
+	def test_find_blocks_skips_other_markets(self, seekable_file):
+		with SeekableArchive(seekable_file) as archive:
+			blocks = archive.find_blocks(market_ids=[MARKET_ID])
+			assert 0 < len(blocks) < len(archive.blocks)
+			lines = [json.loads(line) for line in archive.iter_lines(market_ids=[MARKET_ID])]
+		expected = [market for market in MARKETS if any(mc['id'] == MARKET_ID for mc in market['mc'])]
+		assert all(market in lines for market in expected)
+
+	def test_iter_lines_time_window(self, seekable_file):
+		with SeekableArchive(seekable_file) as archive:
+			lines = list(archive.iter_lines(from_time=FROM_TIME, to_time=TO_TIME))
+		assert lines == [line for line, market in zip(CONTENTS, MARKETS) if FROM_TIME <= market['pt'] <= TO_TIME]
+
+	def test_iter_lines_selected_blocks(self, seekable_file):
+		with SeekableArchive(seekable_file) as archive:
+			assert list(archive.iter_lines(blocks=[1])) == archive.read_block(1)
+
+	def test_recompress_files(self, tmp_path):
+		source_dir = tmp_path / 'source'
+		os.makedirs(source_dir / 'nested')
+		shutil.copy(TEST_DATA_LOCAL_FILE, source_dir / 'nested' / 'sample.bz2')
+		dest_paths = recompress_files(str(source_dir), str(tmp_path / 'dest'), codec='zlib')
+		assert dest_paths == [str(tmp_path / 'dest' / 'nested' / 'sample.bfz')]
+		assert list(iter_file_lines(dest_paths[0])) == CONTENTS
+
+	def test_index_reads_seekable_files(self, seekable_file, tmp_path):
+		with ArchiveIndex(str(tmp_path / 'index.sqlite')) as index:
+			index.index_file(seekable_file)
+			assert index.query(market_ids=[MARKET_ID]) == [seekable_file]
+
+
+class TestParserSeekable:
+
+	def test_parser_reads_seekable_files(self, seekable_file, make_parser):
+		assert make_parser(seekable_file, validate=True).data == CONTENTS
+
+	@pytest.mark.parametrize("local_path", [TEST_DATA_LOCAL_FILE, None])
+	def test_parser_market_ids(self, seekable_file, local_path, make_parser):
+		parser = make_parser(local_path or seekable_file, validate=False, market_ids=[MARKET_ID])
+		assert parser.data == [line for line, market in zip(CONTENTS, MARKETS) if any(mc['id'] == MARKET_ID for mc in market['mc'])]
+
+	@pytest.mark.parametrize("local_path", [TEST_DATA_LOCAL_FILE, None])
+	def test_parser_time_window(self, seekable_file, local_path, make_parser):
+		parser = make_parser(local_path or seekable_file, validate=False, from_time=FROM_TIME, to_time=TO_TIME)
+		assert parser.data == [line for line, market in zip(CONTENTS, MARKETS) if FROM_TIME <= market['pt'] <= TO_TIME]
@@ -0,0 +1,160 @@
+"""
+This file tests AsyncBetfairHistoricDownloader against a local stand-in for the historic data endpoint.
+No credentials are required. Every test runs with downloads made by aiohttp, which is skipped if it is not installed,
+and by requests in an executor.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from betfairHistorical import async_downloader
+from betfairHistorical.async_downloader import AsyncBetfairHistoricDownloader
+from betfairHistorical.downloader import MANIFEST_FILE
+from historic_endpoint import HistoricEndpoint
+
+FILES = {
+	f"/xds_nfs/edp_processed/BASIC/2020/Jan/1/{event_id}/1.{event_id}.bz2": os.urandom(50000)
+	for event_id in range(100, 120)
+	}
+
+
+@pytest.fixture(params=['aiohttp', 'requests'], autouse=True)
+def backend(request, monkeypatch) -> str:
+	if request.param == 'aiohttp':
+		pytest.importorskip('aiohttp')
+	else:
+		monkeypatch.setattr(async_downloader, '_import_aiohttp', lambda: None)
+	return request.param
+
+def _downloader(endpoint: HistoricEndpoint, **kwargs) -> AsyncBetfairHistoricDownloader:
+	downloader = AsyncBetfairHistoricDownloader(
+		username="username",
+		password="password",
+		app_key="app_key",
+		cert_path="certs",
+		**kwargs
+		)
+	downloader.historic_url = endpoint.url
+	downloader.trading.set_session_token("session_token")
+	return downloader
+
+
+async def _download_files(endpoint: HistoricEndpoint, local_dir: str, file_list=FILES, **kwargs):
+	async with _downloader(endpoint, **kwargs) as downloader:
+		downloaded = await downloader.download_files(list(file_list), local_dir, backoff=0)
+	return downloader, downloaded
+
+
+class TestAsyncDownloader:
+
+	def test_download_files(self, tmp_path):
+		with HistoricEndpoint(FILES) as endpoint:
+			_, downloaded = asyncio.run(_download_files(endpoint, str(tmp_path), max_concurrency=4))
+
+		assert sorted(downloaded) == sorted(str(tmp_path / f.split('/')[-1]) for f in FILES)
+		for file_path, contents in FILES.items():
+			assert (tmp_path / file_path.split('/')[-1]).read_bytes() == contents
+		manifest = json.loads((tmp_path / MANIFEST_FILE).read_text())
+		assert manifest == {f: len(contents) for f, contents in FILES.items()}
+
+	def test_download_file(self, tmp_path):
+		file_path = next(iter(FILES))
+
+		async def _download(endpoint):
+			async with _downloader(endpoint) as downloader:
+				return await downloader.download_file(file_path, str(tmp_path))
+
+		with HistoricEndpoint(FILES) as endpoint:
+			local_path = asyncio.run(_download(endpoint))
+		assert open(local_path, 'rb').read() == FILES[file_path]
+
+	def test_resumes_from_manifest(self, tmp_path):
+		with HistoricEndpoint(FILES) as endpoint:
+			asyncio.run(_download_files(endpoint, str(tmp_path)))
+		with HistoricEndpoint(FILES) as endpoint:
+			_, downloaded = asyncio.run(_download_files(endpoint, str(tmp_path)))
+			assert endpoint.requests == []
+		assert len(downloaded) == len(FILES)
+
+	def test_retries(self, tmp_path):
+		with HistoricEndpoint(FILES, failures=1) as endpoint:
+			downloader, downloaded = asyncio.run(_download_files(endpoint, str(tmp_path)))
+			assert len(endpoint.requests) == 2 * len(FILES)
+		assert len(downloaded) == len(FILES)
+		assert downloader.errors == {}
+
+	def test_failures_recorded(self, tmp_path):
+		missing = "/xds_nfs/edp_processed/BASIC/2020/Jan/1/999/1.999.bz2"
+		with HistoricEndpoint(FILES) as endpoint:
+			downloader, downloaded = asyncio.run(_download_files(endpoint, str(tmp_path), [missing, *FILES]))
+		assert len(downloaded) == len(FILES)
+		assert list(downloader.errors) == [missing]
+		assert not os.path.exists(tmp_path / '1.999.bz2')
+
+	def test_concurrency_is_bounded(self, tmp_path):
+		in_flight = []
+		peak = []
+
+		async def _download(endpoint):
+			downloader = _downloader(endpoint, max_concurrency=3)
+			download_to_path = downloader._download_to_path
+
+			async def _tracked(*args):
+				in_flight.append(1)
+				peak.append(len(in_flight))
+				try:
+					return await download_to_path(*args)
+				finally:
+					in_flight.pop()
+
+			downloader._download_to_path = _tracked
+			async with downloader:
+				return await downloader.download_files(list(FILES), str(tmp_path))
+
+		with HistoricEndpoint(FILES) as endpoint:
+			asyncio.run(_download(endpoint))
+		assert max(peak) == 3
+
+	def test_backend(self, backend):
+		async def _session():
+			async with _downloader(HistoricEndpoint({})) as downloader:
+				return type(downloader._get_session())
+
+		session_class = asyncio.run(_session())
+		if backend == 'aiohttp':
+			assert session_class.__module__.startswith('aiohttp')
+		else:
+			assert issubclass(session_class, requests.Session)
+
+	def test_aiohttp_not_imported_with_package(self):
+		code = "import sys, betfairHistorical; assert 'aiohttp' not in sys.modules"
+		subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.getcwd()))
+
+	def test_expired_session_logs_in_once(self, tmp_path):
+		logins = []
+
+		async def _download(endpoint):
+			downloader = _downloader(endpoint, max_concurrency=8)
+			trading = downloader.trading
+
+			def _login():
+				logins.append(threading.get_ident())
+				time.sleep(0.1)
+				trading.set_session_token("session_token")
+
+			trading.login = _login
+			trading._login_time = None
+			async with downloader:
+				return await downloader.download_files(list(FILES), str(tmp_path))
+
+		with HistoricEndpoint(FILES) as endpoint:
+			downloaded = asyncio.run(_download(endpoint))
+		assert len(downloaded) == len(FILES)
+		assert len(logins) == 1
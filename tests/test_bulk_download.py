@@ -0,0 +1,106 @@
+"""
+This file tests BetfairHistoricDownloader.download_files against a local stand-in for the historic data endpoint.
+No credentials are required.
+"""
+import json
+import os
+import threading
+import time
+
+from betfairHistorical import BetfairHistoricDownloader
+from betfairHistorical.downloader import MANIFEST_FILE
+from historic_endpoint import HistoricEndpoint
+
+FILES = {
+	f"/xds_nfs/edp_processed/BASIC/2020/Jan/1/{event_id}/1.{event_id}.bz2": os.urandom(50000)
+	for event_id in range(100, 110)
+	}
+
+
+def _downloader(endpoint: HistoricEndpoint) -> BetfairHistoricDownloader:
+	downloader = BetfairHistoricDownloader(
+		username="username",
+		password="password",
+		app_key="app_key",
+		cert_path="certs",
+		login=False
+		)
+	downloader.historic_url = endpoint.url
+	downloader.trading.set_session_token("session_token")
+	return downloader
+
+
+class TestBulkDownload:
+
+	def test_download_files(self, tmp_path):
+		with HistoricEndpoint(FILES) as endpoint:
+			downloaded = _downloader(endpoint).download_files(list(FILES), str(tmp_path), max_workers=4)
+
+		assert len(downloaded) == len(FILES)
+		for file_path, contents in FILES.items():
+			assert (tmp_path / file_path.split('/')[-1]).read_bytes() == contents
+
+	def test_download_files_writes_manifest(self, tmp_path):
+		with HistoricEndpoint(FILES) as endpoint:
+			_downloader(endpoint).download_files(list(FILES), str(tmp_path))
+
+		manifest = json.loads((tmp_path / MANIFEST_FILE).read_text())
+		assert manifest == {file_path: len(contents) for file_path, contents in FILES.items()}
+
+	def test_download_files_resumes_from_manifest(self, tmp_path):
+		file_list = list(FILES)
+		with HistoricEndpoint(FILES) as endpoint:
+			_downloader(endpoint).download_files(file_list[:5], str(tmp_path))
+			_downloader(endpoint).download_files(file_list, str(tmp_path))
+
+		assert sorted(endpoint.requests) == sorted(file_list)
+
+	def test_download_files_skips_existing_with_matching_size(self, tmp_path):
+		file_path = next(iter(FILES))
+		local_path = tmp_path / file_path.split('/')[-1]
+		local_path.write_bytes(FILES[file_path])
+		os.utime(local_path, (0, 0))
+		with HistoricEndpoint(FILES) as endpoint:
+			_downloader(endpoint).download_files([file_path], str(tmp_path))
+
+		assert os.path.getmtime(local_path) == 0
+
+	def test_download_files_retries(self, tmp_path):
+		with HistoricEndpoint(FILES, failures=2) as endpoint:
+			downloader = _downloader(endpoint)
+			downloaded = downloader.download_files(list(FILES), str(tmp_path), retries=2, backoff=0.01)
+
+		assert len(downloaded) == len(FILES)
+		assert not downloader.errors
+
+	def test_download_files_records_errors(self, tmp_path):
+		file_list = list(FILES) + ["/does/not/exist.bz2"]
+		with HistoricEndpoint(FILES) as endpoint:
+			downloader = _downloader(endpoint)
+			downloaded = downloader.download_files(file_list, str(tmp_path), retries=1, backoff=0.01)
+
+		assert len(downloaded) == len(FILES)
+		assert list(downloader.errors) == ["/does/not/exist.bz2"]
+		assert not os.path.exists(tmp_path / "exist.bz2")
+
+	def test_expired_session_logs_in_once(self, tmp_path):
+		logins = []
+		with HistoricEndpoint(FILES) as endpoint:
+			downloader = _downloader(endpoint)
+			trading = downloader.trading
+
+			def _login():
+				logins.append(threading.get_ident())
+				time.sleep(0.1)
+				trading.set_session_token("session_token")
+
+			trading.login = _login
+			downloaded = []
+			for local_path in downloader.iter_download_files(list(FILES), str(tmp_path), max_workers=4):
+				if not downloaded:
+					# the session expires once the run has started
+					trading._login_time = None
+				downloaded.append(local_path)
+
+		assert len(downloaded) == len(FILES)
+		assert len(logins) == 1
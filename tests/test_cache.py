@@ -0,0 +1,155 @@
+"""
+This file tests MetadataCache and the cached metadata queries of BetfairHistoricDownloader.
+The remote historic endpoint is replaced with a stand-in which counts requests, so no credentials are required.
+"""
+from datetime import date, datetime, timedelta
+
+from betfairHistorical import BetfairHistoricDownloader
+from betfairHistorical.cache import MetadataCache
+
+
+class StandInHistoric:
+	"""
+	Records the arguments of each metadata request and returns a file per day requested.
+	"""
+	def __init__(self):
+		self.requests = []
+
+	def get_my_data(self):
+		self.requests.append(('get_my_data',))
+		return [{'sport': 'Soccer', 'plan': 'Basic Plan'}]
+
+	def get_data_size(self, **kwargs):
+		self.requests.append(('get_data_size', kwargs))
+		return {'totalSizeMB': 1, 'fileCount': 1}
+
+	def get_collection_options(self, **kwargs):
+		self.requests.append(('get_collection_options', kwargs))
+		return {'marketTypesCollection': [], 'countriesCollection': [], 'fileTypeCollection': []}
+
+	def get_file_list(self, **kwargs):
+		self.requests.append(('get_file_list', kwargs))
+		day = date(kwargs['from_year'], kwargs['from_month'], kwargs['from_day'])
+		to_day = date(kwargs['to_year'], kwargs['to_month'], kwargs['to_day'])
+		files = []
+		while day <= to_day:
+			files.append(f"/{day.year}/{day.month}/{day.day}.bz2")
+			day += timedelta(days=1)
+		return files
+
+
+def _downloader(to_date: datetime, historic: StandInHistoric, **kwargs) -> BetfairHistoricDownloader:
+	downloader = BetfairHistoricDownloader(
+		username="username",
+		password="password",
+		app_key="app_key",
+		cert_path="certs",
+		sport="Soccer",
+		plan="Basic Plan",
+		from_date=datetime(2020, 1, 15),
+		to_date=to_date,
+		login=False,
+		**kwargs
+		)
+	downloader.trading.set_session_token("session_token")
+	downloader.trading.historic = historic
+	return downloader
+
+FILE_LIST_KWARGS = {
+	'market_types_collection': ["MATCH_ODDS"],
+	'countries_collection': ["GB"],
+	'file_type_collection': ["M"]
+	}
+
+
+class TestMetadataCache:
+
+	def test_get_missing(self):
+		assert MetadataCache(ttl=60).get('key') == (False, None)
+
+	def test_set_and_get(self):
+		cache = MetadataCache(ttl=60)
+		cache.set('key', [1, 2])
+		assert cache.get('key') == (True, [1, 2])
+
+	def test_expired_entry(self):
+		cache = MetadataCache(ttl=-1)
+		cache.set('key', 1)
+		assert cache.get('key') == (False, None)
+
+	def test_persisted_between_instances(self, tmp_path):
+		MetadataCache(ttl=60, cache_dir=str(tmp_path)).set('key', {'a': 1})
+		assert MetadataCache(ttl=60, cache_dir=str(tmp_path)).get('key') == (True, {'a': 1})
+
+	def test_key_is_stable(self):
+		assert MetadataCache.key('file_list', date(2020, 1, 1), ['GB']) == MetadataCache.key('file_list', date(2020, 1, 1), ['GB'])
+		assert MetadataCache.key('file_list', ['GB']) != MetadataCache.key('file_list', ['IE'])
+
+
+class TestCachedDownloader:
+
+	def test_available_data_is_lazy(self):
+		historic = StandInHistoric()
+		downloader = _downloader(datetime(2020, 1, 20), historic, cache_ttl=60)
+		assert not historic.requests
+		assert downloader.available_data == downloader.available_data
+		assert historic.requests == [('get_my_data',)]
+
+	def test_available_data_expires(self):
+		historic = StandInHistoric()
+		downloader = _downloader(datetime(2020, 1, 20), historic, cache_ttl=-1)
+		downloader.available_data
+		downloader.available_data
+		assert historic.requests == [('get_my_data',), ('get_my_data',)]
+
+	def test_available_data_kept_without_cache(self):
+		historic = StandInHistoric()
+		downloader = _downloader(datetime(2020, 1, 20), historic)
+		assert downloader.available_data == downloader.available_data
+		assert historic.requests == [('get_my_data',)]
+
+	def test_queries_without_cache(self):
+		historic = StandInHistoric()
+		downloader = _downloader(datetime(2020, 1, 20), historic)
+		downloader.basket_size()
+		downloader.basket_size()
+		assert len(historic.requests) == 2
+
+	def test_queries_are_cached(self):
+		historic = StandInHistoric()
+		downloader = _downloader(datetime(2020, 1, 20), historic, cache_ttl=60)
+		for _ in range(2):
+			downloader.collection_options()
+			downloader.basket_size()
+			downloader.file_list(**FILE_LIST_KWARGS)
+		assert len(historic.requests) == 3
+
+	def test_file_list_split_by_month(self):
+		historic = StandInHistoric()
+		file_list = _downloader(datetime(2020, 3, 2), historic, cache_ttl=60).file_list(**FILE_LIST_KWARGS)
+		assert [(r[1]['from_month'], r[1]['from_day'], r[1]['to_month'], r[1]['to_day']) for r in historic.requests] == [
+			(1, 15, 1, 31), (2, 1, 2, 29), (3, 1, 3, 2)
+			]
+		assert len(file_list) == 17 + 29 + 2
+
+	def test_file_list_single_request_without_cache(self):
+		historic = StandInHistoric()
+		file_list = _downloader(datetime(2020, 3, 2), historic).file_list(**FILE_LIST_KWARGS)
+		assert [(r[1]['from_month'], r[1]['from_day'], r[1]['to_month'], r[1]['to_day']) for r in historic.requests] == [
+			(1, 15, 3, 2)
+			]
+		assert len(file_list) == 17 + 29 + 2
+
+	def test_extending_range_only_requests_new_months(self, tmp_path):
+		historic = StandInHistoric()
+		_downloader(datetime(2020, 2, 29), historic, cache_ttl=60, cache_dir=str(tmp_path)).file_list(**FILE_LIST_KWARGS)
+		historic.requests.clear()
+		_downloader(datetime(2020, 3, 10), historic, cache_ttl=60, cache_dir=str(tmp_path)).file_list(**FILE_LIST_KWARGS)
+		assert [r[1]['from_month'] for r in historic.requests] == [3]
+
+	def test_filters_are_part_of_key(self):
+		historic = StandInHistoric()
+		downloader = _downloader(datetime(2020, 1, 20), historic, cache_ttl=60)
+		downloader.file_list(**FILE_LIST_KWARGS)
+		downloader.file_list(**dict(FILE_LIST_KWARGS, countries_collection=["IE"]))
+		assert len(historic.requests) == 2
@@ -0,0 +1,221 @@
+"""
+This file tests the betfair-historical command line tool. list and download run against a local stand-in for the
+historic data endpoint, so no credentials are required.
+"""
+import bz2
+import os
+import shutil
+
+import pytest
+
+from betfairHistorical import BetfairHistoricDownloader, cli
+from betfairHistorical.cli import in_shard, main, shard_of
+from historic_endpoint import HistoricEndpoint
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	LINES = f.readlines()
+
+FILES = {
+	f"/xds_nfs/edp_processed/BASIC/2020/Jan/1/{event_id}/1.{event_id}.bz2": os.urandom(20000)
+	for event_id in range(100, 120)
+	}
+
+REMOTE_ARGS = ['--sport', 'Soccer', '--plan', 'Basic Plan', '--from-date', '2020-01-01', '--to-date', '2020-01-31']
+LOCAL_ARGS = ['--sport', 'soccer', '--market', 'match_odds']
+
+
+def _invalid(archive: str) -> str:
+	file_path = os.path.join(archive, '1.100.bz2')
+	with bz2.open(file_path, 'wb') as f:
+		f.writelines(LINES[:10] + [LINES[10].replace(b'"pt":', b'"pt":"', 1).replace(b',"mc"', b'","mc"', 1)])
+	return file_path
+
+def _truncated(archive: str) -> str:
+	file_path = os.path.join(archive, '1.100.bz2')
+	with open(file_path, 'rb+') as f:
+		f.truncate(os.path.getsize(file_path) // 2)
+	return file_path
+
+
+@pytest.fixture
+def archive(tmp_path) -> str:
+	archive = tmp_path / 'archive'
+	archive.mkdir()
+	for i in range(8):
+		shutil.copy(TEST_DATA_LOCAL_FILE, archive / f"1.{100 + i}.bz2")
+	return str(archive)
+
+@pytest.fixture
+def endpoint(monkeypatch):
+	with HistoricEndpoint(FILES) as endpoint:
+		def _downloader(args):
+			downloader = BetfairHistoricDownloader(
+				username="username",
+				password="password",
+				app_key="app_key",
+				cert_path="certs",
+				sport=args.sport,
+				plan=args.plan,
+				from_date=args.from_date,
+				to_date=args.to_date,
+				login=False
+				)
+			downloader.historic_url = endpoint.url
+			downloader.trading.set_session_token("session_token")
+			downloader.file_list = lambda **kwargs: list(FILES)
+			return downloader
+
+		monkeypatch.setattr(cli, '_downloader', _downloader)
+		yield endpoint
+
+
+class TestShards:
+
+	def test_shards_partition_files(self):
+		shards = [set(in_shard(FILES, (i, 4))) for i in range(4)]
+		assert set().union(*shards) == set(FILES)
+		assert sum(len(shard) for shard in shards) == len(FILES)
+
+	def test_shard_is_stable_between_remote_and_local_paths(self):
+		for file_path in FILES:
+			local_path = os.path.join('/data', file_path.split('/')[-1])
+			assert shard_of(file_path, 4) == shard_of(local_path, 4)
+
+	@pytest.mark.parametrize('shard', ['4/4', '-1/4', '1', 'a/b'])
+	def test_invalid_shard(self, shard, archive):
+		with pytest.raises(SystemExit):
+			main(['parse', archive, '--shard', shard] + LOCAL_ARGS)
+
+
+class TestParse:
+
+	def test_parse(self, archive, capsys):
+		assert main(['parse', archive] + LOCAL_ARGS) == 0
+		summary = capsys.readouterr().err
+		assert f"8 files (0 failed), {8 * len(LINES)} lines" in summary
+		assert "throughput:" in summary
+
+	def test_parse_output(self, archive, tmp_path):
+		output = tmp_path / 'lines.jsonl'
+		assert main(['parse', archive, '--output', str(output), '--batch-size', '100', '--no-validate'] + LOCAL_ARGS) == 0
+		assert output.read_bytes() == b''.join(LINES) * 8
+
+	def test_parse_sharded(self, archive, tmp_path):
+		outputs = []
+		for i in range(3):
+			output = tmp_path / f"{i}.jsonl"
+			main(['parse', archive, '--shard', f"{i}/3", '--output', str(output), '--no-validate'] + LOCAL_ARGS)
+			outputs.append(output.read_bytes().count(b'\n'))
+		assert sum(outputs) == 8 * len(LINES)
+
+	def test_parse_workers(self, archive, capsys):
+		assert main(['parse', archive, '--workers', '2'] + LOCAL_ARGS) == 0
+		assert "8 files (0 failed)" in capsys.readouterr().err
+
+	def test_parse_ledger(self, archive, tmp_path, capsys):
+		ledger = str(tmp_path / 'ledger.db')
+		main(['parse', archive, '--ledger', ledger, '--no-validate'] + LOCAL_ARGS)
+		main(['parse', archive, '--ledger', ledger, '--no-validate'] + LOCAL_ARGS)
+		assert "0 files (0 failed)" in capsys.readouterr().err
+
+	@pytest.mark.parametrize("corrupt", [_invalid, _truncated])
+	@pytest.mark.parametrize("workers", [[], ['--workers', '2']])
+	def test_parse_failure_exit_code(self, archive, tmp_path, capsys, corrupt, workers):
+		failed = corrupt(archive)
+		output = tmp_path / 'lines.jsonl'
+		assert main(['parse', archive, '--output', str(output)] + workers + LOCAL_ARGS) == 1
+		err = capsys.readouterr().err
+		assert "8 files (1 failed)" in err
+		assert f"failed: {failed}" in err
+		assert output.read_bytes().count(b'\n') == 7 * len(LINES)
+
+	def test_parse_date_range(self, archive, tmp_path):
+		output = tmp_path / 'lines.jsonl'
+		main(['parse', TEST_DATA_LOCAL_FILE, '--from-date', '2017-04-26', '--to-date', '2017-04-26', '--output', str(output)] + LOCAL_ARGS)
+		lines = output.read_bytes().splitlines()
+		assert 0 < len(lines) < len(LINES)
+
+
+class TestExport:
+
+	def test_export_parquet(self, archive, tmp_path, capsys):
+		pyarrow = pytest.importorskip('pyarrow')
+		import pyarrow.parquet
+		output = str(tmp_path / 'markets.parquet')
+		assert main(['export', archive, output, '--batch-size', '1000', '--no-validate'] + LOCAL_ARGS) == 0
+		table = pyarrow.parquet.read_table(output)
+		assert table.num_rows == 8 * 5628
+		assert f"exported {8 * 5628} rows" in capsys.readouterr().err
+
+	def test_export_arrow_sharded(self, archive, tmp_path):
+		pyarrow = pytest.importorskip('pyarrow')
+		import pyarrow.ipc
+		rows = 0
+		for i in range(2):
+			output = str(tmp_path / f"{i}.out")
+			main(['export', archive, output, '--format', 'arrow', '--shard', f"{i}/2", '--no-validate'] + LOCAL_ARGS)
+			rows += pyarrow.ipc.open_file(output).read_all().num_rows
+		assert rows == 8 * 5628
+
+	@pytest.mark.parametrize("corrupt", [_invalid, _truncated])
+	@pytest.mark.parametrize("workers", [[], ['--workers', '2']])
+	def test_export_failure_exit_code(self, archive, tmp_path, capsys, corrupt, workers):
+		pyarrow = pytest.importorskip('pyarrow')
+		import pyarrow.parquet
+		failed = corrupt(archive)
+		output = str(tmp_path / 'markets.parquet')
+		assert main(['export', archive, output] + workers + LOCAL_ARGS) == 1
+		assert f"failed: {failed}" in capsys.readouterr().err
+		assert pyarrow.parquet.read_table(output).num_rows == 7 * 5628
+
+	def test_export_unknown_format(self, archive, tmp_path):
+		with pytest.raises(SystemExit):
+			main(['export', archive, str(tmp_path / 'markets.csv')] + LOCAL_ARGS)
+
+
+class TestSummarize:
+
+	@pytest.mark.parametrize("corrupt", [_invalid, _truncated])
+	@pytest.mark.parametrize("workers", [[], ['--workers', '2']])
+	def test_summarize_failure_exit_code(self, archive, tmp_path, capsys, corrupt, workers):
+		failed = corrupt(archive)
+		output = tmp_path / 'summaries.csv'
+		assert main(['summarize', archive, str(output)] + workers + LOCAL_ARGS) == 1
+		err = capsys.readouterr().err
+		assert f"failed: {failed}" in err
+		assert "(1 failed)" in err
+		assert output.read_text().count('\n') > 1
+
+
+class TestRemote:
+
+	def test_missing_credentials(self, monkeypatch):
+		for name in ('BETFAIR_USERNAME', 'BETFAIR_PASSWORD', 'BETFAIR_APP_KEY', 'BETFAIR_CERT_PATH'):
+			monkeypatch.delenv(name, raising=False)
+		with pytest.raises(SystemExit):
+			main(['list'] + REMOTE_ARGS)
+
+	def test_list_sharded(self, endpoint, capsys):
+		listed = []
+		for i in range(2):
+			assert main(['list', '--shard', f"{i}/2"] + REMOTE_ARGS) == 0
+			listed.extend(capsys.readouterr().out.split())
+		assert sorted(listed) == sorted(FILES)
+
+	def test_download(self, endpoint, tmp_path, capsys):
+		assert main(['download', str(tmp_path), '--workers', '4'] + REMOTE_ARGS) == 0
+		for file_path, contents in FILES.items():
+			assert (tmp_path / file_path.split('/')[-1]).read_bytes() == contents
+		assert f"{len(FILES)} of {len(FILES)} files (0 failed)" in capsys.readouterr().err
+
+	def test_download_file_list(self, endpoint, tmp_path):
+		file_list = tmp_path / 'files.txt'
+		file_list.write_text("\n".join(list(FILES)[:5]) + "\n")
+		local_dir = tmp_path / 'data'
+		assert main(['download', str(local_dir), '--file-list', str(file_list)] + REMOTE_ARGS) == 0
+		downloaded = sorted(f for f in os.listdir(local_dir) if f.endswith('.bz2'))
+		assert downloaded == sorted(f.split('/')[-1] for f in list(FILES)[:5])
+		assert sorted(endpoint.requests) == sorted(list(FILES)[:5])
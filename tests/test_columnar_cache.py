@@ -0,0 +1,129 @@
+"""
+This file tests ColumnarCache and reading cached columns with BetfairHistoricalFileParser
+"""
+import bz2
+import json
+import os
+import shutil
+
+import pytest
+
+from betfairHistorical import columnar_cache
+from betfairHistorical.columnar_cache import HASHES_FILE, ColumnarCache
+from betfairHistorical.exceptions import InvalidLine
+from betfairHistorical.export import iter_batches
+from betfairHistorical.ledger import file_hash
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+EXPECTED = next(iter_batches(MARKETS, batch_size=10 ** 9))
+
+PARSER_KWARGS = {'lazy': True}
+
+
+def _nan_equal(a, b) -> bool:
+	return all(x == y or (x != x and y != y) for x, y in zip(a, b)) and len(a) == len(b)
+
+
+class TestColumnarCache:
+
+	def test_columns_match_export(self, tmp_path, make_parser):
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		(file_path, columns), = make_parser().iter_columns(cache)
+		assert file_path == TEST_DATA_LOCAL_FILE
+		assert len(columns) == len(EXPECTED['market_id'])
+		assert columns.market_id_values() == EXPECTED['market_id']
+		for name in ('published_time', 'selection_id', 'market_status'):
+			assert list(columns[name]) == list(EXPECTED[name])
+		for name in ('ltp', 'tv'):
+			assert _nan_equal(list(columns[name]), list(EXPECTED[name]))
+
+	def test_reopen_hits_cache(self, tmp_path, make_parser):
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		list(make_parser().iter_columns(cache))
+		(_, columns), = make_parser().iter_columns(cache)
+		assert (cache.hits, cache.misses) == (1, 1)
+		assert columns.source == os.path.abspath(TEST_DATA_LOCAL_FILE)
+
+	def test_hit_does_not_hash_source(self, tmp_path, monkeypatch, make_parser):
+		hashed = []
+		monkeypatch.setattr(columnar_cache, 'file_hash', lambda path: hashed.append(path) or file_hash(path))
+		source = tmp_path / 'source.bz2'
+		shutil.copy(TEST_DATA_LOCAL_FILE, source)
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		for _ in range(3):
+			list(make_parser(str(source)).iter_columns(cache))
+		assert len(hashed) == 1
+		os.utime(source, (1, 1))
+		list(make_parser(str(source)).iter_columns(cache))
+		assert len(hashed) == 2
+		assert (cache.hits, cache.misses) == (3, 1)
+
+	def test_key_depends_on_validation(self, tmp_path, make_parser):
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		validated = cache.key(TEST_DATA_LOCAL_FILE, make_parser())
+		assert cache.key(TEST_DATA_LOCAL_FILE, make_parser(validate=False)) != validated
+		assert cache.key(TEST_DATA_LOCAL_FILE, make_parser(validation_schema={})) != validated
+		assert cache.key(TEST_DATA_LOCAL_FILE, make_parser(validate_first=10)) != validated
+
+	def test_failed_write_is_removed(self, tmp_path, make_parser):
+		invalid = tmp_path / 'invalid.bz2'
+		with bz2.open(TEST_DATA_LOCAL_FILE) as f, bz2.open(invalid, 'wb') as out:
+			for i, line in enumerate(f):
+				out.write(line.replace(b'"pt":', b'"pt":"', 1).replace(b',"mc"', b'","mc"', 1) if i == 500 else line)
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		with pytest.raises(InvalidLine):
+			list(make_parser(str(invalid)).iter_columns(cache))
+		assert os.listdir(cache.cache_dir) == [HASHES_FILE]
+		assert cache.entries() == []
+
+	def test_key_depends_on_contents_and_filters(self, tmp_path, make_parser):
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		copy = tmp_path / 'copy.bz2'
+		shutil.copy(TEST_DATA_LOCAL_FILE, copy)
+		assert cache.key(str(copy), make_parser()) == cache.key(TEST_DATA_LOCAL_FILE, make_parser())
+		assert cache.key(TEST_DATA_LOCAL_FILE, make_parser(market_ids=["1.131162722"])) != cache.key(TEST_DATA_LOCAL_FILE, make_parser())
+
+	def test_filtered_columns(self, tmp_path, make_parser):
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		(_, columns), = make_parser(market_ids=["1.131162722"]).iter_columns(cache)
+		assert columns.market_ids == ["1.131162722"]
+		assert len(columns) == EXPECTED['market_id'].count("1.131162722")
+
+	def test_zero_copy_numpy_views(self, tmp_path, make_parser):
+		numpy = pytest.importorskip('numpy')
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		(_, columns), = make_parser().iter_columns(cache)
+		ltp = columns['ltp']
+		assert isinstance(ltp, numpy.ndarray)
+		assert not ltp.flags.owndata
+		assert not ltp.flags.writeable
+
+	def test_lru_eviction(self, tmp_path, make_parser):
+		archive = tmp_path / 'archive'
+		archive.mkdir()
+		for i in range(3):
+			with bz2.open(archive / f"{i}.bz2", 'wb') as f:
+				f.write(json.dumps(dict(MARKETS[0], pt=MARKETS[0]['pt'] + i)).encode() + b'\n')
+				f.write(bz2.open(TEST_DATA_LOCAL_FILE).read())
+		cache = ColumnarCache(str(tmp_path / 'cache'))
+		parser = make_parser(str(archive), validate=False)
+		list(parser.iter_columns(cache))
+		entries = cache.entries()
+		assert len(entries) == 3
+		entry_size = entries[0][1]
+
+		os.utime(entries[0][0], (1, 1))
+		os.utime(entries[1][0], (2, 2))
+		cache.max_bytes = 2 * entry_size
+		assert cache.evict() == 1
+		assert [e[0] for e in cache.entries()] == [entries[1][0], entries[2][0]]
+
+	def test_entry_larger_than_cache_is_kept(self, tmp_path, make_parser):
+		cache = ColumnarCache(str(tmp_path / 'cache'), max_bytes=1)
+		(_, columns), = make_parser().iter_columns(cache)
+		assert len(columns) == len(EXPECTED['market_id'])
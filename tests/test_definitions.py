@@ -0,0 +1,187 @@
+"""
+This file tests the deduplication of marketDefinitions and interning of their strings
+"""
+import bz2
+import copy
+import json
+import os
+
+from betfairHistorical import MarketBookEngine
+from betfairHistorical.definitions import DefinitionDeduplicator, SymbolTable, apply_definition, diff_definition
+from betfairHistorical.export import iter_batches
+from betfairHistorical.records import MarketMessage
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+DEFINITION = {
+	'eventId': '28202626',
+	'status': 'OPEN',
+	'inPlay': False,
+	'version': 1,
+	'runners': [
+		{'id': 1, 'name': 'Home', 'status': 'ACTIVE', 'sortPriority': 1},
+		{'id': 2, 'name': 'Away', 'status': 'ACTIVE', 'sortPriority': 2}
+		]
+	}
+
+PARSER_KWARGS = {'lazy': True}
+
+
+def _definitions(markets) -> list:
+	return [
+		(market['pt'], market_change['id'], market_change['marketDefinition'])
+		for market in markets for market_change in market['mc'] if 'marketDefinition' in market_change
+		]
+
+
+class TestDiffDefinition:
+
+	def test_unchanged(self):
+		assert diff_definition(DEFINITION, copy.deepcopy(DEFINITION)) == {}
+
+	def test_changed_keys_and_runners(self):
+		definition = copy.deepcopy(DEFINITION)
+		definition['status'] = 'SUSPENDED'
+		definition['version'] = 2
+		definition['runners'][1]['status'] = 'WINNER'
+		assert diff_definition(DEFINITION, definition) == {
+			'status': 'SUSPENDED',
+			'version': 2,
+			'runners': [{'id': 1}, {'id': 2, 'status': 'WINNER'}]
+			}
+
+	def test_removed_key(self):
+		definition = copy.deepcopy(DEFINITION)
+		del definition['inPlay']
+		assert diff_definition(DEFINITION, definition) == {'inPlay': None}
+
+	def test_apply_rebuilds_definition(self):
+		definition = copy.deepcopy(DEFINITION)
+		definition['status'] = 'CLOSED'
+		del definition['inPlay']
+		definition['runners'][0]['status'] = 'LOSER'
+		definition['runners'].append({'id': 3, 'name': 'The Draw', 'status': 'WINNER', 'sortPriority': 3})
+		assert apply_definition(DEFINITION, diff_definition(DEFINITION, definition)) == definition
+
+	def test_apply_full_definition(self):
+		definition = copy.deepcopy(DEFINITION)
+		definition['status'] = 'CLOSED'
+		assert apply_definition(DEFINITION, definition) == definition
+
+
+class TestDefinitionDeduplicator:
+
+	def test_rebuilds_every_definition(self):
+		markets = copy.deepcopy(MARKETS)
+		dedup = DefinitionDeduplicator()
+		deduplicated = [market for market in map(dedup.process, markets) if market is not None]
+
+		current = {}
+		expected = _definitions(MARKETS)
+		rebuilt = []
+		for market in deduplicated:
+			for market_change in market['mc']:
+				delta = market_change.get('marketDefinition')
+				if delta is None:
+					continue
+				previous = current.get(market_change['id'])
+				current[market_change['id']] = delta if previous is None else apply_definition(previous, delta)
+				rebuilt.append((market['pt'], market_change['id'], current[market_change['id']]))
+		unchanged = {(pt, market_id) for pt, market_id, _ in expected} - {(pt, market_id) for pt, market_id, _ in rebuilt}
+		assert unchanged
+		assert [d for d in expected if (d[0], d[1]) not in unchanged] == rebuilt
+
+	def test_first_definition_in_full(self):
+		market = copy.deepcopy(MARKETS[0])
+		assert DefinitionDeduplicator().process(market) == MARKETS[0]
+
+	def test_unchanged_definition_removed(self):
+		dedup = DefinitionDeduplicator()
+		line = {'pt': 1, 'mc': [{'id': '1.1', 'marketDefinition': copy.deepcopy(DEFINITION)}]}
+		dedup.process(line)
+		repeat = dedup.process({'pt': 2, 'mc': [{'id': '1.1', 'marketDefinition': copy.deepcopy(DEFINITION)}]})
+		assert repeat is None
+		with_changes = dedup.process({'pt': 3, 'mc': [{'id': '1.1', 'marketDefinition': copy.deepcopy(DEFINITION), 'rc': [{'id': 1, 'ltp': 2.0}]}]})
+		assert with_changes == {'pt': 3, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0}]}]}
+
+	def test_image_in_full(self):
+		dedup = DefinitionDeduplicator()
+		dedup.process({'pt': 1, 'mc': [{'id': '1.1', 'marketDefinition': copy.deepcopy(DEFINITION)}]})
+		image = {'pt': 2, 'mc': [{'id': '1.1', 'img': True, 'marketDefinition': copy.deepcopy(DEFINITION)}]}
+		assert dedup.process(copy.deepcopy(image)) == image
+
+	def test_interning(self):
+		symbols = SymbolTable()
+		dedup = DefinitionDeduplicator(symbols)
+		first = dedup.process(json.loads(json.dumps({'pt': 1, 'mc': [{'id': '1.1', 'marketDefinition': DEFINITION}]})))
+		image = {'pt': 2, 'img': True, 'mc': [{'id': '1.1', 'img': True, 'marketDefinition': DEFINITION}]}
+		second = dedup.process(json.loads(json.dumps(image)))
+		assert second['mc'][0]['id'] is first['mc'][0]['id']
+		first_runner = first['mc'][0]['marketDefinition']['runners'][0]
+		second_runner = second['mc'][0]['marketDefinition']['runners'][0]
+		assert second_runner['name'] is first_runner['name']
+		assert 'Home' in symbols and '1.1' in symbols
+
+
+class TestParserDedupDefinitions:
+
+	def test_sample_output_smaller(self, make_parser):
+		full = sum(len(json.dumps(m)) for m in make_parser(decode=True).iter_lines())
+		deduplicated = sum(len(json.dumps(m)) for m in make_parser(decode=True, dedup_definitions=True).iter_lines())
+		assert deduplicated < full / 2
+
+	def test_symbols_shared_across_lines(self, make_parser):
+		parser = make_parser(decode=True, dedup_definitions=True)
+		markets = list(parser.iter_lines())
+		market_ids = {}
+		for market in markets:
+			for market_change in market['mc']:
+				assert market_ids.setdefault(market_change['id'], market_change['id']) is market_change['id']
+		assert len(parser.symbols) > len(market_ids)
+
+	def test_bytes_unchanged(self, make_parser):
+		assert list(make_parser(dedup_definitions=True).iter_lines()) == list(make_parser().iter_lines())
+
+	def test_market_book_replay_unchanged(self, make_parser):
+		full = [
+			(snapshot['market_id'], snapshot['status'], snapshot['in_play'], [r['status'] for r in snapshot['runners']])
+			for snapshot in MarketBookEngine().replay(make_parser(decode=True).iter_lines())
+			]
+		engine = MarketBookEngine()
+		deduplicated = [
+			(snapshot['market_id'], snapshot['status'], snapshot['in_play'], [r['status'] for r in snapshot['runners']])
+			for snapshot in engine.replay(make_parser(decode=True, dedup_definitions=True).iter_lines())
+			]
+		# lines whose only change was an unchanged definition are removed, so compare the last state of each market
+		assert dict((s[0], s) for s in deduplicated) == dict((s[0], s) for s in full)
+		last = {}
+		for pt, market_id, definition in _definitions(MARKETS):
+			last[market_id] = definition
+		assert {market_id: book.market_definition for market_id, book in engine.market_books.items()} == last
+
+	def test_export_unchanged(self, make_parser):
+		full = list(iter_batches(make_parser(decode=True).iter_lines()))
+		deduplicated = list(iter_batches(make_parser(decode=True, dedup_definitions=True).iter_lines()))
+		# NaN does not equal itself, so compare the text of each column
+		assert [{k: repr(list(v)) for k, v in b.items()} for b in full] == [{k: repr(list(v)) for k, v in b.items()} for b in deduplicated]
+
+	def test_repeated_definition_line_dropped(self, tmp_path, make_parser):
+		file_path = tmp_path / 'repeated.bz2'
+		line = {'op': 'mcm', 'clk': '1', 'pt': 1, 'mc': [{'id': '1.1', 'marketDefinition': DEFINITION}]}
+		with bz2.open(file_path, 'wt') as f:
+			for pt in (1, 2, 3):
+				f.write(json.dumps({**line, 'pt': pt}) + '\n')
+		markets = list(make_parser(str(file_path), decode=True, validate=False, dedup_definitions=True).iter_lines())
+		assert [market['pt'] for market in markets] == [1]
+		assert len(list(make_parser(str(file_path), decode=True, validate=False).iter_lines())) == 3
+
+	def test_records(self, make_parser):
+		markets = list(make_parser(decode=True, records=True, dedup_definitions=True).iter_lines())
+		assert all(isinstance(m, MarketMessage) for m in markets)
+		engine = MarketBookEngine()
+		list(engine.replay(markets))
+		assert {book.status for book in engine.market_books.values()} == {'CLOSED'}
@@ -0,0 +1,75 @@
+"""
+This file tests the columnar export of parsed markets
+"""
+import bz2
+import json
+import math
+import os
+
+import pytest
+
+from betfairHistorical import export
+from betfairHistorical.export import MARKET_STATUSES, iter_batches, iter_numpy_batches, write_arrow, write_parquet
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+ROWS = sum(len(mc.get('rc', [])) for market in MARKETS for mc in market['mc'])
+
+
+class TestExport:
+
+	def test_iter_batches_rows(self):
+		batches = list(iter_batches(MARKETS, batch_size=1000))
+		assert [len(batch['market_id']) for batch in batches[:-1]] == [1000] * (len(batches) - 1)
+		assert sum(len(batch['market_id']) for batch in batches) == ROWS
+
+	def test_iter_batches_columns(self):
+		batch = next(iter_batches(MARKETS))
+		first_change = next(mc for market in MARKETS for mc in market['mc'] if mc.get('rc'))
+		first_market = next(market for market in MARKETS if first_change in market['mc'])
+		assert batch['published_time'][0] == first_market['pt']
+		assert batch['market_id'][0] == first_change['id']
+		assert batch['selection_id'][0] == first_change['rc'][0]['id']
+		assert batch['ltp'][0] == first_change['rc'][0]['ltp']
+		assert math.isnan(batch['tv'][0])
+		assert MARKET_STATUSES[batch['market_status'][0]] == 'OPEN'
+
+	@pytest.mark.parametrize("plan", ["basic", "pro"])
+	def test_iter_batches_plan(self, plan):
+		def rows(batches):
+			return [tuple(map(repr, row)) for batch in batches for row in zip(*batch.values())]
+		assert rows(iter_batches(MARKETS, plan=plan)) == rows(iter_batches(MARKETS))
+
+	def test_iter_numpy_batches(self):
+		numpy = pytest.importorskip('numpy')
+		records = numpy.concatenate(list(iter_numpy_batches(MARKETS, batch_size=1000)))
+		assert len(records) == ROWS
+		assert records['published_time'].dtype == numpy.int64
+		assert records['ltp'].dtype == numpy.float64
+
+	def test_write_parquet(self, tmp_path):
+		pytest.importorskip('pyarrow')
+		import pyarrow.parquet
+		file_path = str(tmp_path / 'sample.parquet')
+		assert write_parquet(MARKETS, file_path, batch_size=1000) == ROWS
+		table = pyarrow.parquet.read_table(file_path)
+		assert table.num_rows == ROWS
+		assert set(table.column('market_status').to_pylist()) <= set(MARKET_STATUSES)
+
+	def test_write_arrow(self, tmp_path):
+		pytest.importorskip('pyarrow')
+		import pyarrow.ipc
+		file_path = str(tmp_path / 'sample.arrow')
+		assert write_arrow(MARKETS, file_path, batch_size=1000) == ROWS
+		with pyarrow.ipc.open_file(file_path) as reader:
+			assert reader.num_record_batches == math.ceil(ROWS / 1000)
+			assert reader.read_all().num_rows == ROWS
+
+	def test_missing_dependency(self, monkeypatch):
+		monkeypatch.setattr(export, 'pyarrow', None)
+		with pytest.raises(ImportError, match="pip install pyarrow"):
+			export.arrow_schema()
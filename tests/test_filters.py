@@ -0,0 +1,108 @@
+"""
+This file tests MarketFilter and filtering with BetfairHistoricalFileParser
+"""
+import bz2
+import json
+import os
+
+import pytest
+
+from betfairHistorical.filters import MarketFilter
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	CONTENTS = f.readlines()
+
+MARKETS = [json.loads(line) for line in CONTENTS]
+MARKET_ID = "1.131162722"
+SELECTION_ID = 69423
+
+FILTERS = [
+	{'market_ids': [MARKET_ID]},
+	{'selection_ids': [SELECTION_ID]},
+	{'market_ids': [MARKET_ID], 'selection_ids': [SELECTION_ID]},
+	{'from_time': 1493560800000, 'to_time': 1493564400000},
+	{'require_market_definition': True},
+	{'require_runner_change': True},
+	{'market_ids': ["1.131162722", "1.131162830"], 'require_runner_change': True}
+	]
+
+PARSER_KWARGS = {'validate': False}
+
+
+class TestMarketFilter:
+
+	def test_inactive_filter(self):
+		assert not MarketFilter().active
+
+	@pytest.mark.parametrize("kwargs", FILTERS)
+	def test_match_raw_keeps_all_matches(self, kwargs):
+		market_filter = MarketFilter(**kwargs)
+		for line, market in zip(CONTENTS, MARKETS):
+			if market_filter.apply(market) is not None:
+				assert market_filter.match_raw(line)
+
+	@pytest.mark.parametrize("kwargs", FILTERS)
+	def test_match_raw_discards_lines(self, kwargs):
+		market_filter = MarketFilter(**kwargs)
+		assert sum(market_filter.match_raw(line) for line in CONTENTS) < len(CONTENTS)
+
+	def test_apply_market_ids(self):
+		market_filter = MarketFilter(market_ids=[MARKET_ID])
+		for market in MARKETS:
+			filtered = market_filter.apply(market)
+			if filtered is not None:
+				assert [mc['id'] for mc in filtered['mc']] == [MARKET_ID]
+				assert filtered['pt'] == market['pt']
+
+	def test_apply_selection_ids(self):
+		filtered = MarketFilter(selection_ids=[1]).apply({'pt': 1, 'mc': [
+			{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0}, {'id': 2, 'ltp': 3.0}]},
+			{'id': '1.2', 'rc': [{'id': 2, 'ltp': 3.0}]},
+			{'id': '1.3', 'marketDefinition': {'status': 'OPEN'}, 'rc': [{'id': 2, 'ltp': 3.0}]}
+			]})
+		assert filtered == {'pt': 1, 'mc': [
+			{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0}]},
+			{'id': '1.3', 'marketDefinition': {'status': 'OPEN'}}
+			]}
+
+	def test_apply_unfiltered_returns_same_object(self):
+		market = MARKETS[0]
+		assert MarketFilter(from_time=0).apply(market) is market
+
+	def test_apply_message_types(self):
+		market = {'pt': 1, 'mc': [{'id': '1.1', 'marketDefinition': {}}, {'id': '1.2', 'rc': [{'id': 1}]}]}
+		assert MarketFilter(require_market_definition=True).apply(market) is None
+		market['mc'][0]['marketDefinition'] = {'status': 'OPEN'}
+		assert MarketFilter(require_market_definition=True).apply(market)['mc'] == [market['mc'][0]]
+		assert MarketFilter(require_runner_change=True).apply(market)['mc'] == [market['mc'][1]]
+
+	def test_apply_market_types(self):
+		market_filter = MarketFilter(market_types=lambda market_type: market_type == 'WIN')
+		assert market_filter.active
+		# changes before a market's first definition are kept
+		assert market_filter.apply({'pt': 1, 'mc': [{'id': '1.1', 'rc': [{'id': 1}]}]}) is not None
+		market = {'pt': 2, 'mc': [
+			{'id': '1.1', 'marketDefinition': {'marketType': 'WIN'}},
+			{'id': '1.2', 'marketDefinition': {'marketType': 'PLACE'}}
+			]}
+		assert market_filter.apply(market)['mc'] == [market['mc'][0]]
+		assert market_filter.apply({'pt': 3, 'mc': [{'id': '1.2', 'rc': [{'id': 1}]}]}) is None
+		assert market_filter.apply({'pt': 3, 'mc': [{'id': '1.1', 'rc': [{'id': 1}]}]}) is not None
+
+
+class TestParserFilters:
+
+	@pytest.mark.parametrize("kwargs", FILTERS)
+	def test_decoded_lines_match_exact_filter(self, kwargs, make_parser):
+		market_filter = MarketFilter(**kwargs)
+		expected = [market_filter.apply(market) for market in MARKETS]
+		assert list(make_parser(lazy=True, **kwargs).iter_markets()) == [market for market in expected if market is not None]
+
+	@pytest.mark.parametrize("kwargs", FILTERS)
+	def test_bytes_lines_are_whole(self, kwargs, make_parser):
+		market_filter = MarketFilter(**kwargs)
+		expected = [line for line, market in zip(CONTENTS, MARKETS) if market_filter.apply(market) is not None]
+		assert make_parser(**kwargs).data == expected
@@ -0,0 +1,89 @@
+"""
+This file tests ArchiveIndex and reading indexed files with BetfairHistoricalFileParser
+"""
+import bz2
+import json
+import os
+import shutil
+
+import pytest
+
+from betfairHistorical import BetfairHistoricalFileParser
+from betfairHistorical.index import ArchiveIndex
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+OTHER_MARKET = [
+	{"op": "mcm", "pt": 1500000000000, "mc": [{"id": "1.2", "marketDefinition": {
+		"eventId": "2", "marketType": "WIN", "countryCode": "IE", "status": "OPEN"
+		}}]},
+	{"op": "mcm", "pt": 1500000060000, "mc": [{"id": "1.2", "rc": [{"id": 1, "ltp": 2.0}]}]}
+	]
+
+
+@pytest.fixture
+def archive(tmp_path):
+	tmp_path = tmp_path / 'archive'
+	os.mkdir(tmp_path)
+	shutil.copy(TEST_DATA_LOCAL_FILE, tmp_path / 'sample.bz2')
+	os.mkdir(tmp_path / 'racing')
+	with bz2.open(tmp_path / 'racing' / 'other.bz2', 'wt') as f:
+		f.writelines(json.dumps(line) + '\n' for line in OTHER_MARKET)
+	(tmp_path / '.betfair_historical_manifest.json').write_text('{}')
+	return tmp_path
+
+
+@pytest.fixture
+def index(archive, tmp_path):
+	with ArchiveIndex(str(tmp_path / 'index.sqlite')) as index:
+		index.update(str(archive))
+		yield index
+
+
+class TestArchiveIndex:
+
+	def test_update_indexes_data_files(self, archive, tmp_path):
+		with ArchiveIndex(str(tmp_path / 'index.sqlite')) as index:
+			assert index.update(str(archive)) == 2
+
+	def test_update_is_incremental(self, archive, index):
+		assert index.update(str(archive)) == 0
+		with bz2.open(archive / 'racing' / 'other.bz2', 'wt') as f:
+			f.write(json.dumps(OTHER_MARKET[0]) + '\n')
+		os.utime(archive / 'racing' / 'other.bz2', (0, 0))
+		assert index.update(str(archive)) == 1
+
+	def test_update_removes_deleted_files(self, archive, index):
+		os.remove(archive / 'racing' / 'other.bz2')
+		index.update(str(archive))
+		assert index.query() == [str(archive / 'sample.bz2')]
+
+	def test_query_market_id(self, archive, index):
+		assert index.query(market_ids=["1.131162722"]) == [str(archive / 'sample.bz2')]
+		assert index.query(market_ids=["1.2"]) == [str(archive / 'racing' / 'other.bz2')]
+		assert index.query(market_ids=["1.3"]) == []
+
+	def test_query_definition_fields(self, archive, index):
+		assert index.query(event_ids=["28202626"]) == [str(archive / 'sample.bz2')]
+		assert index.query(market_types=["WIN"], countries=["IE"]) == [str(archive / 'racing' / 'other.bz2')]
+		assert index.query(market_types=["WIN"], countries=["GB"]) == []
+
+	def test_query_time_range(self, archive, index):
+		assert index.query(from_time=1493566771128) == sorted([str(archive / 'racing' / 'other.bz2'), str(archive / 'sample.bz2')])
+		assert index.query(from_time=1493566771129) == [str(archive / 'racing' / 'other.bz2')]
+		assert index.query(to_time=1493129993643) == [str(archive / 'sample.bz2')]
+
+	def test_parser_reads_only_matching_files(self, archive, index):
+		parser = BetfairHistoricalFileParser(
+			local_path=str(archive),
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			recursive=True,
+			validate=False,
+			decode=True,
+			index=index,
+			index_query={'market_ids': ["1.2"]}
+			)
+		assert parser.data == [OTHER_MARKET]
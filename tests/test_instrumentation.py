@@ -0,0 +1,70 @@
+"""
+This file tests the instrumentation of BetfairHistoricalFileParser
+"""
+import bz2
+import logging
+import os
+import shutil
+
+from betfairHistorical.instrumentation import FileStats, ParserStats
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	CONTENTS = f.readlines()
+
+
+class TestInstrumentation:
+
+	def test_not_instrumented_by_default(self, make_parser):
+		assert make_parser(lazy=True).stats is None
+
+	def test_file_stats(self, make_parser):
+		parser = make_parser(instrument=True, decode=True)
+		assert len(parser.data) == len(CONTENTS)
+		file_stats, = parser.stats.files
+		assert file_stats.file_path == TEST_DATA_LOCAL_FILE
+		assert file_stats.lines == file_stats.lines_yielded == len(CONTENTS)
+		assert file_stats.bytes_read == sum(map(len, CONTENTS))
+		assert file_stats.read_time > 0
+		assert file_stats.decode_time > 0
+		assert file_stats.validation_time > 0
+		assert file_stats.filter_time == 0
+		assert file_stats.latency >= file_stats.read_time + file_stats.decode_time + file_stats.validation_time
+
+	def test_filtered_lines(self, make_parser):
+		parser = make_parser(instrument=True, validate=False, market_ids=["1.131162722"])
+		file_stats, = parser.stats.files
+		assert file_stats.lines == len(CONTENTS)
+		assert file_stats.lines_yielded == len(parser.data)
+		assert file_stats.filter_time > 0
+		assert file_stats.validation_time == 0
+
+	def test_callbacks(self, make_parser):
+		received = []
+		stats = ParserStats(callbacks=[received.append])
+		parser = make_parser(instrument=stats, lazy=True)
+		assert parser.stats is stats
+		assert received == []
+		list(parser.iter_lines())
+		assert received == stats.files
+		assert isinstance(received[0], FileStats)
+
+	def test_parallel_stats(self, tmp_path, make_parser):
+		for i in range(3):
+			shutil.copy(TEST_DATA_LOCAL_FILE, tmp_path / f"{i}.bz2")
+		received = []
+		stats = ParserStats(callbacks=[received.append])
+		parser = make_parser(str(tmp_path), instrument=stats, lazy=True, workers=2)
+		list(parser.iter_lines())
+		assert sorted(f.file_path for f in received) == sorted(str(tmp_path / f"{i}.bz2") for i in range(3))
+		totals = stats.totals()
+		assert totals['files'] == stats.files_found == 3
+		assert totals['lines'] == 3 * len(CONTENTS)
+
+	def test_summary_logged(self, caplog, make_parser):
+		with caplog.at_level(logging.INFO, logger='betfairHistorical.parser'):
+			parser = make_parser(instrument=True)
+		assert parser.stats.summary() in caplog.text
+		assert f"1 files (0 failed), {len(CONTENTS)} lines" in parser.stats.summary()
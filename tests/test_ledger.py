@@ -0,0 +1,129 @@
+"""
+This file tests ProcessedLedger and incremental parsing and watching with BetfairHistoricalFileParser
+"""
+import bz2
+import os
+import shutil
+import threading
+
+from betfairHistorical.ledger import ProcessedLedger
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	CONTENTS = f.readlines()
+
+PARSER_KWARGS = {'validate': False}
+
+
+def _archive(tmp_path, files: int=2) -> str:
+	archive = tmp_path / 'archive'
+	archive.mkdir()
+	for i in range(files):
+		shutil.copy(TEST_DATA_LOCAL_FILE, archive / f"{i}.bz2")
+	return str(archive)
+
+
+class TestProcessedLedger:
+
+	def test_mark_processed(self, tmp_path):
+		archive = _archive(tmp_path)
+		file_path = os.path.join(archive, '0.bz2')
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			assert not ledger.is_processed(file_path)
+			ledger.mark_processed(file_path)
+			assert ledger.is_processed(file_path)
+			assert len(ledger) == 1
+			ledger.forget(file_path)
+			assert not ledger.is_processed(file_path)
+
+	def test_touched_file_is_unchanged(self, tmp_path):
+		archive = _archive(tmp_path)
+		file_path = os.path.join(archive, '0.bz2')
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			ledger.mark_processed(file_path)
+			os.utime(file_path, (1, 1))
+			assert ledger.is_processed(file_path)
+
+	def test_changed_file_is_unprocessed(self, tmp_path):
+		archive = _archive(tmp_path)
+		file_path = os.path.join(archive, '0.bz2')
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			ledger.mark_processed(file_path)
+			with bz2.open(file_path, 'wb') as f:
+				f.writelines(CONTENTS[:10])
+			assert not ledger.is_processed(file_path)
+
+	def test_parser_version(self, tmp_path):
+		archive = _archive(tmp_path)
+		file_path = os.path.join(archive, '0.bz2')
+		ledger_path = str(tmp_path / 'ledger.sqlite')
+		with ProcessedLedger(ledger_path, parser_version=1) as ledger:
+			ledger.mark_processed(file_path)
+		with ProcessedLedger(ledger_path, parser_version=2) as ledger:
+			assert not ledger.is_processed(file_path)
+
+
+class TestIncrementalParsing:
+
+	def test_skips_processed_files(self, tmp_path, make_parser):
+		archive = _archive(tmp_path)
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			assert len(make_parser(archive, ledger=ledger).data) == 2
+			assert make_parser(archive, ledger=ledger).data == []
+
+			shutil.copy(TEST_DATA_LOCAL_FILE, os.path.join(archive, '2.bz2'))
+			assert make_parser(archive, ledger=ledger).data == [CONTENTS]
+
+	def test_streamed_files_marked_once_consumed(self, tmp_path, make_parser):
+		archive = _archive(tmp_path)
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			parser = make_parser(archive, ledger=ledger, lazy=True)
+			file_path, lines = next(parser.iter_files())
+			next(lines)
+			assert not ledger.is_processed(file_path)
+			list(lines)
+			assert ledger.is_processed(file_path)
+			remaining = {'0.bz2', '1.bz2'} - {os.path.basename(file_path)}
+			assert {os.path.basename(f) for f, _ in parser.iter_files()} == remaining
+
+	def test_parallel(self, tmp_path, make_parser):
+		archive = _archive(tmp_path, files=3)
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			assert len(list(make_parser(archive, ledger=ledger, lazy=True, workers=2).iter_files())) == 3
+			assert len(ledger) == 3
+			assert list(make_parser(archive, ledger=ledger, lazy=True, workers=2).iter_files()) == []
+
+	def test_single_file(self, tmp_path, make_parser):
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			assert make_parser(TEST_DATA_LOCAL_FILE, ledger=ledger).data == CONTENTS
+			assert make_parser(TEST_DATA_LOCAL_FILE, ledger=ledger).data == []
+
+
+class TestWatch:
+
+	def test_watch_picks_up_new_files(self, tmp_path, make_parser):
+		archive = _archive(tmp_path, files=1)
+		parser = make_parser(archive, lazy=True)
+		stop = threading.Event()
+		watched = []
+		for file_path, lines in parser.watch(poll_interval=0.05, stop=stop):
+			watched.append((os.path.basename(file_path), len(list(lines))))
+			if len(watched) == 1:
+				shutil.copy(TEST_DATA_LOCAL_FILE, os.path.join(archive, '1.bz2.part'))
+				os.replace(os.path.join(archive, '1.bz2.part'), os.path.join(archive, '1.bz2'))
+			else:
+				stop.set()
+		assert watched == [('0.bz2', len(CONTENTS)), ('1.bz2', len(CONTENTS))]
+
+	def test_watch_timeout(self, tmp_path, make_parser):
+		archive = _archive(tmp_path)
+		watched = [file_path for file_path, _ in make_parser(archive, lazy=True).watch(poll_interval=0.05, timeout=0.2)]
+		assert sorted(map(os.path.basename, watched)) == ['0.bz2', '1.bz2']
+
+	def test_watch_with_ledger(self, tmp_path, make_parser):
+		archive = _archive(tmp_path)
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			make_parser(archive, ledger=ledger)
+			assert list(make_parser(archive, lazy=True, ledger=ledger).watch(poll_interval=0.05, timeout=0.2)) == []
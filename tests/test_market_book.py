@@ -0,0 +1,105 @@
+"""
+This file tests the functionality of MarketBookEngine
+"""
+import bz2
+import json
+import os
+
+import pytest
+
+from betfairHistorical import BetfairHistoricalFileParser, MarketBookEngine
+from betfairHistorical.exceptions import InvalidMarket, InvalidMarketChange
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+parser = BetfairHistoricalFileParser(
+		local_path=TEST_DATA_LOCAL_FILE,
+		sport="soccer",
+		plan="basic",
+		market="match_odds",
+		validate=False,
+		lazy=True
+	)
+
+engine = MarketBookEngine()
+snapshots = list(engine.replay(parser.iter_markets()))
+
+
+class TestMarketBookEngine:
+
+	def test_replay_creates_book_per_market(self):
+		market_ids = {mc['id'] for market in MARKETS for mc in market['mc']}
+		assert set(engine.market_books) == market_ids
+
+	def test_replay_snapshots_every_change_without_interval(self):
+		assert len(snapshots) == sum(len(market['mc']) for market in MARKETS)
+
+	def test_replay_keeps_last_traded_price(self):
+		last_ltp = None
+		for market in MARKETS:
+			for mc in market['mc']:
+				if mc['id'] == "1.131162722":
+					for rc in mc.get('rc', []):
+						if rc['id'] == 69423:
+							last_ltp = rc['ltp']
+		runner = engine.market_books["1.131162722"].runners[(69423, 0)]
+		assert runner.ltp == last_ltp
+
+	def test_replay_applies_market_definition(self):
+		market_book = engine.market_books["1.131162830"]
+		assert market_book.status == 'CLOSED'
+		assert market_book.in_play
+		assert market_book.runners[(47999, 0)].status == 'WINNER'
+
+	def test_replay_snapshot_interval(self):
+		interval_engine = MarketBookEngine(snapshot_interval=60000)
+		interval_snapshots = list(interval_engine.replay(MARKETS))
+		assert len(interval_snapshots) < len(snapshots)
+		last_published_time = {}
+		for snapshot in interval_snapshots:
+			market_id = snapshot['market_id']
+			if market_id in last_published_time:
+				assert snapshot['published_time'] - last_published_time[market_id] >= 60000
+			last_published_time[market_id] = snapshot['published_time']
+
+	def test_ladders_apply_deltas(self):
+		pro_engine = MarketBookEngine()
+		pro_engine.process({'pt': 1, 'mc': [{'id': '1.1', 'rc': [{
+			'id': 1,
+			'tv': 10.0,
+			'atb': [[2.0, 5.0], [1.9, 3.0]],
+			'atl': [[2.1, 4.0]],
+			'trd': [[2.0, 10.0]],
+			'batb': [[0, 2.0, 5.0], [1, 1.9, 3.0]]
+		}]}]})
+		pro_engine.process({'pt': 2, 'mc': [{'id': '1.1', 'rc': [{
+			'id': 1,
+			'tv': 12.0,
+			'atb': [[2.0, 0]],
+			'trd': [[2.0, 12.0]],
+			'batb': [[0, 1.9, 3.0], [1, 1.9, 0]]
+		}]}]})
+		snapshot = pro_engine.market_books['1.1'].snapshot()['runners'][0]
+		assert snapshot['tv'] == 12.0
+		assert snapshot['atb'] == [[1.9, 3.0]]
+		assert snapshot['atl'] == [[2.1, 4.0]]
+		assert snapshot['trd'] == [[2.0, 12.0]]
+		assert snapshot['batb'] == [[1.9, 3.0]]
+
+	def test_image_replaces_runners(self):
+		img_engine = MarketBookEngine()
+		img_engine.process({'pt': 1, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0}]}]})
+		img_engine.process({'pt': 2, 'mc': [{'id': '1.1', 'img': True, 'rc': [{'id': 2, 'ltp': 3.0}]}]})
+		assert list(img_engine.market_books['1.1'].runners) == [(2, 0)]
+
+	def test_process_no_published_time(self):
+		with pytest.raises(InvalidMarket):
+			MarketBookEngine().process({'mc': []})
+
+	def test_process_no_market_change_id(self):
+		with pytest.raises(InvalidMarketChange):
+			MarketBookEngine().process({'pt': 1, 'mc': [{}]})
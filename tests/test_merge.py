@@ -0,0 +1,178 @@
+"""
+This file tests merging the files of BetfairHistoricalFileParser into a single stream in published time order
+"""
+import bz2
+import json
+import os
+
+import pytest
+
+from betfairHistorical import BetfairHistoricalFileParser
+from betfairHistorical.exceptions import InvalidMarket
+from betfairHistorical.ledger import ProcessedLedger
+from betfairHistorical.merge import group_by_event, merge_files, merge_markets
+from betfairHistorical.records import MarketMessage
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+# the event id of the sample, and a second event whose markets are the first 10 markets of the sample an hour later
+EVENT_ID = '28202626'
+OTHER_EVENT_ID = '99999999'
+HOUR = 60 * 60 * 1000
+
+PARSER_KWARGS = {'lazy': True}
+
+
+def _split_markets() -> dict:
+	"""
+	Splits the sample into the lines of each market, as they are in files downloaded from Betfair.
+	"""
+	markets = {}
+	for market in MARKETS:
+		for market_change in market['mc']:
+			markets.setdefault(market_change['id'], []).append(dict(market, mc=[market_change]))
+	return markets
+
+def _other_event(lines: list) -> list:
+	moved = []
+	for line in json.loads(json.dumps(lines)):
+		line['pt'] += HOUR
+		for market_change in line['mc']:
+			market_change['id'] = market_change['id'].replace('1.', '2.', 1)
+			if 'marketDefinition' in market_change:
+				market_change['marketDefinition']['eventId'] = OTHER_EVENT_ID
+		moved.append(line)
+	return moved
+
+@pytest.fixture(scope='module')
+def archive(tmp_path_factory) -> str:
+	archive = tmp_path_factory.mktemp('archive')
+	for i, (market_id, lines) in enumerate(_split_markets().items()):
+		files = [(market_id, lines)]
+		if i < 10:
+			files.append((market_id.replace('1.', '2.', 1), _other_event(lines)))
+		for file_market_id, file_lines in files:
+			with bz2.open(archive / f"{file_market_id}.bz2", 'wb') as f:
+				for line in file_lines:
+					f.write(json.dumps(line, separators=(',', ':')).encode() + b'\n')
+	return str(archive)
+
+def _expected(parser: BetfairHistoricalFileParser) -> list:
+	"""
+	Every line of every file, stably sorted by published time and then file.
+	"""
+	files = [markets for _, markets in parser.iter_files(decode=True)]
+	lines = [(market['pt'], i, j, market) for i, markets in enumerate(files) for j, market in enumerate(markets)]
+	return [market for _, _, _, market in sorted(lines, key=lambda line: line[:3])]
+
+
+class TestMergeMarkets:
+
+	def test_merge(self):
+		streams = [[{'pt': 1}, {'pt': 4}], [], [{'pt': 2}, {'pt': 3}, {'pt': 5}]]
+		assert [m['pt'] for m in merge_markets(streams)] == [1, 2, 3, 4, 5]
+
+	def test_ties_in_stream_order(self):
+		streams = [[{'pt': 1, 's': 0}, {'pt': 2, 's': 0}], [{'pt': 1, 's': 1}, {'pt': 2, 's': 1}]]
+		assert [(m['pt'], m['s']) for m in merge_markets(streams)] == [(1, 0), (1, 1), (2, 0), (2, 1)]
+
+	def test_one_pending_message_per_stream(self):
+		taken = [0, 0]
+
+		def _stream(i):
+			for pt in range(1, 100):
+				taken[i] += 1
+				yield {'pt': pt}
+
+		merged = merge_markets([_stream(0), _stream(1)])
+		for _ in range(10):
+			next(merged)
+		# the ten yielded, and one pending from the other stream
+		assert sum(taken) == 11
+
+	def test_missing_published_time(self):
+		with pytest.raises(InvalidMarket):
+			list(merge_markets([[{'pt': 1}, {}]]))
+
+
+class TestMergeFiles:
+
+	def test_open_files_are_bounded(self):
+		streams = {str(i): [{'pt': pt, 's': i} for pt in range(i % 3 + 1, 30, 3)] for i in range(10)}
+		open_files = [0, 0]
+
+		def _open(file_path):
+			open_files[0] += 1
+			open_files[1] = max(open_files)
+			try:
+				yield from streams[file_path]
+			finally:
+				open_files[0] -= 1
+
+		merged = list(merge_files(list(streams), _open, max_open_files=3))
+		assert merged == list(merge_markets(streams.values()))
+		assert open_files[1] <= 3
+
+	def test_max_open_files_must_merge(self):
+		with pytest.raises(ValueError):
+			list(merge_files(['a', 'b'], lambda f: [], max_open_files=1))
+
+
+class TestIterMerged:
+
+	def test_ordered_stream(self, archive, make_parser):
+		merged = list(make_parser(archive).iter_merged())
+		assert merged == _expected(make_parser(archive))
+		assert len(merged) == sum(len(lines) for lines in _split_markets().values()) + sum(
+			len(lines) for lines in list(_split_markets().values())[:10]
+			)
+
+	def test_records(self, archive, make_parser):
+		merged = list(make_parser(archive, records=True).iter_merged())
+		assert all(isinstance(m, MarketMessage) for m in merged)
+		assert [m.to_dict() for m in merged] == _expected(make_parser(archive))
+
+	def test_filtered(self, archive, make_parser):
+		merged = list(make_parser(archive, market_ids=["1.131162819", "2.131162819"]).iter_merged())
+		assert merged
+		assert {mc['id'] for m in merged for mc in m['mc']} <= {"1.131162819", "2.131162819"}
+		pts = [m['pt'] for m in merged]
+		assert pts == sorted(pts)
+
+	@pytest.mark.parametrize("records", [False, True])
+	def test_bounded_open_files(self, archive, records, make_parser):
+		merged = list(make_parser(archive, records=records).iter_merged(max_open_files=3))
+		assert len(os.listdir(archive)) > 9
+		assert ([m.to_dict() for m in merged] if records else merged) == _expected(make_parser(archive))
+
+	def test_bounded_open_files_marks_ledger_at_end(self, archive, tmp_path, make_parser):
+		with ProcessedLedger(str(tmp_path / 'ledger.sqlite')) as ledger:
+			merged = make_parser(archive, ledger=ledger).iter_merged(max_open_files=3)
+			next(merged)
+			assert not any(ledger.is_processed(os.path.join(archive, f)) for f in os.listdir(archive))
+			list(merged)
+			assert all(ledger.is_processed(os.path.join(archive, f)) for f in os.listdir(archive))
+			assert list(make_parser(archive, ledger=ledger).iter_merged(max_open_files=3)) == []
+
+	def test_by_event(self, archive, make_parser):
+		events = [(event_id, list(markets)) for event_id, markets in make_parser(archive).iter_merged(by_event=True)]
+		assert [event_id for event_id, _ in events] == [EVENT_ID, OTHER_EVENT_ID]
+		for event_id, markets in events:
+			pts = [m['pt'] for m in markets]
+			assert pts == sorted(pts)
+			prefix = '1.' if event_id == EVENT_ID else '2.'
+			assert all(mc['id'].startswith(prefix) for m in markets for mc in m['mc'])
+		assert sorted(len(markets) for _, markets in events) == [
+			sum(len(lines) for lines in list(_split_markets().values())[:10]),
+			sum(len(lines) for lines in _split_markets().values())
+			]
+
+	def test_group_by_event(self, archive):
+		groups = group_by_event(sorted(os.path.join(archive, f) for f in os.listdir(archive)))
+		assert [event_id for event_id, _ in groups] == [EVENT_ID, OTHER_EVENT_ID]
+		assert len(groups[1][1]) == 10
+		assert all(os.path.basename(f).startswith('2.') for f in groups[1][1])
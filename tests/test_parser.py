@@ -4,12 +4,13 @@ This file tests the functionality of BetfairHistoricalFileParser
 import bz2
 import json
 import os
+import shutil
 
 import pytest
 from jsonschema.exceptions import ValidationError
 
 from betfairHistorical import BetfairHistoricalFileParser
-from betfairHistorical.exceptions import InvalidMarket, InvalidMarketChange
+from betfairHistorical.exceptions import InvalidMarket, InvalidMarketChange, NoValidationSchema
 
 TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
 TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
@@ -80,6 +81,106 @@ class TestBetfairHistoricalFileParser:
 	def test_read_files_recursively_returns_data(self):
 		assert parser.data == [CONTENTS]
 
+	# Streaming tests
+	def test_lazy_parser_does_not_load_data(self):
+		lazy_parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_DIR,
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			recursive=True,
+			validate=False,
+			lazy=True
+			)
+		assert lazy_parser.data is None
+
+	def test_iter_files_yields_path_and_lines(self):
+		files = [(file_path, list(lines)) for file_path, lines in parser.iter_files()]
+		assert files == [(TEST_DATA_LOCAL_FILE, CONTENTS)]
+
+	def test_iter_lines_streams_all_lines(self):
+		lazy_parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_FILE,
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			validate=True,
+			lazy=True
+			)
+		lines = lazy_parser.iter_lines()
+		assert next(lines) == CONTENTS[0]
+		assert list(lines) == CONTENTS[1:]
+
+	# Decoding tests
+	def test_iter_markets_yields_decoded_markets(self):
+		assert list(parser.iter_markets()) == [json.loads(line) for line in CONTENTS]
+
+	def test_decode_stores_validated_dictionaries(self):
+		decoded_parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_FILE,
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			validate=True,
+			decode=True
+			)
+		assert decoded_parser.data[0] == market
+		assert decoded_parser.get_published_time(decoded_parser.data[0]) == 1493129993643
+
+	def test_validate_schema_accepts_decoded_markets(self):
+		assert not parser._validate_schema([market])
+
+	# Parallel tests
+	def test_parallel_read_matches_sequential(self):
+		parallel_parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_DIR,
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			recursive=True,
+			validate=True,
+			workers=2
+			)
+		assert parallel_parser.data == [CONTENTS]
+
+	def test_parallel_read_records_errors(self, tmp_path):
+		shutil.copy(TEST_DATA_LOCAL_FILE, tmp_path / 'valid.bz2')
+		(tmp_path / 'corrupt.bz2').write_bytes(b'not a bz2 file')
+		parallel_parser = BetfairHistoricalFileParser(
+			local_path=str(tmp_path),
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			validate=False,
+			workers=2,
+			ordered=False
+			)
+		assert parallel_parser.data == [CONTENTS]
+		assert list(parallel_parser.errors) == [str(tmp_path / 'corrupt.bz2')]
+
+	def test_get_file_paths_and_record_error(self, tmp_path):
+		for name in ('b.bz2', 'a.bz2'):
+			shutil.copy(TEST_DATA_LOCAL_FILE, tmp_path / name)
+		(tmp_path / 'c.bz2').write_bytes(b'not a bz2 file')
+		lazy_parser = BetfairHistoricalFileParser(
+			local_path=str(tmp_path),
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			validate=False,
+			lazy=True
+			)
+		file_paths = lazy_parser.get_file_paths()
+		assert file_paths == [str(tmp_path / name) for name in ('a.bz2', 'b.bz2', 'c.bz2')]
+		read = []
+		for file_path, lines in lazy_parser.iter_paths(file_paths[1:]):
+			try:
+				read.append(len(list(lines)))
+			except OSError as e:
+				lazy_parser.record_error(file_path, e)
+		assert read == [len(CONTENTS)]
+		assert list(lazy_parser.errors) == [file_paths[2]]
+
 	# _validate_schema tests
 	def test_validate_schema_with_default(self):
 		default_schema_parser = BetfairHistoricalFileParser(
@@ -117,6 +218,55 @@ class TestBetfairHistoricalFileParser:
 		with pytest.raises(ValidationError):
 			invalid_parser._validate_schema(CONTENTS)			
 
+	def test_validate_schema_no_default_schema(self):
+		no_schema_parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_DIR,
+			sport="animals",
+			plan="basic",
+			market="match_odds",
+			validate=False
+			)
+		with pytest.raises(NoValidationSchema):
+			no_schema_parser._validate_schema(CONTENTS)
+
+	def test_validator_is_shared_between_parsers(self):
+		first_parser, second_parser = [
+			BetfairHistoricalFileParser(
+				local_path=TEST_DATA_LOCAL_DIR,
+				sport="soccer",
+				plan="basic",
+				market="match_odds",
+				lazy=True
+				)
+			for _ in range(2)
+		]
+		assert first_parser._get_validator() is second_parser._get_validator()
+
+	def test_validate_first_skips_later_lines(self):
+		sampled_parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_DIR,
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			validate=False,
+			validation_schema={"type": "number"},
+			validate_first=0
+			)
+		assert not sampled_parser._validate_schema(CONTENTS)
+
+	def test_validate_every_checks_sampled_lines(self):
+		sampled_parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_DIR,
+			sport="soccer",
+			plan="basic",
+			market="match_odds",
+			validate=False,
+			validation_schema={"type": "number"},
+			validate_every=100
+			)
+		with pytest.raises(ValidationError):
+			sampled_parser._validate_schema(CONTENTS)
+
 	# get_market_change_id tests
 	def test_get_market_change_with_id(self):
 		mc_id = parser.get_market_change_id(market_change)
@@ -0,0 +1,74 @@
+"""
+This file tests download_and_parse against a local stand-in for the historic data endpoint.
+No credentials are required.
+"""
+import bz2
+import os
+
+import pytest
+
+from betfairHistorical import BetfairHistoricDownloader
+from betfairHistorical.pipeline import download_and_parse
+from historic_endpoint import HistoricEndpoint
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with open(TEST_DATA_LOCAL_FILE, 'rb') as f:
+	SAMPLE = f.read()
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	CONTENTS = f.readlines()
+
+FILES = {f"/xds_nfs/edp_processed/BASIC/2017/Apr/30/28202626/{i}.bz2": SAMPLE for i in range(6)}
+
+PARSER_KWARGS = {'validate': False, 'lazy': True}
+
+
+def _downloader(endpoint: HistoricEndpoint) -> BetfairHistoricDownloader:
+	downloader = BetfairHistoricDownloader(
+		username="username",
+		password="password",
+		app_key="app_key",
+		cert_path="certs",
+		login=False
+		)
+	downloader.historic_url = endpoint.url
+	downloader.trading.set_session_token("session_token")
+	return downloader
+
+
+class TestDownloadAndParse:
+
+	@pytest.mark.parametrize("workers", [None, 2])
+	def test_download_and_parse(self, tmp_path, workers, make_parser):
+		with HistoricEndpoint(FILES) as endpoint:
+			parsed = {
+				file_path: list(lines)
+				for file_path, lines in download_and_parse(
+					downloader=_downloader(endpoint),
+					parser=make_parser(str(tmp_path), workers=workers),
+					file_list=list(FILES),
+					local_dir=str(tmp_path),
+					download_workers=2,
+					queue_size=2
+					)
+				}
+
+		assert sorted(parsed) == sorted(str(tmp_path / f"{i}.bz2") for i in range(6))
+		assert all(lines == CONTENTS for lines in parsed.values())
+
+	def test_download_and_parse_stops_early(self, tmp_path, make_parser):
+		with HistoricEndpoint(FILES) as endpoint:
+			stream = download_and_parse(
+				downloader=_downloader(endpoint),
+				parser=make_parser(str(tmp_path)),
+				file_list=list(FILES),
+				local_dir=str(tmp_path),
+				download_workers=1,
+				queue_size=1
+				)
+			next(stream)
+			stream.close()
+
+		assert len(endpoint.requests) < len(FILES)
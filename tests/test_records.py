@@ -0,0 +1,72 @@
+"""
+This file tests the record types and parsing into them with BetfairHistoricalFileParser
+"""
+import bz2
+import json
+import os
+
+from betfairHistorical import BetfairHistoricalFileParser, MarketBookEngine
+from betfairHistorical.records import MarketChange, MarketDefinition, MarketMessage, RunnerChange
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+parser = BetfairHistoricalFileParser(
+		local_path=TEST_DATA_LOCAL_FILE,
+		sport="soccer",
+		plan="basic",
+		market="match_odds",
+		validate=True,
+		decode=True,
+		records=True
+	)
+
+market = parser.data[0]
+market_change = market.get('mc')[0]
+
+
+class TestRecords:
+
+	def test_parser_returns_records(self):
+		assert all(isinstance(m, MarketMessage) for m in parser.data)
+		assert isinstance(market_change, MarketChange)
+		assert isinstance(market_change.market_definition, MarketDefinition)
+
+	def test_records_round_trip(self):
+		assert [m.to_dict() for m in parser.data] == MARKETS
+
+	def test_accessors_accept_records(self):
+		assert parser.get_published_time(market) == MARKETS[0]['pt']
+		assert parser.get_market_change_id(market_change) == MARKETS[0]['mc'][0]['id']
+		assert parser.get_market_definition(market_change).to_dict() == MARKETS[0]['mc'][0]['marketDefinition']
+		assert parser.get_runner_change(market_change) is None
+
+	def test_runner_change_fields(self):
+		runner_change = RunnerChange.from_dict({'id': 1, 'ltp': 2.0, 'atb': [[2.0, 5.0]]})
+		assert runner_change.selection_id == 1
+		assert runner_change.get('ltp') == 2.0
+		assert runner_change.get('atb') == [[2.0, 5.0]]
+		assert runner_change.get('tv') is None
+		assert runner_change.get('hc', 0) == 0
+
+	def test_unknown_keys_kept_in_extra(self):
+		runner_change = RunnerChange.from_dict({'id': 1, 'new': 'value'})
+		assert runner_change.get('new') == 'value'
+		assert runner_change.to_dict() == {'id': 1, 'new': 'value'}
+
+	def test_strings_are_interned(self):
+		first, second = [
+			m.market_changes[0].market_definition
+			for m in parser.data
+			if m.market_changes[0].market_definition is not None
+			][:2]
+		assert first.event_name is second.event_name
+		assert first.runners[0].status is second.runners[0].status
+
+	def test_market_book_engine_accepts_records(self):
+		from_records = list(MarketBookEngine().replay(parser.data))
+		from_dicts = list(MarketBookEngine().replay(MARKETS))
+		assert from_records == from_dicts
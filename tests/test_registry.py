@@ -0,0 +1,273 @@
+"""
+This file tests the sport, plan and market registry and the caching of its schemas and validators
+"""
+import bz2
+import copy
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from betfairHistorical import BetfairHistoricalFileParser
+from betfairHistorical.exceptions import InvalidLine, NoValidationSchema
+from betfairHistorical.globals import SUPPORTED_MARKETS, SUPPORTED_PLANS
+from betfairHistorical.registry import PRICE_SIZE_SCHEMA, MarketTypeMatcher, Registry, load_schema_file, registry
+from betfairHistorical.validation import (
+	ShardedValidator,
+	get_validator,
+	validate_lines,
+	validation_executor,
+	validator_key
+	)
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	CONTENTS = f.readlines()
+
+PRO_FIELDS = b'"rc":[{"atb":[[1.5,10.0]],"atl":[[1.6,5.0]],"trd":[[1.5,2.0]],'
+INVALID_LINE = 500
+
+
+@pytest.fixture
+def restore_registry():
+	sports, plans = copy.deepcopy(registry._sports), dict(registry._plans)
+	yield registry
+	registry._sports, registry._plans = sports, plans
+	registry._schemas.clear()
+	registry.version += 1
+
+@pytest.fixture(scope='module')
+def pro_file(tmp_path_factory) -> str:
+	file_path = tmp_path_factory.mktemp('pro') / 'pro.bz2'
+	with bz2.open(file_path, 'wb') as f:
+		for line in CONTENTS:
+			f.write(line.replace(b'"rc":[{', PRO_FIELDS))
+	return str(file_path)
+
+@pytest.fixture(scope='module')
+def invalid_pro_file(tmp_path_factory) -> str:
+	file_path = tmp_path_factory.mktemp('invalid_pro') / 'invalid_pro.bz2'
+	with bz2.open(file_path, 'wb') as f:
+		for i, line in enumerate(CONTENTS):
+			if i + 1 == INVALID_LINE:
+				line = line.replace(b'"rc":[{', b'"rc":[{"trd":"none",')
+			f.write(line)
+	return str(file_path)
+
+
+class TestDefaults:
+
+	def test_supported_plans_is_a_tuple(self):
+		assert isinstance(SUPPORTED_PLANS, tuple)
+		assert 'bas' not in SUPPORTED_PLANS
+		assert not registry.is_supported('soccer', 'bas', 'match_odds')
+
+	def test_registry_matches_globals(self):
+		assert registry.plans() == list(SUPPORTED_PLANS)
+		assert registry.sports() == list(SUPPORTED_MARKETS)
+		for sport, markets in SUPPORTED_MARKETS.items():
+			assert registry.markets(sport) == markets
+
+	def test_names_are_not_case_sensitive(self):
+		assert registry.is_supported('Soccer', 'PRO', 'Match_Odds')
+
+	def test_plan_fields_include_base(self):
+		assert list(registry.get_plan('basic').fields) == ['ltp']
+		assert {'ltp', 'tv', 'batb'} <= set(registry.get_plan('advanced').fields)
+		assert {'ltp', 'tv', 'atb', 'atl', 'trd'} <= set(registry.get_plan('pro').fields)
+
+	def test_unknown_names_raise(self):
+		with pytest.raises(NotImplementedError):
+			registry.get_plan('imaginary')
+		with pytest.raises(NotImplementedError):
+			registry.get_market('soccer', 'piegate')
+
+	@pytest.mark.parametrize("plan", ["advanced", "pro"])
+	def test_parser_accepts_registered_plans(self, pro_file, plan, make_parser):
+		assert len(make_parser(pro_file, plan=plan).data) == len(CONTENTS)
+
+
+class TestSchemas:
+
+	def test_plan_fields_are_added_to_runner_changes(self):
+		def runner_properties(plan):
+			schema = registry.get_schema('soccer', plan, 'match_odds')
+			return schema['properties']['mc']['items']['properties']['rc']['items']['properties']
+		assert 'atb' not in runner_properties('basic')
+		assert runner_properties('pro')['trd'] == PRICE_SIZE_SCHEMA
+		assert 'ltp' in runner_properties('pro')
+
+	def test_schema_is_built_once(self):
+		schema = registry.get_schema('soccer', 'pro', 'match_odds')
+		assert registry.get_schema('soccer', 'pro', 'match_odds') is schema
+
+	def test_schema_file_is_read_once(self):
+		registry.get_schema('soccer', 'basic', 'match_odds')
+		misses = load_schema_file.cache_info().misses
+		Registry()._build_schema(registry.get_market('soccer', 'match_odds'), registry.get_plan('pro'))
+		assert load_schema_file.cache_info().misses == misses
+
+	def test_default_file_is_not_modified(self):
+		registry.get_schema('soccer', 'pro', 'match_odds')
+		runner_change = load_schema_file('soccer/match_odds.json')['properties']['mc']['items']['properties']['rc']['items']
+		assert 'atb' not in runner_change['properties']
+
+	def test_missing_schema_file(self):
+		other = Registry()
+		other.register_plan('basic')
+		other.register_market('cricket', 'match_odds')
+		with pytest.raises(NoValidationSchema):
+			other.get_schema('cricket', 'basic', 'match_odds')
+
+	def test_pro_fields_are_validated(self, invalid_pro_file, make_parser):
+		assert len(make_parser(invalid_pro_file).data) == len(CONTENTS)
+		with pytest.raises(InvalidLine) as e:
+			make_parser(invalid_pro_file, plan="pro")
+		assert e.value.line_number == INVALID_LINE
+
+
+class TestRegistration:
+
+	def test_register_plan(self, restore_registry, invalid_pro_file, make_parser):
+		restore_registry.register_plan('pro_racing', fields={'bsp_ladder': PRICE_SIZE_SCHEMA}, base='pro')
+		assert {'trd', 'bsp_ladder'} <= set(registry.get_plan('pro_racing').fields)
+		with pytest.raises(InvalidLine):
+			make_parser(invalid_pro_file, plan="pro_racing")
+
+	def test_register_market_with_schema(self, restore_registry):
+		restore_registry.register_market('soccer', 'correct_score', schema={"required": ["pt"]})
+		assert restore_registry.is_supported('soccer', 'basic', 'correct_score')
+		schema = restore_registry.get_schema('soccer', 'basic', 'correct_score')
+		assert schema['required'] == ["pt"]
+		validator = get_validator('soccer', 'correct_score', plan='basic')
+		assert not validator.is_valid({"op": "mcm"})
+
+	def test_registration_replaces_cached_schemas(self, restore_registry):
+		restore_registry.register_market('cricket', 'match_odds', schema={"type": "object"})
+		assert restore_registry.get_schema('cricket', 'basic', 'match_odds') == {"type": "object"}
+		restore_registry.register_market('cricket', 'match_odds', schema={"type": "array"})
+		assert restore_registry.get_schema('cricket', 'basic', 'match_odds') == {"type": "array"}
+
+	@pytest.mark.parametrize("kwargs", [{"workers": 2}, {"validation_workers": 2, "validation_batch_size": 100}])
+	def test_registered_market_is_sent_to_workers(self, restore_registry, tmp_path, kwargs):
+		restore_registry.register_market('cricket', 'match_odds', schema={"required": ["clk"]})
+		for i in range(2):
+			(tmp_path / f"{i}.bz2").write_bytes(open(TEST_DATA_LOCAL_FILE, 'rb').read())
+		parser = BetfairHistoricalFileParser(
+			local_path=str(tmp_path),
+			sport="cricket",
+			plan="basic",
+			market="match_odds",
+			lazy=True,
+			**kwargs
+			)
+		assert sum(len(list(lines)) for _, lines in parser.iter_files()) == 2 * len(CONTENTS)
+		restore_registry.register_market('cricket', 'match_odds', schema={"required": ["missing"]})
+		parser = BetfairHistoricalFileParser(
+			local_path=str(tmp_path),
+			sport="cricket",
+			plan="basic",
+			market="match_odds",
+			lazy=True,
+			**kwargs
+			)
+		if "workers" in kwargs:
+			# files which fail in worker processes are recorded in errors
+			assert not list(parser.iter_files())
+			assert len(parser.errors) == 2
+			assert all(isinstance(e, InvalidLine) and e.line_number == 1 for e in parser.errors.values())
+		else:
+			with pytest.raises(InvalidLine):
+				for _, lines in parser.iter_files():
+					list(lines)
+
+
+class TestMarketTypes:
+
+	@pytest.mark.parametrize("sport, market, matches, others", [
+		("soccer", "match_odds", ["MATCH_ODDS"], ["OVER_UNDER_25", "CORRECT_SCORE", None]),
+		("soccer", "over_under", ["OVER_UNDER_25", "OVER_UNDER_105_CORNR"], ["MATCH_ODDS", None]),
+		("horse_racing", "win", ["WIN"], ["PLACE", "EACH_WAY"]),
+		("horse_racing", "place", ["PLACE"], ["WIN"])
+		])
+	def test_default_markets(self, sport, market, matches, others):
+		is_market = registry.market_type_matcher(sport, market)
+		assert all(is_market(market_type) for market_type in matches)
+		assert not any(is_market(market_type) for market_type in others)
+
+	def test_market_without_types_matches_everything(self, restore_registry):
+		restore_registry.register_market('cricket', 'match_odds', schema={"type": "object"})
+		is_market = restore_registry.market_type_matcher('cricket', 'match_odds')
+		assert is_market('MATCH_ODDS') and is_market(None)
+
+	def test_matcher_is_picklable(self):
+		is_market = pickle.loads(pickle.dumps(registry.market_type_matcher("soccer", "over_under")))
+		assert isinstance(is_market, MarketTypeMatcher)
+		assert is_market("OVER_UNDER_35") and not is_market("MATCH_ODDS")
+
+	def test_parser_matches_market_type(self):
+		market_types = {}
+		for line in CONTENTS:
+			for market_change in json.loads(line)['mc']:
+				if 'marketDefinition' in market_change:
+					market_types[market_change['id']] = market_change['marketDefinition'].get('marketType') or ''
+		assert any(not market_type.startswith('OVER_UNDER_') for market_type in market_types.values())
+
+		parser = BetfairHistoricalFileParser(
+			local_path=TEST_DATA_LOCAL_FILE,
+			sport="soccer",
+			plan="basic",
+			market="over_under",
+			lazy=True,
+			match_market_type=True
+			)
+		market_ids = {market_change['id'] for market in parser.iter_markets() for market_change in market['mc']}
+		assert market_ids
+		assert market_ids == {market_id for market_id, market_type in market_types.items() if market_type.startswith('OVER_UNDER_')}
+
+
+class TestRunnerExtractor:
+
+	RUNNER_CHANGE = {'id': 1, 'ltp': 2.5, 'tv': 10.0, 'atb': [[2.4, 5.0]]}
+
+	def test_plan_fields(self):
+		assert registry.runner_extractor('basic')(self.RUNNER_CHANGE) == (2.5,)
+		extracted = dict(zip(registry.get_plan('pro').fields, registry.runner_extractor('pro')(self.RUNNER_CHANGE)))
+		assert extracted['ltp'] == 2.5 and extracted['tv'] == 10.0 and extracted['atb'] == [[2.4, 5.0]]
+		assert extracted['trd'] is None
+
+	def test_fields_not_in_plan_are_not_read(self):
+		assert registry.runner_extractor('basic', ('ltp', 'tv'))(self.RUNNER_CHANGE) == (2.5, None)
+		assert registry.runner_extractor('advanced', ('ltp', 'tv'))(self.RUNNER_CHANGE) == (2.5, 10.0)
+
+	def test_without_plan_every_field_is_read(self):
+		assert registry.runner_extractor(None, ('ltp', 'tv', 'atb'))(self.RUNNER_CHANGE) == (2.5, 10.0, [[2.4, 5.0]])
+		assert registry.runner_extractor('imaginary', ('tv',))(self.RUNNER_CHANGE) == (10.0,)
+
+
+class TestWorkerValidators:
+
+	def test_supplied_schema_is_installed_once(self):
+		schema = {"required": ["op", "pt"]}
+		with validation_executor(2, "soccer", "match_odds", schema) as executor:
+			validator = ShardedValidator(executor, 'file', "soccer", "match_odds", schema, batch_size=10)
+			for i, line in enumerate(CONTENTS[:100]):
+				validator.add(i + 1, line)
+			validator.add(101, b'{"op": "mcm", "mc": [{"id": "1.2"}]}')
+			with pytest.raises(InvalidLine) as e:
+				validator.finish()
+		assert e.value.line_number == 101
+
+	def test_supplied_schema_must_be_installed(self):
+		key = validator_key("soccer", "match_odds", {"required": ["not installed"]})
+		with ProcessPoolExecutor(max_workers=1) as executor:
+			with pytest.raises(NoValidationSchema):
+				executor.submit(validate_lines, key, [(1, CONTENTS[0])]).result()
+
+	def test_default_schema_key(self):
+		assert validator_key("soccer", "match_odds", plan="pro") == ("soccer", "pro", "match_odds", registry.version)
+		assert get_validator("soccer", "match_odds", plan="pro") is not get_validator("soccer", "match_odds")
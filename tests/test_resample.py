@@ -0,0 +1,141 @@
+"""
+This file tests resampling of runner changes into bars
+"""
+import bz2
+import json
+import os
+
+import pytest
+
+from betfairHistorical import MarketBookEngine
+from betfairHistorical.resample import Resampler, resample
+
+numpy = pytest.importorskip('numpy')
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+MARKET_DEFINITION = {'status': 'OPEN', 'inPlay': False, 'runners': [{'id': 1, 'status': 'ACTIVE'}]}
+
+
+def _bars(markets, interval=1000, **kwargs) -> numpy.ndarray:
+	return numpy.concatenate(list(resample(markets, interval, **kwargs)))
+
+def _sorted(bars: numpy.ndarray) -> numpy.ndarray:
+	return numpy.sort(bars, order=['market_id', 'selection_id', 'time'])
+
+
+class TestResample:
+
+	def test_ohlc_and_volume(self):
+		bars = _bars([
+			{'pt': 1000, 'mc': [{'id': '1.1', 'marketDefinition': MARKET_DEFINITION}]},
+			{'pt': 2000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0, 'tv': 10.0}]}]},
+			{'pt': 2100, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 3.0}]}]},
+			{'pt': 2500, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 1.5, 'tv': 20.0}]}]},
+			{'pt': 2999, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.5}]}]},
+			{'pt': 4000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.5, 'tv': 35.0}]}]}
+			])
+		assert bars['time'].tolist() == [1000, 2000, 4000]
+		assert bars['ticks'].tolist() == [1, 4, 1]
+		assert numpy.isnan(bars['close'][0])
+		bar = bars[1]
+		assert (bar['open'], bar['high'], bar['low'], bar['close']) == (2.0, 3.0, 1.5, 2.5)
+		assert bars['volume'][1:].tolist() == [20.0, 15.0]
+		assert (bars['market_status'] == 1).all()
+
+	def test_best_prices(self):
+		bars = _bars([
+			{'pt': 1000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'atb': [[2.0, 5.0], [1.9, 5.0]], 'atl': [[2.1, 5.0], [2.2, 5.0]]}]}]},
+			{'pt': 1500, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'atb': [[2.0, 0]]}]}]},
+			{'pt': 2000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'batb': [[0, 1.8, 5.0]], 'batl': [[0, 2.3, 5.0]]}]}]}
+			])
+		assert bars['best_back'].tolist() == [1.9, 1.8]
+		assert bars['best_lay'].tolist() == [2.1, 2.3]
+
+	def test_stops_at_off(self):
+		markets = [
+			{'pt': 1000, 'mc': [{'id': '1.1', 'marketDefinition': MARKET_DEFINITION}]},
+			{'pt': 2000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0}]}]},
+			{'pt': 3000, 'mc': [{'id': '1.1', 'marketDefinition': dict(MARKET_DEFINITION, inPlay=True)}]},
+			{'pt': 4000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 3.0}]}]}
+			]
+		assert _bars(markets)['time'].tolist() == [1000, 2000, 3000, 4000]
+		assert _bars(markets, include_in_play=False)['time'].tolist() == [1000, 2000]
+
+	def test_closed_markets_completed_before_flush(self):
+		resampler = Resampler(1000, batch_size=1)
+		resampler.process({'pt': 1000, 'mc': [{'id': '1.1', 'marketDefinition': MARKET_DEFINITION}]})
+		bars = resampler.process({'pt': 1200, 'mc': [{'id': '1.1', 'marketDefinition': dict(MARKET_DEFINITION, status='CLOSED')}]})
+		assert bars['ticks'].tolist() == [2]
+		assert bars['market_status'].tolist() == [3]
+		assert resampler.market_books == {}
+		assert len(resampler.flush()) == 0
+
+	@pytest.mark.parametrize("batch_size", [1, 50, 1000])
+	def test_batches_match_single_batch(self, batch_size):
+		expected = _sorted(_bars(MARKETS, 60000))
+		bars = _sorted(_bars(MARKETS, 60000, batch_size=batch_size))
+		for name in expected.dtype.names:
+			assert numpy.array_equal(bars[name], expected[name], equal_nan=expected[name].dtype.kind == 'f')
+
+	def test_close_matches_market_book(self):
+		engine = MarketBookEngine()
+		for market in MARKETS:
+			engine.process(market)
+		bars = _sorted(_bars(MARKETS, 60000))
+		last = numpy.append(bars['market_id'][1:] != bars['market_id'][:-1], True) | numpy.append(bars['selection_id'][1:] != bars['selection_id'][:-1], True)
+		for bar in bars[last]:
+			runner = engine.market_books[bar['market_id']].runners[(bar['selection_id'], bar['handicap'])]
+			assert bar['close'] == runner.ltp or (runner.ltp is None and numpy.isnan(bar['close']))
+
+	def test_fill(self):
+		markets = [
+			{'pt': 1000, 'mc': [{'id': '1.1', 'marketDefinition': MARKET_DEFINITION}]},
+			{'pt': 2000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0, 'tv': 10.0}]}]},
+			{'pt': 5500, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 3.0, 'tv': 15.0}]}]},
+			{'pt': 7000, 'mc': [{'id': '1.1', 'rc': [{'id': 2, 'ltp': 4.0}]}]},
+			{'pt': 9000, 'mc': [{'id': '1.1', 'marketDefinition': dict(MARKET_DEFINITION, status='CLOSED')}]}
+			]
+		bars = _sorted(_bars(markets, fill=True))
+		runner = bars[bars['selection_id'] == 1]
+		assert runner['time'].tolist() == list(range(1000, 10000, 1000))
+		assert runner['ticks'].tolist() == [1, 1, 0, 0, 1, 0, 0, 0, 1]
+		assert runner['close'][2:4].tolist() == [2.0, 2.0]
+		assert runner['high'][2:4].tolist() == [2.0, 2.0]
+		assert runner['volume'][2:4].tolist() == [0.0, 0.0]
+		assert runner['volume'][4] == 5.0
+		assert bars[bars['selection_id'] == 2]['time'].tolist() == [7000, 8000, 9000]
+
+	def test_fill_stops_at_off(self):
+		markets = [
+			{'pt': 1000, 'mc': [{'id': '1.1', 'marketDefinition': MARKET_DEFINITION}]},
+			{'pt': 2000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0}]}]},
+			{'pt': 4000, 'mc': [{'id': '1.1', 'marketDefinition': dict(MARKET_DEFINITION, inPlay=True)}]},
+			{'pt': 6000, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 3.0}]}]}
+			]
+		bars = _bars(markets, include_in_play=False, fill=True)
+		assert bars['time'].tolist() == [1000, 2000, 3000, 4000]
+		assert bars['ticks'].tolist() == [1, 1, 0, 0]
+
+	@pytest.mark.parametrize("batch_size", [1, 50, 1000])
+	def test_fill_batches_match_single_batch(self, batch_size):
+		order = ['market_id', 'selection_id', 'handicap', 'time']
+		expected = numpy.sort(_bars(MARKETS, 3600000, fill=True), order=order)
+		bars = numpy.sort(_bars(MARKETS, 3600000, batch_size=batch_size, fill=True), order=order)
+		for name in expected.dtype.names:
+			assert numpy.array_equal(bars[name], expected[name], equal_nan=expected[name].dtype.kind == 'f')
+		# filling only adds bars for intervals without changes, so every runner has a bar for each interval
+		unfilled = numpy.sort(_bars(MARKETS, 3600000), order=order)
+		changed = expected[expected['ticks'] > 0]
+		for name in ('market_id', 'selection_id', 'time', 'close', 'ticks'):
+			assert numpy.array_equal(changed[name], unfilled[name], equal_nan=unfilled[name].dtype.kind == 'f')
+		same_runner = (
+			(expected['market_id'][1:] == expected['market_id'][:-1])
+			& (expected['selection_id'][1:] == expected['selection_id'][:-1])
+			& (expected['handicap'][1:] == expected['handicap'][:-1])
+			)
+		assert (numpy.diff(expected['time'])[same_runner] == 3600000).all()
@@ -0,0 +1,158 @@
+"""
+This file tests the summaries of markets and runners from BetfairHistoricalFileParser.summarize
+"""
+import bz2
+import csv
+import json
+import os
+import shutil
+
+import pytest
+
+from betfairHistorical.cli import main
+from betfairHistorical.exceptions import InvalidMarket
+from betfairHistorical.summary import RunnerSummary, summarize, write_csv
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	MARKETS = [json.loads(line) for line in f]
+
+PARSER_KWARGS = {'lazy': True}
+
+
+def _expected() -> dict:
+	"""
+	The summary of each runner of the sample, computed from every line held in memory.
+	"""
+	definitions = {}
+	runners = {}
+	in_play_times = {}
+	ltps = {}
+	for market in MARKETS:
+		for market_change in market['mc']:
+			market_id = market_change['id']
+			definition = market_change.get('marketDefinition')
+			if definition:
+				definitions[market_id] = definition
+				for runner in definition['runners']:
+					runners[(market_id, runner['id'], runner.get('hc', 0))] = runner
+				if definition['inPlay']:
+					in_play_times.setdefault(market_id, market['pt'])
+			for runner_change in market_change.get('rc') or ():
+				key = (market_id, runner_change['id'], runner_change.get('hc', 0))
+				ltps.setdefault(key, []).append((market['pt'], runner_change['ltp']))
+
+	expected = {}
+	for key, runner in runners.items():
+		definition = definitions[key[0]]
+		in_play_time = in_play_times.get(key[0])
+		prices = [ltp for pt, ltp in ltps.get(key, ()) if in_play_time is None or pt < in_play_time]
+		expected[key] = {
+			'event_id': definition['eventId'],
+			'market_type': definition.get('marketType'),
+			'in_play_time': in_play_time,
+			'name': runner.get('name'),
+			'status': runner['status'],
+			'pre_off_ltp': prices[-1] if prices else None
+			}
+	return expected
+
+
+class TestSummarize:
+
+	def test_summaries(self):
+		summaries = summarize(MARKETS)
+		expected = _expected()
+		assert len(summaries) == len(expected)
+		for summary in summaries:
+			assert isinstance(summary, RunnerSummary)
+			values = expected[(summary.market_id, summary.selection_id, summary.handicap)]
+			assert {key: getattr(summary, key) for key in values} == values
+			assert summary.winner == (summary.status == 'WINNER')
+			assert summary.total_matched is None
+
+	def test_winners(self):
+		summaries = summarize(MARKETS)
+		match_odds = {s.market_id for s in summaries if s.market_type == 'MATCH_ODDS'}
+		assert match_odds
+		for market_id in match_odds:
+			winners = [s.name for s in summaries if s.market_id == market_id and s.winner]
+			assert winners == ['The Draw']
+
+	def test_market_time(self):
+		summary = summarize(MARKETS)[0]
+		# marketTime of the sample is 2017-04-30T13:05:00.000Z
+		assert summary.market_time == 1493557500000
+		assert summary.in_play_time >= summary.market_time
+
+	def test_total_matched_and_never_in_play(self):
+		definition = {'eventId': '1', 'marketType': 'WIN', 'inPlay': False, 'status': 'OPEN', 'runners': [{'id': 1, 'status': 'ACTIVE'}]}
+		markets = [
+			{'pt': 1, 'mc': [{'id': '1.1', 'marketDefinition': definition, 'rc': [{'id': 1, 'ltp': 2.0, 'tv': 10.0}]}]},
+			{'pt': 2, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.5, 'tv': 25.0}]}]},
+			{'pt': 3, 'mc': [{'id': '1.1', 'marketDefinition': dict(definition, status='CLOSED', runners=[{'id': 1, 'status': 'WINNER', 'bsp': 2.4}])}]}
+			]
+		summary, = summarize(markets)
+		assert summary.total_matched == 25.0
+		assert summary.pre_off_ltp == 2.5
+		assert summary.in_play_time is None
+		assert summary.market_time is None
+		assert summary.bsp == 2.4
+		assert summary.winner
+
+	def test_plan(self):
+		assert summarize(MARKETS, plan='basic') == summarize(MARKETS)
+		market = {'pt': 1, 'mc': [{'id': '1.1', 'rc': [{'id': 1, 'ltp': 2.0, 'tv': 5.0}]}]}
+		assert summarize([market], plan='basic')[0].total_matched is None
+		assert summarize([market], plan='advanced')[0].total_matched == 5.0
+
+	def test_missing_published_time(self):
+		with pytest.raises(InvalidMarket):
+			summarize([{'mc': []}])
+
+	def test_write_csv(self, tmp_path):
+		summaries = summarize(MARKETS)
+		output = str(tmp_path / 'summary.csv')
+		assert write_csv(summaries, output) == len(summaries)
+		with open(output, newline='') as f:
+			rows = list(csv.DictReader(f))
+		assert len(rows) == len(summaries)
+		assert rows[0]['market_id'] == summaries[0].market_id
+		assert rows[0]['total_matched'] == ''
+
+
+class TestParserSummarize:
+
+	def test_summarize(self, make_parser):
+		assert list(make_parser().summarize()) == summarize(MARKETS)
+
+	def test_records_and_dedup(self, make_parser):
+		assert list(make_parser(records=True).summarize()) == summarize(MARKETS)
+		assert list(make_parser(dedup_definitions=True).summarize()) == summarize(MARKETS)
+
+	def test_parallel(self, tmp_path, make_parser):
+		for i in range(4):
+			shutil.copy(TEST_DATA_LOCAL_FILE, tmp_path / f"{i}.bz2")
+		sequential = list(make_parser(str(tmp_path)).summarize())
+		parallel = list(make_parser(str(tmp_path), workers=2).summarize())
+		assert parallel == sequential
+		assert len(parallel) == 4 * len(summarize(MARKETS))
+
+	def test_filtered(self, make_parser):
+		summaries = list(make_parser(market_ids=["1.131162819"]).summarize())
+		assert {s.market_id for s in summaries} == {"1.131162819"}
+		assert summaries == [s for s in summarize(MARKETS) if s.market_id == "1.131162819"]
+
+	def test_instrumented(self, make_parser):
+		parser = make_parser(instrument=True)
+		list(parser.summarize())
+		assert parser.stats.totals()['lines'] == len(MARKETS)
+
+	def test_cli(self, tmp_path, capsys):
+		output = str(tmp_path / 'summary.csv')
+		assert main(['summarize', TEST_DATA_LOCAL_FILE, output, '--sport', 'soccer', '--market', 'match_odds']) == 0
+		with open(output, newline='') as f:
+			assert len(list(csv.DictReader(f))) == len(summarize(MARKETS))
+		assert f"summarized {len(summarize(MARKETS))} runners" in capsys.readouterr().err
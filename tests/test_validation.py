@@ -0,0 +1,105 @@
+"""
+This file tests reporting of invalid lines and sharded validation with BetfairHistoricalFileParser
+"""
+import bz2
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from jsonschema import ValidationError
+
+from betfairHistorical.exceptions import InvalidLine
+from betfairHistorical.validation import ShardedValidator
+
+TEST_DATA_LOCAL_DIR = os.path.join(os.getcwd(), 'sample_data')
+TEST_DATA_LOCAL_FILE = os.path.join(TEST_DATA_LOCAL_DIR, 'football-basic-sample.bz2')
+
+with bz2.open(TEST_DATA_LOCAL_FILE) as f:
+	CONTENTS = f.readlines()
+
+INVALID_LINES = (500, 900)
+
+
+@pytest.fixture(scope='module')
+def invalid_file(tmp_path_factory) -> str:
+	file_path = tmp_path_factory.mktemp('invalid') / 'invalid.bz2'
+	with bz2.open(file_path, 'wb') as f:
+		for i, line in enumerate(CONTENTS):
+			if i + 1 in INVALID_LINES:
+				line = line.replace(b'"pt":', b'"pt":"', 1).replace(b',"mc"', b'","mc"', 1)
+			f.write(line)
+	return str(file_path)
+
+def _market_id(line_number: int) -> str:
+	return CONTENTS[line_number - 1].split(b'"id":"')[1].split(b'"')[0].decode()
+
+
+class TestInvalidLine:
+
+	@pytest.mark.parametrize("decode", [False, True])
+	def test_reports_first_invalid_line(self, invalid_file, decode, make_parser):
+		with pytest.raises(InvalidLine) as e:
+			make_parser(invalid_file, decode=decode)
+		assert e.value.file_path == invalid_file
+		assert e.value.line_number == INVALID_LINES[0]
+		assert e.value.market_id == _market_id(INVALID_LINES[0])
+		assert isinstance(e.value, ValidationError)
+		assert f"line {INVALID_LINES[0]}" in str(e.value)
+
+	def test_pickles(self):
+		e = pickle.loads(pickle.dumps(InvalidLine("failed", file_path="file", line_number=3, market_id="1.2")))
+		assert (e.file_path, e.line_number, e.market_id) == ("file", 3, "1.2")
+		assert str(e).startswith("file line 3 (market 1.2): failed")
+
+	def test_invalid_file_with_workers(self, invalid_file, tmp_path, make_parser):
+		valid_file = tmp_path / 'valid.bz2'
+		valid_file.write_bytes(open(TEST_DATA_LOCAL_FILE, 'rb').read())
+		(tmp_path / 'invalid.bz2').write_bytes(open(invalid_file, 'rb').read())
+		parser = make_parser(str(tmp_path), workers=2)
+		assert parser.data == [CONTENTS]
+		assert list(parser.errors) == [str(tmp_path / 'invalid.bz2')]
+		error = parser.errors[str(tmp_path / 'invalid.bz2')]
+		assert isinstance(error, InvalidLine)
+		assert error.line_number == INVALID_LINES[0]
+
+
+class TestShardedValidation:
+
+	def test_valid_file(self, make_parser):
+		parser = make_parser(TEST_DATA_LOCAL_FILE, validation_workers=2, validation_batch_size=100)
+		assert parser.data == CONTENTS
+
+	@pytest.mark.parametrize("batch_size", [1, 64, 10000])
+	def test_reports_first_invalid_line(self, invalid_file, batch_size, make_parser):
+		parser = make_parser(invalid_file, lazy=True, validation_workers=2, validation_batch_size=batch_size)
+		with pytest.raises(InvalidLine) as e:
+			list(parser.iter_lines())
+		assert e.value.file_path == invalid_file
+		assert e.value.line_number == INVALID_LINES[0]
+		assert e.value.market_id == _market_id(INVALID_LINES[0])
+
+	def test_sampled_lines(self, invalid_file, make_parser):
+		parser = make_parser(invalid_file, lazy=True, validation_workers=2, validate_first=INVALID_LINES[0] - 1)
+		assert len(list(parser.iter_lines())) == len(CONTENTS)
+
+	def test_pool_is_reused_within_a_run(self, tmp_path, make_parser):
+		for i in range(3):
+			(tmp_path / f"{i}.bz2").write_bytes(open(TEST_DATA_LOCAL_FILE, 'rb').read())
+		parser = make_parser(str(tmp_path), lazy=True, validation_workers=2)
+		pools = set()
+		for _, lines in parser.iter_files():
+			list(lines)
+			pools.add(id(parser._validation_pool))
+		assert len(pools) == 1
+		assert parser._validation_pool is None
+
+	def test_sharded_validator(self):
+		with ProcessPoolExecutor(max_workers=2) as executor:
+			validator = ShardedValidator(executor, 'file', "soccer", "match_odds", batch_size=10, max_pending=2)
+			for i, line in enumerate(CONTENTS[:100]):
+				validator.add(i + 1, line)
+			validator.add(101, b'{"op": "mcm", "pt": "now", "mc": [{"id": "1.2"}]}')
+			with pytest.raises(InvalidLine) as e:
+				validator.finish()
+		assert (e.value.line_number, e.value.market_id) == (101, "1.2")